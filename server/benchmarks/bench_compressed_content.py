@@ -0,0 +1,90 @@
+"""
+Storage saved and read cost of the compressed message content.
+
+    cd server && python benchmarks/bench_compressed_content.py [messages]
+
+Runs on a throwaway test database of the configured DB_ENGINE. Writes a
+chat-like mix - mostly short lines, some pasted logs / code and a few
+base64 image payloads - once with compression off and once with the
+default threshold, then compares the stored characters and the time to
+read every row through ``values_list``.
+"""
+import base64
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Sum  # noqa: E402
+from django.db.models.functions import Length  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+from chat.models import Room, Message  # noqa: E402
+
+User = get_user_model()
+WORDS = "the a deploy failed again after merge please check logs build ok thanks lunch meeting now".split()
+
+
+def paste(rng):
+    lines = [
+        f'  File "/srv/app/{rng.choice(WORDS)}.py", line {rng.randint(1, 900)}, in {rng.choice(WORDS)}\n'
+        f"    {rng.choice(WORDS)}({rng.choice(WORDS)}={rng.randint(0, 99)})\n"
+        for _ in range(rng.randint(20, 200))
+    ]
+    return "Traceback (most recent call last):\n" + "".join(lines) + "ValueError: bad value\n"
+
+
+def contents(count):
+    rng = random.Random(7)
+    for _ in range(count):
+        kind = rng.random()
+        if kind < 0.9:
+            yield "text", " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 30)))
+        elif kind < 0.98:
+            yield "text", paste(rng)
+        else:
+            # a JPEG is already compressed: random bytes behave the same
+            yield "image", "data:image/jpeg;base64," + base64.b64encode(rng.randbytes(rng.randint(20_000, 80_000))).decode()
+
+
+def run(owner, name, count, threshold):
+    with override_settings(COMPRESSED_TEXT_THRESHOLD=threshold):
+        room = Room.objects.create(owner=owner, name=name)
+        messages = [Message(sender=owner, room=room, type=kind, content=content) for kind, content in contents(count)]
+        for start in range(0, count, 1000):
+            Message.bulk_create_in_room(room, messages[start:start + 1000])
+    stored = Message.objects.filter(room=room).aggregate(size=Sum(Length("content")))["size"]
+    started = time.perf_counter()
+    total = sum(len(content) for content in Message.objects.filter(room=room).values_list("content", flat=True).iterator())
+    return stored, total, time.perf_counter() - started
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+        raw_stored, raw_total, raw_read = run(owner, "Raw room", count, threshold=10 ** 12)
+        stored, total, read = run(owner, "Compressed room", count, threshold=settings.COMPRESSED_TEXT_THRESHOLD)
+        assert raw_total == total
+        print(f"{count:,} messages, {raw_total / 1e6:.1f} M characters of content")
+        print(f"      raw: stored {raw_stored / 1e6:>6.1f} M chars  read {raw_read * 1000:>7.1f} ms")
+        print(
+            f"compressed: stored {stored / 1e6:>6.1f} M chars  read {read * 1000:>7.1f} ms  "
+            f"({stored / raw_stored:.0%} of the size)"
+        )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Rows per second of the room archive import, chat.importer vs Message.save.
+
+    cd server && python benchmarks/bench_import.py [messages]
+
+Runs on a throwaway test database of the configured DB_ENGINE. Builds an
+NDJSON archive of one room with two senders, imports it with
+``import_rooms`` (chunked bulk_create, fixups once per room), then times
+saving the same messages one by one as the baseline.
+"""
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from peer_port import json_codec  # noqa: E402
+from chat.importer import import_rooms  # noqa: E402
+from chat.models import Room, Message  # noqa: E402
+
+User = get_user_model()
+
+
+def archive(count, usernames):
+    lines = [json_codec.dumps({"record": "room", "name": "Imported bench room", "access": "public", "limit": 10})]
+    for n in range(count):
+        lines.append(json_codec.dumps({
+            "record": "message",
+            "sender_username": usernames[n % len(usernames)],
+            "type": "text",
+            "content": f"imported message number {n} with a few words of text",
+            "timestamp": "2026-01-02T03:04:05.678901Z",
+        }))
+    return b"\n".join(lines) + b"\n"
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+        User.objects.create_user(username="bench_member", email="member@bench.local", password="x")
+        data = archive(count, ["bench_owner", "bench_member"])
+
+        started = time.perf_counter()
+        stats = import_rooms(io.BytesIO(data), owner)
+        elapsed = time.perf_counter() - started
+        print(f"  import: {stats['messages']:>7,} rows  {stats['messages'] / elapsed:>9,.0f} rows/s")
+
+        room = Room.objects.create(owner=owner, name="Saved bench room")
+        baseline = min(count, 2000)
+        started = time.perf_counter()
+        for n in range(baseline):
+            Message(sender=owner, room=room, content=f"imported message number {n} with a few words of text").save()
+        elapsed = time.perf_counter() - started
+        print(f"    save: {baseline:>7,} rows  {baseline / elapsed:>9,.0f} rows/s")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
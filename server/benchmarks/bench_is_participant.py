@@ -0,0 +1,95 @@
+"""
+Cost of the is_participant flag of PublicAllRoomListView per page size.
+
+    cd server && python benchmarks/bench_is_participant.py [rooms] [joined]
+
+Runs on a throwaway test database of the configured DB_ENGINE. Compares the
+former correlated EXISTS annotation with the cached joined room id set
+(chat.membership) for pages of 9, 50 and 100 rooms, reporting the SQL
+statements and the time to render one page, with and without the
+participant_count aggregate the real view also runs.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count, Exists, OuterRef  # noqa: E402
+from django.test.utils import CaptureQueriesContext  # noqa: E402
+from chat.membership import joined_room_ids  # noqa: E402
+from chat.models import Room  # noqa: E402
+from chat.serializers import PublicRoomSerializer  # noqa: E402
+
+User = get_user_model()
+
+
+def seed(rooms, joined):
+    owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+    user = User.objects.create_user(username="bench_user", email="user@bench.local", password="x")
+    Room.objects.bulk_create(Room(owner=owner, name=f"Bench room {n}") for n in range(rooms))
+    room_ids = list(Room.objects.values_list("id", flat=True))
+    Room.participants.through.objects.bulk_create(
+        [Room.participants.through(room_id=room_id, user_id=owner.id) for room_id in room_ids]
+        + [Room.participants.through(room_id=room_id, user_id=user.id) for room_id in room_ids[::max(rooms // joined, 1)]]
+    )
+    return user
+
+
+def base_queryset(with_count):
+    queryset = Room.objects.filter(status=Room.ACTIVE).select_related("owner").order_by("-created_at")
+    if with_count:
+        queryset = queryset.annotate(participant_count=Count("participants"))
+    return queryset
+
+
+def page_with_exists(user, size, with_count):
+    queryset = base_queryset(with_count).annotate(
+        is_participant=Exists(Room.participants.through.objects.filter(room_id=OuterRef("pk"), user_id=user.id))
+    )
+    return PublicRoomSerializer(queryset[:size], many=True).data
+
+
+def page_with_set(user, size, with_count):
+    context = {"joined_room_ids": joined_room_ids(user.id)}
+    return PublicRoomSerializer(base_queryset(with_count)[:size], many=True, context=context).data
+
+
+def measure(render, user, size, with_count, repeat=20):
+    render(user, size, with_count)  # warm up, fills the membership cache
+    with CaptureQueriesContext(connection) as queries:
+        render(user, size, with_count)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        render(user, size, with_count)
+    return len(queries.captured_queries), (time.perf_counter() - started) / repeat * 1000
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    joined = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        cache.clear()
+        user = seed(rooms, joined)
+        print(f"{rooms:,} rooms, user joined {len(joined_room_ids(user.id))}")
+        for with_count in (False, True):
+            print("with participant_count" if with_count else "flag only")
+            for size in (9, 50, 100):
+                for label, render in (("exists", page_with_exists), ("set", page_with_set)):
+                    statements, elapsed = measure(render, user, size, with_count)
+                    print(f"  page {size:>3} {label:>6}: {statements} queries, {elapsed:.2f} ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
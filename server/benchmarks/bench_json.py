@@ -0,0 +1,69 @@
+"""
+Throughput of the JSON codecs (peer_port.json_codec) on real payload shapes.
+
+    cd server && python benchmarks/bench_json.py [iterations]
+
+- history page: a RoomMessageListView response, 100 messages;
+- broadcast frame: one ``chat_recieved`` websocket frame, encoded once per
+  recipient socket;
+- incoming frame: a ``send_chat`` frame as ChatConsumer.receive parses it.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from peer_port import json_codec  # noqa: E402
+
+
+def message(n):
+    return {
+        "id": 1000 + n,
+        "sender": 7,
+        "sender_username": "someone",
+        "room": 42,
+        "type": "text",
+        "content": f"message number {n}, with a bit of text and ünïcode ✓",
+        "timestamp": "2026-10-19T18:02:11.123456Z",
+        "seq": n,
+        "msg_type": "received",
+    }
+
+
+PAYLOADS = {
+    "history page": {"count": None, "next": "http://api/rooms/42/messages/?page=2", "previous": None,
+                     "results": [message(n) for n in range(100)]},
+    "broadcast frame": {"type": "chat_recieved", "payload": {"message": message(1), "sender": 7}},
+}
+INCOMING = b'{"type":"send_chat","payload":{"message":"hello there \\u2713"},"message_type":"text"}'
+
+
+def rate(func, arg, iterations):
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func(arg)
+    return iterations / (time.perf_counter() - started)
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    codecs = ["stdlib"] + (["orjson"] if json_codec.orjson is not None else [])
+    for name, payload in PAYLOADS.items():
+        line = [f"{name:>15} dumps:"]
+        for codec in codecs:
+            line.append(f"{codec} {rate(json_codec.get_codec(codec).dumps, payload, iterations):>10,.0f}/s")
+        print("  ".join(line))
+    line = [f"{'incoming frame':>15} loads:"]
+    for codec in codecs:
+        line.append(f"{codec} {rate(json_codec.get_codec(codec).loads, INCOMING, iterations * 10):>10,.0f}/s")
+    print("  ".join(line))
+
+
+if __name__ == "__main__":
+    main()
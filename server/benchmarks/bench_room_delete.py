@@ -0,0 +1,62 @@
+"""
+Seconds to delete a large room, Django's delete collector vs chat.expiry.
+
+    cd server && python benchmarks/bench_room_delete.py [messages]
+
+Runs on a throwaway test database of the configured DB_ENGINE. Fills two
+rooms with the same messages (and their search terms), deletes one with
+``Room.delete()`` and purges the other with ``expiry.purge_rooms``.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from chat import expiry  # noqa: E402
+from chat.models import Room, Message  # noqa: E402
+
+User = get_user_model()
+
+
+def fill(owner, name, count):
+    room = Room.objects.create(owner=owner, name=name)
+    for start in range(0, count, 5000):
+        Message.bulk_create_in_room(room, [
+            Message(sender=owner, room=room, content=f"message number {n} with a few words of text")
+            for n in range(start, min(start + 5000, count))
+        ])
+    return room
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+        collected, purged = fill(owner, "Collector room", count), fill(owner, "Purged room", count)
+
+        started = time.perf_counter()
+        collected.delete()
+        collector = time.perf_counter() - started
+
+        # claimed as delete_room does, purge_rooms skips unclaimed rooms
+        Room.objects.filter(id=purged.id).update(status=Room.DELETING, expires_at=expiry.purge_lease_end(timezone.now()))
+        started = time.perf_counter()
+        expiry.purge_rooms([purged.id])
+        purge = time.perf_counter() - started
+        print(f"{count:,} messages: collector {collector:.2f}s  purge {purge:.2f}s  x{collector / purge:.1f}")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Latency of the in-process room name index (chat.search.RoomNameIndex).
+
+    cd server && python benchmarks/bench_room_search.py [rooms]
+
+Builds an index over synthetic room names (1M by default) and reports the
+per-query latency of prefix and substring searches, best match first, as
+PublicAllRoomListView issues them.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat.search import RoomNameIndex  # noqa: E402
+
+
+WORDS = [
+    "python", "django", "react", "chess", "club", "music", "study", "group", "gaming", "movies",
+    "travel", "coffee", "books", "night", "owls", "coders", "art", "design", "crypto", "hiking",
+    "anime", "fitness", "cooking", "science", "space", "jazz", "rock", "poetry", "startup", "memes",
+]
+
+
+def room_names(count, seed=7):
+    rng = random.Random(seed)
+    for room_id in range(1, count + 1):
+        words = rng.sample(WORDS, 2)
+        yield room_id, f"{words[0].title()} {words[1]} {room_id}"
+
+
+def timed(index, terms, repeat=20):
+    timings = []
+    for term in terms:
+        started = time.perf_counter()
+        for _ in range(repeat):
+            index.search(term, limit=200)
+        timings.append((time.perf_counter() - started) / repeat * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    index = RoomNameIndex()
+
+    started = time.perf_counter()
+    index.load(room_names(count))
+    print(f"indexed {len(index):,} rooms in {time.perf_counter() - started:.1f}s")
+
+    cases = {
+        "prefix": ["py", "pyth", "chess", "jazz r", "coffee night 12"],
+        "substring": ["club", "owls 9", "night 4242", "gaming 99", "ookin"],
+        "no match": ["zzzz", "qwerty"],
+    }
+    for name, terms in cases.items():
+        median, worst = timed(index, terms)
+        print(f"{name:>10}: median {median:.3f} ms, worst {worst:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
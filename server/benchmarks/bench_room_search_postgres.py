@@ -0,0 +1,102 @@
+"""
+Latency of the PostgreSQL room name search (chat.search.PostgresRoomSearch).
+
+    cd server && DB_ENGINE=django.db.backends.postgresql python benchmarks/bench_room_search_postgres.py [rooms]
+
+Runs on a throwaway test database, which must be PostgreSQL (pg_trgm).
+Compares the former query, which ranked every match of the listing queryset
+(participant count join included), with the backend, which ranks the ids on
+chat_room alone and runs the listing query for the page only. Reports the
+median and worst latency per kind of term, as PublicAllRoomListView issues them.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.contrib.postgres.search import TrigramSimilarity  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Case, Count, IntegerField, Value, When  # noqa: E402
+from chat.models import Room  # noqa: E402
+from chat.search import PostgresRoomSearch  # noqa: E402
+
+User = get_user_model()
+
+WORDS = [
+    "python", "django", "react", "chess", "club", "music", "study", "group", "gaming", "movies",
+    "travel", "coffee", "books", "night", "owls", "coders", "art", "design", "crypto", "hiking",
+]
+
+
+def seed(count, seed=7):
+    owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+    rng = random.Random(seed)
+    for start in range(0, count, 10_000):
+        Room.objects.bulk_create(
+            Room(owner=owner, name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS)} {n}")
+            for n in range(start, min(start + 10_000, count))
+        )
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE chat_room")
+
+
+def listing_queryset():
+    # as PublicAllRoomListView builds it
+    return Room.objects.filter(status=Room.ACTIVE).select_related("owner").annotate(participant_count=Count("memberships"))
+
+
+def former_search(queryset, term, limit):
+    return (
+        queryset.filter(name__icontains=term)
+        .annotate(
+            search_prefix=Case(When(name__istartswith=term, then=Value(0)), default=Value(1), output_field=IntegerField()),
+            search_similarity=TrigramSimilarity("name", term),
+        )
+        .order_by("search_prefix", "-search_similarity", "name")[:limit]
+    )
+
+
+def timed(search, terms, repeat=10):
+    timings = []
+    for term in terms:
+        list(search(listing_queryset(), term, 100))  # warm up
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(search(listing_queryset(), term, 100))
+        timings.append((time.perf_counter() - started) / repeat * 1000)
+    timings.sort()
+    return timings[len(timings) // 2], timings[-1]
+
+
+def main():
+    if connection.vendor != "postgresql":
+        sys.exit("needs DB_ENGINE=django.db.backends.postgresql")
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        seed(count)
+        print(f"{count:,} rooms")
+        cases = {
+            "short": ["py", "c"],
+            "prefix": ["pyth", "chess club"],
+            "substring": ["club", "owls 9", "night 4242"],
+            "no match": ["zzzz"],
+        }
+        for name, terms in cases.items():
+            for label, search in (("former", former_search), ("backend", PostgresRoomSearch().search)):
+                median, worst = timed(search, terms)
+                print(f"{name:>10} {label:>8}: median {median:.2f} ms, worst {worst:.2f} ms")
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Rows per second of the list endpoint serializers, DRF vs chat.fast_serializers.
+
+    cd server && python benchmarks/bench_serializers.py [pages]
+
+Runs on a throwaway test database of the configured DB_ENGINE. Serializes
+100-row pages of room messages (MessageSerializer) and of public rooms
+(PublicRoomSerializer with its nested owner and last message), query
+included, and checks both paths render the same JSON bytes.
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "peer_port.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.contrib.auth import get_user_model  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.db.models import Count  # noqa: E402
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+from chat import last_message  # noqa: E402
+from chat.fast_serializers import FastMessageSerializer, FastPublicRoomSerializer  # noqa: E402
+from chat.models import Room, Message  # noqa: E402
+from chat.serializers import MessageSerializer, PublicRoomSerializer  # noqa: E402
+from chat.views import room_messages  # noqa: E402
+
+User = get_user_model()
+PAGE = 100
+
+
+def seed():
+    owner = User.objects.create_user(username="bench_owner", email="owner@bench.local", password="x")
+    rooms = Room.objects.bulk_create(Room(owner=owner, name=f"Bench room {n}") for n in range(PAGE))
+    for room in rooms:
+        message = Message(sender=owner, room=room, content=f"Last words of {room.name}", seq=1)
+        message.save()
+        last_message.tracker.note(room.id, last_message.snapshot_of(message))
+    last_message.flush()
+    Message.bulk_create_in_room(rooms[0], [
+        Message(sender=owner, room=rooms[0], content=f"message number {n} with some text") for n in range(PAGE)
+    ])
+    return owner, rooms[0]
+
+
+def rate(render, pages):
+    started = time.perf_counter()
+    for _ in range(pages):
+        render()
+    return pages * PAGE / (time.perf_counter() - started)
+
+
+def main():
+    pages = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        user, room = seed()
+        messages = room_messages(room, user).order_by("-timestamp")[:PAGE]
+        rooms = Room.objects.select_related("owner").annotate(participant_count=Count("participants")).order_by("-created_at")[:PAGE]
+        cases = {
+            "messages": (
+                lambda: MessageSerializer(messages, many=True).data,
+                lambda: FastMessageSerializer().serialize(FastMessageSerializer.values(messages)),
+            ),
+            "rooms": (
+                lambda: PublicRoomSerializer(rooms, many=True).data,
+                lambda: FastPublicRoomSerializer().serialize(FastPublicRoomSerializer.values(rooms)),
+            ),
+        }
+        for name, (drf, fast) in cases.items():
+            identical = JSONRenderer().render(drf()) == JSONRenderer().render(fast())
+            drf_rate, fast_rate = rate(drf, pages), rate(fast, pages)
+            print(
+                f"{name:>8}: drf {drf_rate:>9,.0f} rows/s  fast {fast_rate:>9,.0f} rows/s  "
+                f"x{fast_rate / drf_rate:.1f}  identical={identical}"
+            )
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Optional per-room actor (``CHAT_ROOM_ACTORS``).
+
+Instead of every ChatConsumer writing and broadcasting on its own, all the
+sockets of a room connected to this worker submit their messages to a single
+asyncio task owning that room. The actor drains its inbox in batches, so a
+busy room costs one transaction and one ``group_send`` per batch rather than
+per message, writes of the room never contend with each other, and fan-out
+order is simply the order of the inbox.
+
+The actor tracks which users are connected to the room through this worker
+and stops on its own once there are none and its inbox is empty. Status and
+participants are still checked inside each batch transaction, since owners
+change them through the REST API which does not go through the actor.
+"""
+import asyncio
+import logging
+from django.conf import settings
+from .services import save_message_batch
+from .tracing import ENQUEUED
+
+
+logger = logging.getLogger(__name__)
+
+_actors = {}
+
+
+class RoomActor:
+    def __init__(self, room_id, channel_layer, loop, batch_size=50, idle_timeout=30.0):
+        self.key = (loop, str(room_id))
+        self.room_id = room_id
+        self.group = f"room_{room_id}"
+        self.channel_layer = channel_layer
+        self.loop = loop
+        self.batch_size = batch_size
+        self.idle_timeout = idle_timeout
+        self.inbox = asyncio.Queue()
+        self.presence = {}  # user id -> connected sockets
+        self.task = None
+
+    def start(self):
+        self.task = self.loop.create_task(self.run())
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def join(self, user_id):
+        self.presence[user_id] = self.presence.get(user_id, 0) + 1
+
+    def leave(self, user_id):
+        remaining = self.presence.get(user_id, 0) - 1
+        if remaining > 0:
+            self.presence[user_id] = remaining
+        else:
+            self.presence.pop(user_id, None)
+
+    async def submit(self, user, message, message_type, trace=None):
+        """Queue a message and wait until it has been persisted and broadcast."""
+        future = self.loop.create_future()
+        await self.inbox.put((user, message, message_type, trace, future))
+        return await future
+
+    async def run(self):
+        while True:
+            try:
+                first = await asyncio.wait_for(self.inbox.get(), self.idle_timeout)
+            except asyncio.TimeoutError:
+                if not self.presence and self.inbox.empty():
+                    if _actors.get(self.key) is self:
+                        del _actors[self.key]
+                    return
+                continue
+
+            batch = [first]
+            while len(batch) < self.batch_size and not self.inbox.empty():
+                batch.append(self.inbox.get_nowait())
+            await self.process(batch)
+
+    async def process(self, batch):
+        items = [(user, message, message_type, trace) for user, message, message_type, trace, _ in batch]
+        try:
+            results = await save_message_batch(self.room_id, items)
+        except Exception as e:
+            logger.error("room actor %s: saving batch failed: %s", self.room_id, e, exc_info=True)
+            results = [e] * len(batch)
+
+        messages = []
+        for (user, _, _, trace, _), result in zip(batch, results):
+            if isinstance(result, Exception):
+                continue
+            event = {"payload": {"message": result, "sender": user.id}}
+            if trace is not None:
+                trace.mark(ENQUEUED)
+                trace.observe_sender_stages()
+                event["trace"] = trace.marks
+            messages.append(event)
+
+        if messages:
+            try:
+                await self.channel_layer.group_send(
+                    self.group,
+                    {"type": "chat_message_batch", "messages": messages},
+                )
+            except Exception as e:
+                logger.error("room actor %s: broadcasting batch failed: %s", self.room_id, e, exc_info=True)
+
+        for (_, _, _, _, future), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+
+def get_room_actor(room_id, channel_layer):
+    """Actor of the room on the running loop, started on first use."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _actors if key[0].is_closed()]:
+        del _actors[key]
+
+    actor = _actors.get((loop, str(room_id)))
+    if actor is None or not actor.running:
+        actor = RoomActor(
+            room_id,
+            channel_layer,
+            loop,
+            batch_size=settings.CHAT_ROOM_ACTOR_BATCH_SIZE,
+            idle_timeout=settings.CHAT_ROOM_ACTOR_IDLE_TIMEOUT,
+        )
+        _actors[actor.key] = actor
+        actor.start()
+    return actor
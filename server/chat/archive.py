@@ -0,0 +1,174 @@
+"""
+Message retention and the cold archive tier.
+
+Messages older than the room's ``retention_days`` (``MESSAGE_RETENTION_DAYS``
+when unset, 0 keeping everything hot) leave ``chat_message`` for
+``MessageArchiveBlock`` rows: ``ARCHIVE_BLOCK_SIZE`` consecutive messages
+per block, stored as one zlib compressed JSON array. Each block is written
+and its messages (with their search terms) deleted in one transaction, so a
+message is always in exactly one tier.
+
+Only a prefix of the history is archived: everything below the first
+message newer than the cutoff, and never the room's last message. The hot
+table therefore always holds the newest messages and the archive the
+oldest, and a history page that runs past the hot rows continues in the
+archive (``ReadThroughMessages``), reading only the blocks it needs. Message
+search covers the hot messages only.
+"""
+import datetime
+import logging
+import zlib
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Min
+from django.utils import timezone
+from peer_port import json_codec
+from . import response_cache
+
+
+logger = logging.getLogger(__name__)
+
+BLOCK_COLUMNS = ("id", "seq", "sender_id", "sender__username", "type", "content", "timestamp")
+
+
+def encode_block(rows):
+    return zlib.compress(json_codec.dumps([
+        [message_id, seq, sender_id, sender_username, message_type, content, timestamp.isoformat()]
+        for message_id, seq, sender_id, sender_username, message_type, content, timestamp in rows
+    ]))
+
+
+def decode_block(data):
+    """Rows of a block in ``BLOCK_COLUMNS`` order, oldest first, timestamps as datetimes."""
+    return [
+        (message_id, seq, sender_id, sender_username, message_type, content, datetime.datetime.fromisoformat(timestamp))
+        for message_id, seq, sender_id, sender_username, message_type, content, timestamp in json_codec.loads(zlib.decompress(data))
+    ]
+
+
+def retention_days(room):
+    return room.retention_days or settings.MESSAGE_RETENTION_DAYS
+
+
+def archive_room(room, now=None, block_size=None):
+    """Move the messages of ``room`` past its retention to the archive; returns how many moved."""
+    from .models import Message, MessageArchiveBlock, MessageTerm
+
+    days = retention_days(room)
+    if not days or room.last_message_seq is None:
+        return 0
+    block_size = block_size or settings.ARCHIVE_BLOCK_SIZE
+    cutoff = (now or timezone.now()) - datetime.timedelta(days=days)
+
+    hot = Message.objects.filter(room_id=room.id)
+    first_recent = hot.filter(timestamp__gte=cutoff).aggregate(seq=Min("seq"))["seq"]
+    upto = min(room.last_message_seq, first_recent or room.last_message_seq)
+
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = list(hot.filter(seq__lt=upto).order_by("seq").values_list(*BLOCK_COLUMNS)[:block_size])
+            if not rows:
+                break
+            MessageArchiveBlock.objects.create(
+                room_id=room.id,
+                first_seq=rows[0][1],
+                last_seq=rows[-1][1],
+                count=len(rows),
+                first_timestamp=rows[0][-1],
+                last_timestamp=rows[-1][-1],
+                data=encode_block(rows),
+            )
+            ids = [row[0] for row in rows]
+            # _raw_delete: one DELETE statement, no collector, no instances
+            terms = MessageTerm.objects.filter(message_id__in=ids)
+            terms._raw_delete(terms.db)
+            messages = Message.objects.filter(id__in=ids)
+            messages._raw_delete(messages.db)
+        archived += len(rows)
+
+    if archived:
+        response_cache.bump(room.id)
+        logger.info("archived %s messages of room %s", archived, room.id)
+    return archived
+
+
+def archive_rooms(now=None):
+    """Apply retention to every room that has one; returns how many messages moved."""
+    from .models import Room
+
+    rooms = Room.objects.exclude(status=Room.DELETING).filter(last_message_seq__isnull=False)
+    if not settings.MESSAGE_RETENTION_DAYS:
+        rooms = rooms.filter(retention_days__isnull=False)
+    return sum(archive_room(room, now=now) for room in rooms.only("id", "retention_days", "last_message_seq").iterator())
+
+
+def cold_rows(room_id, offset, limit):
+    """``limit`` archived rows of the room, newest first, after skipping the ``offset`` newest."""
+    from .models import MessageArchiveBlock
+
+    blocks = MessageArchiveBlock.objects.filter(room_id=room_id).order_by("-first_seq")
+    rows_left = limit
+    wanted = []
+    for block_id, count in blocks.values_list("id", "count"):
+        if offset >= count:
+            offset -= count
+            continue
+        wanted.append((block_id, offset))
+        rows_left -= count - offset
+        offset = 0
+        if rows_left <= 0:
+            break
+
+    data = dict(blocks.filter(id__in=[block_id for block_id, _ in wanted]).values_list("id", "data"))
+    rows = []
+    for block_id, skip in wanted:
+        block_rows = decode_block(data[block_id])
+        block_rows.reverse()
+        rows.extend(block_rows[skip:])
+    return rows[:limit]
+
+
+def archived_rows(room_id, since=None):
+    """Archived rows of the room in ``BLOCK_COLUMNS`` order, oldest first, one block in memory at a time."""
+    from .models import MessageArchiveBlock
+
+    blocks = MessageArchiveBlock.objects.filter(room_id=room_id).order_by("first_seq")
+    if since is not None:
+        blocks = blocks.filter(last_seq__gt=since)
+    for block_id in list(blocks.values_list("id", flat=True)):
+        data = MessageArchiveBlock.objects.filter(id=block_id).values_list("data", flat=True).first()
+        if data is None:
+            continue
+        for row in decode_block(data):
+            if since is None or row[1] > since:
+                yield row
+
+
+class ReadThroughMessages:
+    """
+    The rows of a RoomMessageListView ``values_list`` queryset followed by the
+    room's archived messages in the same column layout (``FastMessageSerializer``),
+    as a sliceable sequence for the page number pagination. Pages within the hot
+    rows cost exactly what the queryset costs.
+    """
+
+    def __init__(self, hot, room_id, user_id):
+        self.hot = hot
+        self.room_id = room_id
+        self.user_id = user_id
+
+    def __getitem__(self, item):
+        start, stop = item.start or 0, item.stop
+        rows = list(self.hot[start:stop])
+        wanted = stop - start - len(rows)
+        if wanted <= 0:
+            return rows
+
+        hot_count = start + len(rows) if rows or not start else self.hot.count()
+        for message_id, seq, sender_id, sender_username, message_type, content, timestamp in cold_rows(
+            self.room_id, start + len(rows) - hot_count, wanted
+        ):
+            msg_type = "sent" if sender_id == self.user_id else "received"
+            rows.append((message_id, sender_id, sender_username, self.room_id, message_type, content, timestamp, seq, msg_type))
+        return rows
@@ -1,8 +1,16 @@
-import json
 import logging
+from functools import partial
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
 from channels.generic.websocket import AsyncWebsocketConsumer
+from peer_port import json_codec
+from peer_port.watchdog import ensure_watchdog
 
-from ..services import permission_to_join_room, participant_leave_room, remove_participant, save_message
+from ..services import permission_to_join_room, participant_leave_room, remove_participant, save_message, mark_read
+from ..actors import get_room_actor
+from ..expiry import ensure_room_sweeper
+from ..outbox import get_dispatcher
+from ..tracing import MessageTrace, RECEIVED, ENQUEUED, DELIVERED
 
 
 logger = logging.getLogger(__name__)
@@ -10,6 +18,8 @@ logger = logging.getLogger(__name__)
 
 class ChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
+        ensure_watchdog()
+        ensure_room_sweeper()
         self.user = self.scope["user"]
         if self.user.is_anonymous:
             await self.close(code=4000, reason="Anonymous users are not allowed")
@@ -20,6 +30,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
         allowed, _ = await permission_to_join_room(self.user, self.room_id)
         if allowed:
+            if settings.CHAT_ROOM_ACTORS:
+                self.actor = get_room_actor(self.room_id, self.channel_layer)
+                self.actor.join(self.user.id)
             await self.channel_layer.group_add(self.room_name, self.channel_name)
             await self.accept()
             await self.channel_layer.group_send(
@@ -42,6 +55,8 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def disconnect(self, close_code):
         if not self.user.is_anonymous:
+            if getattr(self, "actor", None) is not None:
+                self.actor.leave(self.user.id)
             try:
                 await participant_leave_room(self.user, self.room_id)
                 await self.channel_layer.group_discard(
@@ -62,7 +77,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
                     },
                 )
             except Exception as e:
-                logger.error(f"Error in disconnect: {e}", exc_info=True)
+                logger.error("Error in disconnect: %s", e, exc_info=True)
                 # Continue with group discard and notification even if participant_leave_room fails
                 await self.channel_layer.group_discard(
                     self.room_name,
@@ -70,37 +85,97 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 )
             
     async def receive(self, text_data):
-        data = json.loads(text_data)
+        trace = MessageTrace()
+        trace.mark(RECEIVED)
+        data = json_codec.loads(text_data)
         message_type = data["type"]
         payload = data.get("payload")
-        logger.info(f'In recieve: {message_type}')
+        logger.debug('In recieve: %s', message_type)
 
         if message_type == "send_chat":
             message = payload.get('message')
             if not message.strip():
                 return
             msg_type = data.get('message_type', 'text')
-            serialized_message = await save_message(self.user, self.room_id, message, msg_type)
-            await self.channel_layer.group_send(
-                self.room_name,
-                {
-                    "type": "chat_message",
-                    "payload": {
-                        "message": serialized_message,
-                        "sender": self.user.id,
-                    },
-                },
-            )
+            try:
+                if settings.CHAT_ROOM_ACTORS:
+                    await get_room_actor(self.room_id, self.channel_layer).submit(self.user, message, msg_type, trace)
+                else:
+                    # broadcast goes through the room outbox once the write has committed
+                    dispatcher = get_dispatcher(self.channel_layer)
+                    with dispatcher.writing(self.room_name):
+                        await save_message(
+                            self.user, self.room_id, message, msg_type,
+                            trace=trace, publish=partial(self.publish_chat_message, dispatcher, trace),
+                        )
+            except PermissionDenied as e:
+                # e.g. an image without an uploaded media reference, see services.check_message_type
+                logger.warning("Message of user %s in room %s refused: %s", self.user.id, self.room_id, e)
+
+        elif message_type == "read":
+            # read marker, moved forward only
+            seq = payload.get("seq") if payload else None
+            if isinstance(seq, int) and seq > 0:
+                await mark_read(self.user, self.room_id, seq)
 
         elif message_type == "typing":
             pass
 
 
+    def publish_chat_message(self, dispatcher, trace, seq, serialized_message):
+        """on_commit callback of save_message, runs in the database thread."""
+        trace.mark(ENQUEUED)
+        trace.observe_sender_stages()
+        dispatcher.publish(
+            self.room_name,
+            seq,
+            {
+                "type": "chat_message",
+                "trace": trace.marks,
+                "payload": {
+                    "message": serialized_message,
+                    "sender": self.user.id,
+                },
+            },
+        )
+
     async def chat_message(self, event):
+        payload = event["payload"]
+        if "trace" in event:
+            trace = MessageTrace(event["trace"])
+            trace.mark(DELIVERED)
+            trace.observe_recipient_stages()
+            if settings.CHAT_TRACE_PAYLOAD:
+                payload = {**payload, "trace": trace.marks}
+
         await self.send(
-            text_data=json.dumps(
+            text_data=json_codec.dumps_text(
                 {
                     "type": "chat_recieved",
+                    "payload": payload,
+                }
+            )
+        )
+
+    async def chat_message_batch(self, event):
+        for message in event["messages"]:
+            await self.chat_message(message)
+
+    async def room_closed(self, event):
+        reason = event["reason"]
+        await self.group_notification({
+            "sub_type": reason,
+            "room_id": event["room_id"],
+            "payload": {"message": f"This room has been {reason}", "sender": "system"},
+        })
+        await self.close(code=4004, reason=f"Room {reason}")
+
+    async def media_preview(self, event):
+        await self.send(
+            text_data=json_codec.dumps_text(
+                {
+                    "type": "preview_ready",
+                    "room_id": event["room_id"],
                     "payload": event["payload"],
                 }
             )
@@ -108,9 +183,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
 
     async def group_notification(self, event):
         try:
-            logger.debug(f"group_notification: {event}")
+            logger.debug("group_notification: %s", event.get("sub_type"))
             await self.send(
-                text_data=json.dumps(
+                text_data=json_codec.dumps_text(
                     {
                         "type": "group_notification",
                         "sub_type": event.get("sub_type"),
@@ -120,4 +195,4 @@ class ChatConsumer(AsyncWebsocketConsumer):
                 )
             )
         except Exception as e:
-            logger.error(f"Error sending group_notification: {e}", exc_info=True)
+            logger.error("Error sending group_notification: %s", e, exc_info=True)
@@ -0,0 +1,285 @@
+"""
+Room expiry and deletion.
+
+Every room carries an indexed ``expires_at``:
+
+- rooms with a ``lifetime`` (seconds) expire that long after creation;
+- the others expire ``ROOM_IDLE_TIMEOUT`` seconds after their last message
+  was flushed or the room was last saved, 0 meaning never. The deadline moves forward in the same
+  UPDATE that writes the last message snapshot (``chat.last_message``), so
+  sending a message costs no extra query.
+
+``sweep`` handles expired rooms ``ROOM_SWEEP_BATCH_SIZE`` at a time: it
+claims active and inactive ones and marks them ``deleting`` (hidden
+everywhere, joins refused at once), tells their connected sockets, then
+purges them. A claim sets ``expires_at`` to the end of a
+``ROOM_PURGE_LEASE``: until then no other sweep claims the room, and
+``purge_rooms`` skips rooms that are not claimed or whose lease has run
+out, so a room is never purged twice at once. A room claimed but not purged
+(crash, restart) is claimed again once its lease has run out. Each sweep
+also gives rooms without a deadline one when ``ROOM_IDLE_TIMEOUT`` is set
+(rooms from before expiry, or from while it was 0).
+
+``delete_room`` is the owner's delete: the same claim and notification in
+the request, and the purge in a background thread after commit - or by a
+sweep once the lease has run out, if the process dies first.
+
+The purge never goes through Django's delete collector, which loads every
+message of the room to cascade its search terms and clear
+``Room.last_message``: terms and messages are removed with plain
+``DELETE ... WHERE id IN (...)`` statements, ``ROOM_PURGE_BATCH_SIZE``
+messages per transaction, so no statement holds locks for long, and only
+the emptied room rows go through ``delete()`` for their signals.
+
+It runs from the ``expire_rooms`` management command (cron) or in process:
+``ensure_room_sweeper`` starts one ``RoomSweeper`` task per event loop.
+"""
+import asyncio
+import datetime
+import logging
+import threading
+from asgiref.sync import async_to_sync
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, F, Value, When
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+from peer_port import metrics
+from . import membership, response_cache
+
+
+logger = logging.getLogger(__name__)
+
+_sweepers = {}
+
+
+def expires_at_for(room, now=None):
+    """
+    Deadline of ``room`` being saved at ``now``: from its lifetime, or the idle
+    timeout counted from the save. Like ``idle_expiry_update``, never from
+    ``last_message_at``, which imported messages keep from their archive.
+    """
+    now = now or timezone.now()
+    if room.lifetime:
+        return (room.created_at or now) + datetime.timedelta(seconds=room.lifetime)
+    if not settings.ROOM_IDLE_TIMEOUT:
+        return None
+    return now + datetime.timedelta(seconds=settings.ROOM_IDLE_TIMEOUT)
+
+
+def idle_expiry_update(last_activity):
+    """``expires_at`` value for an UPDATE noting activity at ``last_activity``, None when idle expiry is off."""
+    if not settings.ROOM_IDLE_TIMEOUT:
+        return None
+    return Case(
+        When(lifetime__isnull=True, then=Value(
+            last_activity + datetime.timedelta(seconds=settings.ROOM_IDLE_TIMEOUT),
+            output_field=DateTimeField(),
+        )),
+        default=F("expires_at"),
+    )
+
+
+def purge_lease_end(now):
+    return now + datetime.timedelta(seconds=settings.ROOM_PURGE_LEASE)
+
+
+def claim_expired(now=None, limit=None):
+    """
+    Mark up to ``limit`` expired rooms as deleting, oldest deadline first, and
+    return their ids: active and inactive rooms past their deadline, and
+    claimed rooms whose purge lease ran out (their purge died).
+    """
+    from .models import Room
+
+    now = now or timezone.now()
+    limit = limit or settings.ROOM_SWEEP_BATCH_SIZE
+    with transaction.atomic():
+        # skip_locked: sweepers of other processes take the next rooms instead of waiting
+        room_ids = list(
+            Room.objects.select_for_update(skip_locked=True)
+            .filter(expires_at__lte=now, status__in=[Room.ACTIVE, Room.INACTIVE, Room.DELETING])
+            .order_by("expires_at")
+            .values_list("id", flat=True)[:limit]
+        )
+        if room_ids:
+            Room.objects.filter(id__in=room_ids).update(status=Room.DELETING, expires_at=purge_lease_end(now))
+            response_cache.bump(*room_ids)
+    return room_ids
+
+
+def backfill_idle_deadlines(now=None):
+    """
+    Give the rooms without a deadline or lifetime their idle deadline, counted
+    from their last activity, ``ROOM_SWEEP_BATCH_SIZE`` per transaction;
+    returns how many. Nothing to do when ``ROOM_IDLE_TIMEOUT`` is 0.
+    """
+    from .models import Room
+
+    if not settings.ROOM_IDLE_TIMEOUT:
+        return 0
+    now = now or timezone.now()
+    timeout = datetime.timedelta(seconds=settings.ROOM_IDLE_TIMEOUT)
+    rooms = Room.objects.filter(expires_at__isnull=True, lifetime__isnull=True, status__in=[Room.ACTIVE, Room.INACTIVE])
+    updated = 0
+    while True:
+        with transaction.atomic():
+            batch = list(rooms.values_list("id", flat=True)[:settings.ROOM_SWEEP_BATCH_SIZE])
+            if not batch:
+                return updated
+            # updated_at too: a save is activity, and imported rooms keep old message times
+            updated += Room.objects.filter(id__in=batch).update(
+                expires_at=Greatest(Coalesce("last_message_at", "updated_at"), "updated_at") + timeout
+            )
+
+
+async def notify_closed(room_ids, reason="expired", channel_layer=None):
+    """Tell the sockets of each room it is gone (``reason``: expired / deleted); the consumers close themselves."""
+    channel_layer = channel_layer or get_channel_layer()
+    if channel_layer is None:
+        return
+    for room_id in room_ids:
+        await channel_layer.group_send(f"room_{room_id}", {"type": "room_closed", "room_id": room_id, "reason": reason})
+
+
+def delete_room(room):
+    """Hide ``room`` now and purge it in the background once the transaction commits."""
+    from .models import Room
+
+    Room.objects.filter(id=room.id).update(status=Room.DELETING, expires_at=purge_lease_end(timezone.now()))
+    response_cache.bump(room.id)
+    room_ids = [room.id]
+
+    def _committed():
+        async_to_sync(notify_closed)(room_ids, reason="deleted")
+        start_purge(room_ids)
+
+    transaction.on_commit(_committed)
+
+
+def start_purge(room_ids):
+    thread = threading.Thread(target=_purge_in_thread, args=(room_ids,), name="room-purge", daemon=True)
+    thread.start()
+    return thread
+
+
+def _purge_in_thread(room_ids):
+    try:
+        purge_rooms(room_ids)
+    except Exception as e:
+        # the rooms are past their deadline, the sweeper retries
+        logger.error("Purging rooms %s failed: %s", room_ids, e, exc_info=True)
+    finally:
+        connection.close()
+
+
+def purge_rooms(room_ids, batch_size=None):
+    """
+    Delete the rooms with their messages, search terms and memberships, in
+    bounded transactions. Only rooms claimed for deletion whose lease is
+    still running are purged, the others are skipped; returns the purged ids.
+    """
+    from .models import Room, Message, MessageTerm, Participant
+
+    batch_size = batch_size or settings.ROOM_PURGE_BATCH_SIZE
+    room_ids = list(
+        Room.objects.filter(id__in=room_ids, status=Room.DELETING, expires_at__gt=timezone.now())
+        .values_list("id", flat=True)
+    )
+    if not room_ids:
+        return room_ids
+    # nothing may point at the messages about to go
+    Room.objects.filter(id__in=room_ids).update(last_message=None)
+    while True:
+        with transaction.atomic():
+            batch = list(Message.objects.filter(room_id__in=room_ids).values_list("id", flat=True)[:batch_size])
+            if not batch:
+                break
+            # _raw_delete: one DELETE statement, no collector, no instances
+            terms = MessageTerm.objects.filter(message_id__in=batch)
+            terms._raw_delete(terms.db)
+            messages = Message.objects.filter(id__in=batch)
+            messages._raw_delete(messages.db)
+
+    memberships = Participant.objects.filter(room_id__in=room_ids)
+    user_ids = set(memberships.values_list("user_id", flat=True))
+    memberships._raw_delete(memberships.db)
+    # the rooms are empty now; per room post_delete signals retire cached
+    # responses and the room name index entry
+    Room.objects.filter(id__in=room_ids).delete()
+    membership.invalidate(*user_ids)
+    return room_ids
+
+
+def sweep(now=None, notify=True):
+    """Expire every room past its deadline; returns how many were deleted."""
+    backfill_idle_deadlines(now)
+    expired = 0
+    while True:
+        room_ids = claim_expired(now)
+        if not room_ids:
+            break
+        if notify:
+            async_to_sync(notify_closed)(room_ids)
+        purged = purge_rooms(room_ids)
+        expired += len(purged)
+        metrics.counter("rooms.expired").inc(len(purged))
+        logger.info("expired %s rooms", len(purged))
+    return expired
+
+
+class RoomSweeper:
+    def __init__(self, loop, interval):
+        self.loop = loop
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = self.loop.create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.sweep_once()
+            except Exception as e:
+                logger.error("Room sweep failed: %s", e, exc_info=True)
+
+    async def sweep_once(self):
+        await database_sync_to_async(backfill_idle_deadlines)()
+        expired = 0
+        while True:
+            room_ids = await database_sync_to_async(claim_expired)()
+            if not room_ids:
+                return expired
+            await notify_closed(room_ids)
+            purged = await database_sync_to_async(purge_rooms)(room_ids)
+            expired += len(purged)
+            metrics.counter("rooms.expired").inc(len(purged))
+            logger.info("expired %s rooms", len(purged))
+
+
+def ensure_room_sweeper():
+    """Start the sweeper of the running loop if it is enabled and not running yet."""
+    if not settings.ROOM_SWEEPER_ENABLED:
+        return None
+    loop = asyncio.get_running_loop()
+    for closed_loop in [known for known in _sweepers if known.is_closed()]:
+        del _sweepers[closed_loop]
+
+    sweeper = _sweepers.get(loop)
+    if sweeper is None or not sweeper.running:
+        sweeper = _sweepers[loop] = RoomSweeper(loop, settings.ROOM_SWEEP_INTERVAL)
+        sweeper.start()
+    return sweeper
@@ -0,0 +1,134 @@
+"""
+Streaming export of a room's history.
+
+Messages are read in ``seq`` order through the (room, seq) constraint with
+``iterator(chunk_size=EXPORT_CHUNK_SIZE)`` (a server-side cursor on
+PostgreSQL), encoded line by line and handed out in ~64 KiB chunks, so the
+memory used does not depend on the size of the room. Archived messages
+(``chat.archive``) come first, one decompressed block at a time.
+
+NDJSON: one ``{"record": "room", ...}`` line, then one
+``{"record": "message", ...}`` line per message (the format
+``chat.importer`` reads back). CSV: a header row and one row per message.
+``since`` exports only the messages after that seq, for incremental
+exports: pass the ``seq`` of the last exported message.
+"""
+import csv
+import io
+import zlib
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from peer_port import json_codec
+from . import archive
+from .fast_serializers import datetime_formatter
+
+
+NDJSON = "ndjson"
+CSV = "csv"
+CONTENT_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv; charset=utf-8",
+}
+MESSAGE_COLUMNS = ("seq", "id", "sender_id", "sender__username", "type", "content", "timestamp")
+CSV_HEADER = ("seq", "id", "sender", "sender_username", "type", "content", "timestamp")
+BUFFER_SIZE = 64 * 1024
+
+
+def room_record(room):
+    to_representation = datetime_formatter()
+    return {
+        "record": "room",
+        "id": room.id,
+        "name": room.name,
+        "access": room.access,
+        "status": room.status,
+        "limit": room.limit,
+        "created_at": to_representation(room.created_at),
+    }
+
+
+def message_rows(room, since=None):
+    """Archived then hot messages in ``MESSAGE_COLUMNS`` order."""
+    from .models import Message
+
+    for message_id, seq, *fields in archive.archived_rows(room.id, since):
+        yield (seq, message_id, *fields)
+    messages = Message.objects.filter(room_id=room.id)
+    if since is not None:
+        messages = messages.filter(seq__gt=since)
+    yield from messages.order_by("seq").values_list(*MESSAGE_COLUMNS).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE)
+
+
+def ndjson_lines(room, since=None):
+    dumps = json_codec.dumps
+    to_representation = datetime_formatter()
+    yield dumps(room_record(room)) + b"\n"
+    for seq, message_id, sender_id, sender_username, message_type, content, timestamp in message_rows(room, since):
+        yield dumps({
+            "record": "message",
+            "seq": seq,
+            "id": message_id,
+            "sender": sender_id,
+            "sender_username": sender_username,
+            "type": message_type,
+            "content": content,
+            "timestamp": to_representation(timestamp),
+        }) + b"\n"
+
+
+def csv_lines(room, since=None):
+    line = io.StringIO()
+    writer = csv.writer(line)
+    to_representation = datetime_formatter()
+    writer.writerow(CSV_HEADER)
+    for *fields, timestamp in message_rows(room, since):
+        writer.writerow((*fields, to_representation(timestamp)))
+        yield line.getvalue().encode()
+        line.seek(0)
+        line.truncate()
+    if line.tell():
+        yield line.getvalue().encode()
+
+
+def buffered(lines, size=BUFFER_SIZE):
+    """Join small lines into chunks of about ``size`` bytes."""
+    buffer = []
+    length = 0
+    for line in lines:
+        buffer.append(line)
+        length += len(line)
+        if length >= size:
+            yield b"".join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b"".join(buffer)
+
+
+def gzipped(chunks):
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export_chunks(room, output=NDJSON, since=None, gzip=False):
+    lines = ndjson_lines(room, since) if output == NDJSON else csv_lines(room, since)
+    chunks = buffered(lines)
+    return gzipped(chunks) if gzip else chunks
+
+
+async def aiterate(chunks):
+    """
+    Serve a sync generator to an ASGI StreamingHttpResponse one chunk at a
+    time. Given a sync iterator, Django's ASGI handler would read all of it
+    into memory first; the database thread keeps the cursor between chunks.
+    """
+    get_next = sync_to_async(next, thread_sensitive=True)
+    while True:
+        chunk = await get_next(chunks, None)
+        if chunk is None:
+            return
+        yield chunk
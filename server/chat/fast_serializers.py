@@ -0,0 +1,114 @@
+"""
+Read-only fast path for the high volume list endpoints.
+
+The ModelSerializers stay the reference (schema, writes, detail views). For
+RoomMessageListView and PublicAllRoomListView rows are read with
+``values_list()`` and unpacked straight into dicts: no model instances and
+no per-field ``get_attribute`` / ``to_representation`` calls. Each class
+produces the same keys, in the same order and with the same values, as the
+ModelSerializer it stands for, so the rendered JSON is byte-identical.
+Keep ``columns`` and the dict in step with that serializer's ``fields``.
+"""
+import datetime
+from django.conf import settings
+from django.utils import timezone
+from rest_framework.fields import DateTimeField, ISO_8601
+from rest_framework.settings import api_settings
+
+
+def datetime_formatter():
+    """``DateTimeField.to_representation`` for the active timezone, as a plain function."""
+    if api_settings.DATETIME_FORMAT is None or api_settings.DATETIME_FORMAT.lower() != ISO_8601:
+        return DateTimeField().to_representation
+
+    tz = timezone.get_current_timezone() if settings.USE_TZ else None
+
+    def to_representation(value):
+        if not value:
+            return None
+        if tz is not None:
+            value = value.astimezone(tz) if timezone.is_aware(value) else timezone.make_aware(value, tz)
+        elif timezone.is_aware(value):
+            value = timezone.make_naive(value, datetime.timezone.utc)
+        value = value.isoformat()
+        if value.endswith("+00:00"):
+            value = value[:-6] + "Z"
+        return value
+
+    return to_representation
+
+
+class FastMessageSerializer:
+    """MessageSerializer over a RoomMessageListView queryset (annotated sender_username and msg_type)."""
+    columns = ("id", "sender_id", "sender_username", "room_id", "type", "content", "timestamp", "seq", "msg_type")
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values_list(*cls.columns)
+
+    def serialize(self, rows):
+        timestamp = datetime_formatter()
+        return [
+            {
+                "id": message_id,
+                "sender": sender_id,
+                "sender_username": sender_username,
+                "room": room_id,
+                "type": message_type,
+                "content": content,
+                "timestamp": timestamp(sent_at),
+                "seq": seq,
+                "msg_type": msg_type,
+            }
+            for message_id, sender_id, sender_username, room_id, message_type, content, sent_at, seq, msg_type in rows
+        ]
+
+
+class FastPublicRoomSerializer:
+    """
+    PublicRoomSerializer over a PublicAllRoomListView queryset (annotated
+    participant_count), with its nested owner and last message snapshot.
+    """
+    columns = (
+        "id", "name", "owner_id", "owner__username", "access", "limit", "participant_count",
+        "last_message_id", "last_message_sender_id", "last_message_sender_username", "last_message_type",
+        "last_message_preview", "last_message_at", "last_message_seq", "created_at", "updated_at",
+    )
+
+    @classmethod
+    def values(cls, queryset):
+        return queryset.values_list(*cls.columns)
+
+    def serialize(self, rows, joined_room_ids=None):
+        to_representation = datetime_formatter()
+        data = []
+        for (
+            room_id, name, owner_id, owner_username, access, limit, participant_count,
+            message_id, sender_id, sender_username, message_type, preview, message_at, message_seq,
+            created_at, updated_at,
+        ) in rows:
+            last_message = None
+            if message_id is not None:
+                last_message = {
+                    "id": message_id,
+                    "room": room_id,
+                    "sender": sender_id,
+                    "sender_username": sender_username,
+                    "type": message_type,
+                    "content": preview,
+                    "timestamp": to_representation(message_at),
+                    "seq": message_seq,
+                }
+            data.append({
+                "id": room_id,
+                "name": name,
+                "owner": {"id": owner_id, "username": owner_username},
+                "access": access,
+                "limit": limit,
+                "participant_count": participant_count,
+                "is_participant": None if joined_room_ids is None else room_id in joined_room_ids,
+                "last_message": last_message,
+                "created_at": to_representation(created_at),
+                "updated_at": to_representation(updated_at),
+            })
+        return data
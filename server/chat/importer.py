@@ -0,0 +1,214 @@
+"""
+Bulk import of NDJSON room archives (the format of ``chat.export``).
+
+A ``{"record": "room", ...}`` line opens a room, created with the given
+owner or, when that owner already has a room of that name, appended to; a
+name taken by another user's room or by a room being deleted is an error.
+Room fields are checked with ``chat.validators``. The following
+``{"record": "message", ...}`` lines belong to it.
+
+Seqs are given in insertion order, so messages must come in timestamp order
+for seq and timestamp order to agree: a message older than the one before it
+(or, when appending, than the room's newest message) is not inserted. When
+it matches a message of the room by sender, type, content and timestamp it
+is counted as a duplicate, so importing the same archive twice adds nothing;
+otherwise it is counted as out of order. Messages are inserted with
+``Message.bulk_create_in_room``, ``chunk_size`` at a time, one transaction
+per chunk; they are numbered after the room's last seq, keep their original
+timestamp and get their search terms in the same transaction. No
+``Message.save`` per row.
+
+Work that only needs the final state is done once per room, after its last
+chunk: the last message snapshot, adding the senders as participants, and
+the membership / response cache invalidation.
+
+Senders are matched by username; messages of unknown users, and image
+messages that do not reference media already posted in the room, are skipped
+and counted. Other message types are errors. Timestamps without an offset are taken in the current time zone.
+"""
+import logging
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.contrib.auth import get_user_model
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from peer_port import json_codec
+from . import last_message as last_messages
+from . import media, membership, response_cache
+from .validators import validate_access, validate_limit, validate_name, validate_status
+from .models import Room, Message, Participant
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+MESSAGE_TYPES = {message_type for message_type, _ in Message.TYPE_CHOICES}
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+def parse_timestamp(value):
+    """An aware datetime, or None without one; naive values are in the current time zone."""
+    if not value:
+        return None
+    try:
+        timestamp = parse_datetime(value)
+    except (ValueError, TypeError):
+        timestamp = None
+    if timestamp is None:
+        raise ArchiveError(f"invalid timestamp {value!r}")
+    if timezone.is_naive(timestamp):
+        timestamp = timezone.make_aware(timestamp)
+    return timestamp
+
+
+class RoomImporter:
+    def __init__(self, owner, chunk_size=None):
+        self.owner = owner
+        self.chunk_size = chunk_size or settings.IMPORT_CHUNK_SIZE
+        self.users = {owner.username: owner}
+        self.stats = {"rooms": 0, "messages": 0, "skipped": 0, "duplicates": 0, "out_of_order": 0}
+        self.room = None
+        self.after = None
+        self.latest = None
+        self.pending = []
+        self.senders = set()
+        self.last = None
+
+    def run(self, lines):
+        for number, line in enumerate(lines, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json_codec.loads(line)
+                kind = record["record"]
+            except (ValueError, KeyError, TypeError):
+                raise ArchiveError(f"line {number}: not an archive record")
+
+            try:
+                if kind == "room":
+                    self.finish_room()
+                    self.start_room(record)
+                elif kind == "message":
+                    if self.room is None:
+                        raise ArchiveError("message before any room record")
+                    self.add_message(record)
+                else:
+                    raise ArchiveError(f"unknown record {kind!r}")
+            except KeyError as e:
+                raise ArchiveError(f"line {number}: missing field {e}")
+            except ArchiveError as e:
+                raise ArchiveError(f"line {number}: {e}")
+        self.finish_room()
+        return self.stats
+
+    def start_room(self, record):
+        name = record["name"]
+        room = Room.objects.filter(name=name).first()
+        if room is None:
+            fields = {
+                "access": record.get("access", Room.PUBLIC),
+                "status": record.get("status", Room.ACTIVE),
+                "limit": record.get("limit", 10),
+            }
+            try:
+                validate_name(name)
+                validate_access(fields["access"])
+                validate_status(fields["status"])
+                validate_limit(fields["limit"])
+            except ValidationError as e:
+                raise ArchiveError(f"room {name!r}: {' '.join(e.messages)}")
+            except TypeError:
+                raise ArchiveError(f"room {name!r}: invalid room fields")
+            room = Room.objects.create(owner=self.owner, name=name, **fields)
+            self.stats["rooms"] += 1
+        elif room.owner_id != self.owner.id:
+            raise ArchiveError(f"room {name!r} belongs to another user")
+        elif room.status == Room.DELETING:
+            raise ArchiveError(f"room {name!r} is being deleted")
+        else:
+            self.after = room.messages.aggregate(last=Max("timestamp"))["last"] or room.last_message_at
+        self.room = room
+        self.latest = self.after
+
+    def sender(self, record):
+        username = record.get("sender_username")
+        if username not in self.users:
+            self.users[username] = User.objects.filter(username=username).first()
+        return self.users[username]
+
+    def add_message(self, record):
+        sender = self.sender(record)
+        if sender is None:
+            self.stats["skipped"] += 1
+            return
+        message_type, content = record.get("type", "text"), record["content"]
+        if message_type not in MESSAGE_TYPES:
+            raise ArchiveError(f"unknown message type {message_type!r}")
+        if not isinstance(content, str):
+            raise ArchiveError("message content must be a string")
+        if message_type == "image" and not media.is_room_reference(content, self.room.id):
+            # as on the socket (services.check_message_type): images only reference media of the room
+            self.stats["skipped"] += 1
+            return
+        message = Message(sender=sender, room=self.room, type=message_type, content=content)
+        timestamp = parse_timestamp(record.get("timestamp"))
+        if timestamp is not None and self.latest is not None and timestamp <= self.latest:
+            if self.after is not None and timestamp <= self.after and self.exists(message, timestamp):
+                self.stats["duplicates"] += 1
+                return
+            if timestamp < self.latest:
+                self.stats["out_of_order"] += 1
+                return
+        if timestamp is not None:
+            message.timestamp = timestamp
+        self.latest = message.timestamp
+        self.pending.append(message)
+        self.senders.add(sender.id)
+        if len(self.pending) >= self.chunk_size:
+            self.flush_chunk()
+
+    def exists(self, message, timestamp):
+        """Whether the room already has this message (same sender, type, content and time)."""
+        contents = self.room.messages.filter(
+            timestamp=timestamp, sender_id=message.sender_id, type=message.type,
+        ).values_list("content", flat=True)
+        # compared after reading: lookups see the stored (maybe compressed) text
+        return message.content in contents
+
+    def flush_chunk(self):
+        if not self.pending:
+            return
+        Message.bulk_create_in_room(self.room, self.pending, track_last_message=False)
+        self.stats["messages"] += len(self.pending)
+        self.last = self.pending[-1]
+        self.pending = []
+
+    def finish_room(self):
+        if self.room is None:
+            return
+        self.flush_chunk()
+        if self.last is not None:
+            last_messages.tracker.note(self.room.id, last_messages.snapshot_of(self.last))
+            last_messages.flush()
+        if self.senders:
+            last_seq = self.last.seq if self.last is not None else None
+            Participant.objects.bulk_create(
+                [Participant(room_id=self.room.id, user_id=user_id, last_read_seq=last_seq) for user_id in self.senders],
+                ignore_conflicts=True,
+            )
+            membership.invalidate(*self.senders)
+        response_cache.bump(self.room.id)
+        logger.info("imported into room %s (%s)", self.room.id, self.room.name)
+        self.room = None
+        self.after = None
+        self.latest = None
+        self.senders = set()
+        self.last = None
+
+
+def import_rooms(lines, owner, chunk_size=None):
+    """Import archive lines (bytes or str); returns the room / message / skipped / duplicate / out of order counts."""
+    return RoomImporter(owner, chunk_size=chunk_size).run(lines)
@@ -0,0 +1,121 @@
+"""
+Denormalized "last message" snapshot of a room.
+
+Inserting a message no longer touches the room row inside the INSERT
+transaction. Each committed message is noted here and the newest one per
+room is written to the ``Room.last_message_*`` columns with a plain
+``UPDATE`` (no ``save()``, so no ``updated_at`` bump and no signals), which
+also moves the idle expiry deadline of the room (``chat.expiry``), counted
+from the flush rather than the message timestamp, which imported messages
+keep from their archive:
+
+- coalesced, one UPDATE per room per ``LAST_MESSAGE_FLUSH_INTERVAL``
+  (1 second by default), from a timer thread, and once more at exit;
+- right after commit when the interval is 0.
+
+The UPDATE only moves forward (``last_message_seq`` guard), so late or
+out-of-order flushes can never roll the snapshot back, and ``Room.save()``
+leaves the ``FIELDS`` columns out of its UPDATE so a room loaded before a
+flush cannot write an older snapshot back. List views read the snapshot
+columns and never join ``chat_message``. The snapshot lags by up to the
+interval, what must be exact (the newest seq of a room) reads ``chat_message``.
+"""
+import atexit
+import threading
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from . import expiry, response_cache
+
+FIELDS = (
+    "last_message_id", "last_message_seq", "last_message_sender_id", "last_message_sender_username",
+    "last_message_type", "last_message_preview", "last_message_at",
+)
+
+
+def snapshot_of(message):
+    return {
+        "last_message_id": message.id,
+        "last_message_seq": message.seq,
+        "last_message_sender_id": message.sender_id,
+        "last_message_sender_username": message.sender.username,
+        "last_message_type": message.type,
+        "last_message_preview": message.content[:settings.LAST_MESSAGE_PREVIEW_LENGTH],
+        "last_message_at": message.timestamp,
+    }
+
+
+class LastMessageTracker:
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._timer = None
+        # snapshots still waiting for the timer are written before the process ends
+        atexit.register(self.flush)
+
+    def note(self, room_id, snapshot):
+        with self._lock:
+            current = self._pending.get(room_id)
+            if current is None or current["last_message_seq"] < snapshot["last_message_seq"]:
+                self._pending[room_id] = snapshot
+
+    def note_on_commit(self, message):
+        """Remember the message once its transaction commits, never before."""
+        room_id = message.room_id
+        snapshot = snapshot_of(message)
+        # keep the in-memory room in step, callers holding it see the new snapshot
+        if "room" in message._state.fields_cache:
+            for field, value in snapshot.items():
+                setattr(message.room, field, value)
+
+        def _committed():
+            self.note(room_id, snapshot)
+            if settings.LAST_MESSAGE_FLUSH_INTERVAL > 0:
+                self._schedule()
+            else:
+                self.flush()
+
+        transaction.on_commit(_committed)
+
+    def _schedule(self):
+        with self._lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(settings.LAST_MESSAGE_FLUSH_INTERVAL, self._flush_in_thread)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _flush_in_thread(self):
+        try:
+            self.flush()
+        finally:
+            connection.close()
+
+    def flush(self):
+        """Write pending snapshots, one UPDATE per room."""
+        from .models import Room
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._timer = None
+
+        now = timezone.now()
+        for room_id, snapshot in pending.items():
+            values = dict(snapshot)
+            expires_at = expiry.idle_expiry_update(now)
+            if expires_at is not None:
+                values["expires_at"] = expires_at
+            updated = Room.objects.filter(
+                Q(last_message_seq__isnull=True) | Q(last_message_seq__lt=snapshot["last_message_seq"]),
+                pk=room_id,
+            ).update(**values)
+            if updated:
+                # the room detail only, see chat.response_cache
+                response_cache.bump(room_id, listing=False)
+        return len(pending)
+
+
+tracker = LastMessageTracker()
+note_on_commit = tracker.note_on_commit
+flush = tracker.flush
@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from chat.archive import archive_rooms
+
+
+class Command(BaseCommand):
+    help = "Move messages past their room's retention to the compressed archive"
+
+    def handle(self, *args, **options):
+        archived = archive_rooms()
+        self.stdout.write(f"{archived} messages archived")
@@ -0,0 +1,58 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import models, transaction
+from django.db.models.functions import Cast, Length
+from chat.models import Message
+from peer_port.fields import MARKER, is_encoded
+
+
+class Command(BaseCommand):
+    help = (
+        "Compress the content of messages stored before CompressedTextField (or below a lowered threshold) "
+        "and escape the ones stored raw with a leading marker character"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="messages rewritten per transaction")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        # the filters see the stored text: long and not compressed (or escaped) yet
+        candidates = (
+            Message.objects.annotate(stored_length=Length("content"))
+            .filter(stored_length__gte=settings.COMPRESSED_TEXT_THRESHOLD)
+            .exclude(content__startswith=MARKER)
+        )
+        rewritten = 0
+        for batch in self.batches(candidates.only("id", "content"), batch_size):
+            self.rewrite(batch)
+            rewritten += len(batch)
+
+        # raw text starting with the marker would be misread through the field:
+        # read it as stored (a plain text cast) and write it back escaped
+        marked = (
+            Message.objects.filter(content__startswith=MARKER)
+            .annotate(stored=Cast("content", models.TextField()))
+            .only("id")
+        )
+        for batch in self.batches(marked, batch_size):
+            legacy = [Message(id=message.id, content=message.stored) for message in batch if not is_encoded(message.stored)]
+            self.rewrite(legacy)
+            rewritten += len(legacy)
+        self.stdout.write(f"{rewritten} messages rewritten")
+
+    def batches(self, queryset, batch_size):
+        last_id = 0
+        while True:
+            batch = list(queryset.filter(id__gt=last_id).order_by("id")[:batch_size])
+            if not batch:
+                return
+            last_id = batch[-1].id
+            yield batch
+
+    def rewrite(self, messages):
+        if not messages:
+            return
+        with transaction.atomic():
+            # bulk_update writes through the field, which compresses what shrinks and escapes the rest
+            Message.objects.bulk_update(messages, ["content"])
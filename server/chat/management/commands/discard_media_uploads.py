@@ -0,0 +1,14 @@
+import datetime
+from django.core.management.base import BaseCommand
+from chat.media import discard_stale_uploads
+
+
+class Command(BaseCommand):
+    help = "Delete media uploads that were never completed"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=float, default=24, help="idle hours after which an upload is abandoned")
+
+    def handle(self, *args, **options):
+        discarded = discard_stale_uploads(datetime.timedelta(hours=options["hours"]))
+        self.stdout.write(f"{discarded} uploads discarded")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from chat.expiry import sweep
+
+
+class Command(BaseCommand):
+    help = "Deactivate, notify and delete the rooms past their expiry deadline"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--no-notify", action="store_true", help="do not message the connected sockets")
+
+    def handle(self, *args, **options):
+        expired = sweep(notify=not options["no_notify"])
+        self.stdout.write(f"{expired} rooms expired")
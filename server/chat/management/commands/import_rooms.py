@@ -0,0 +1,40 @@
+import gzip
+import sys
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from chat.importer import ArchiveError, import_rooms
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Import NDJSON room archives (as written by the room export), optionally gzipped"
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="archive files, .gz allowed, - for stdin")
+        parser.add_argument("--owner", required=True, help="username owning the rooms created by the import")
+        parser.add_argument("--chunk-size", type=int, help="messages per INSERT / transaction (IMPORT_CHUNK_SIZE)")
+
+    def handle(self, *args, **options):
+        try:
+            owner = User.objects.get(username=options["owner"])
+        except User.DoesNotExist:
+            raise CommandError(f"user {options['owner']!r} does not exist")
+
+        for path in options["paths"]:
+            if path == "-":
+                archive = sys.stdin.buffer
+            elif path.endswith(".gz"):
+                archive = gzip.open(path, "rb")
+            else:
+                archive = open(path, "rb")
+            try:
+                with archive:
+                    stats = import_rooms(archive, owner, chunk_size=options["chunk_size"])
+            except ArchiveError as e:
+                raise CommandError(f"{path}: {e}")
+            self.stdout.write(
+                f"{path}: {stats['rooms']} rooms created, {stats['messages']} messages imported, "
+                f"{stats['skipped']} skipped (unknown sender or media), {stats['duplicates']} already imported, "
+                f"{stats['out_of_order']} out of order"
+            )
@@ -0,0 +1,248 @@
+"""
+Binary media of image messages.
+
+Uploads are chunked: the client opens an upload with the total size and
+content type, then PUTs the bytes in order, at most ``MEDIA_CHUNK_SIZE`` per
+request, each one appended to a temporary file under
+``CHAT_MEDIA_ROOT/uploads``. A chunk at the wrong offset is refused with the
+offset expected, so an interrupted upload resumes where it stopped.
+
+Once the last byte is in, the file is hashed and linked to
+``CHAT_MEDIA_ROOT/<ab>/<cd>/<sha256>`` (the upload file goes on commit):
+identical files are stored once (``Media`` is keyed by the digest) and never
+change, so they are served with an immutable ETag. The image message only carries the reference
+``media:<sha256>`` in its content; the bytes never go through the channel
+layer or the message tables.
+
+Serving supports single ``Range`` requests. With ``MEDIA_SENDFILE_HEADER``
+set (``X-Accel-Redirect`` for nginx, ``X-Sendfile`` for Apache), the
+response only names the file under ``MEDIA_SENDFILE_PREFIX`` and the front
+server sends it, ranges included; set it in production. Otherwise Django
+streams the file block by block, read in worker threads under ASGI
+(``aread_range``) so neither the event loop nor memory holds a whole file.
+
+Previews of each image are rendered after the upload (``chat.previews``).
+"""
+import hashlib
+import os
+import re
+import shutil
+from asgiref.sync import async_to_sync, sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from . import previews
+from .outbox import get_dispatcher
+
+
+REFERENCE_PREFIX = "media:"
+_REFERENCE = re.compile(r"^media:([0-9a-f]{64})$")
+HASH_BLOCK_SIZE = 1024 * 1024
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class UploadError(ValueError):
+    pass
+
+
+def reference(sha256):
+    return REFERENCE_PREFIX + sha256
+
+
+def is_room_reference(content, room_id):
+    """Whether ``content`` is a reference to media already posted in the room."""
+    from .models import Media
+
+    match = _REFERENCE.match(content)
+    return match is not None and Media.rooms.through.objects.filter(
+        media__sha256=match.group(1), room_id=room_id,
+    ).exists()
+
+
+def relative_path(sha256):
+    return os.path.join(sha256[:2], sha256[2:4], sha256)
+
+
+def stored_path(sha256):
+    return os.path.join(settings.CHAT_MEDIA_ROOT, relative_path(sha256))
+
+
+def upload_path(upload_id):
+    return os.path.join(settings.CHAT_MEDIA_ROOT, "uploads", str(upload_id))
+
+
+def validate_upload(size, content_type):
+    if content_type not in settings.MEDIA_ALLOWED_TYPES:
+        raise UploadError(f"Content type must be one of: {', '.join(settings.MEDIA_ALLOWED_TYPES)}.")
+    if not 0 < size <= settings.MEDIA_MAX_SIZE:
+        raise UploadError(f"Size must be between 1 and {settings.MEDIA_MAX_SIZE} bytes.")
+
+
+def append_chunk(upload, offset, stream, length):
+    """
+    Append ``length`` bytes of ``stream`` at ``offset`` of the upload and
+    return the new received count. Callers hold the upload row lock.
+    """
+    if offset != upload.received:
+        raise UploadError(f"Expected offset {upload.received}.")
+    if length <= 0 or length > settings.MEDIA_CHUNK_SIZE or upload.received + length > upload.size:
+        raise UploadError(f"Chunks hold 1 to {settings.MEDIA_CHUNK_SIZE} bytes within the upload size.")
+
+    path = upload_path(upload.id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    written = 0
+    with open(path, "r+b" if upload.received else "wb") as file:
+        file.seek(upload.received)
+        file.truncate()
+        while written < length:
+            data = stream.read(min(HASH_BLOCK_SIZE, length - written))
+            if not data:
+                break
+            file.write(data)
+            written += len(data)
+    if written != length:
+        raise UploadError("The chunk ended before its Content-Length.")
+    return upload.received + written
+
+
+def store(upload):
+    """
+    Hash the completed upload, link it to its content address and return its
+    ``Media``. The upload file is only removed once the transaction commits:
+    after a rollback the upload is still complete and can be finished again.
+    """
+    from .models import Media
+
+    path = upload_path(upload.id)
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    sha256 = digest.hexdigest()
+
+    target = stored_path(sha256)
+    if not os.path.exists(target):
+        # content addressed and immutable: a file stored by a transaction
+        # that rolls back is harmless, the next upload of the bytes reuses it
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = f"{target}.{upload.id}.part"
+        try:
+            os.link(path, partial)
+        except OSError:
+            shutil.copyfile(path, partial)
+        os.replace(partial, target)
+    transaction.on_commit(lambda: _remove(path))
+    media, _ = Media.objects.get_or_create(
+        sha256=sha256, defaults={"size": upload.size, "content_type": upload.content_type},
+    )
+    return media
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def complete_upload(upload):
+    """
+    Store the media of a completed upload and post its image message in the
+    upload's room; returns the message. Runs inside the caller's transaction,
+    and may run again for the same upload if that transaction rolled back.
+    """
+    from .models import Message
+    from .serializers import MiniMessageSerializer
+
+    media = store(upload)
+    media.rooms.add(upload.room_id)
+    message = Message(sender=upload.owner, room=upload.room, type="image", content=reference(media.sha256))
+    message.save()
+    upload.delete()
+    data = MiniMessageSerializer(message).data
+    transaction.on_commit(lambda: announce(message.room_id, message.sender_id, data))
+    transaction.on_commit(lambda: previews.schedule(media.sha256, message.room_id, message.id))
+    return message
+
+
+def announce(room_id, sender_id, data):
+    """
+    Broadcast a committed image message like a chat message (it is only a
+    reference), through the room outbox so it keeps its place in seq order.
+    """
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+
+    async def _send():
+        # under ASGI this runs on the server loop, the one the consumers' outboxes live on
+        await get_dispatcher(channel_layer).send(
+            f"room_{room_id}", data["seq"],
+            {"type": "chat_message", "payload": {"message": data, "sender": sender_id}},
+        )
+
+    async_to_sync(_send)()
+
+
+def discard_stale_uploads(age):
+    """Delete uploads (rows and partial files) not touched for ``age``; returns how many."""
+    from .models import MediaUpload
+
+    stale = list(MediaUpload.objects.filter(updated_at__lt=timezone.now() - age).values_list("id", flat=True))
+    for upload_id in stale:
+        with transaction.atomic():
+            MediaUpload.objects.filter(id=upload_id).delete()
+        _remove(upload_path(upload_id))
+    return len(stale)
+
+
+def parse_range(header, size):
+    """
+    ``(start, end)`` (inclusive) of a single ``bytes=`` range, None to send
+    the whole file, or ``ValueError`` when the range cannot be satisfied.
+    Multiple ranges are answered with the whole file, as RFC 9110 allows.
+    """
+    match = _RANGE.match(header.strip()) if header else None
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start:
+        if not end or int(end) == 0:
+            raise ValueError(header)
+        return max(size - int(end), 0), size - 1
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def read_range(path, start, end, block_size=64 * 1024):
+    with open(path, "rb") as file:
+        file.seek(start)
+        left = end - start + 1
+        while left > 0:
+            data = file.read(min(block_size, left))
+            if not data:
+                return
+            left -= len(data)
+            yield data
+
+
+async def aread_range(path, start, end):
+    """
+    ``read_range`` for ASGI responses, one block at a time: given a sync
+    iterator, Django's ASGI handler would read the whole file into memory.
+    Blocks are read in worker threads, not the database thread.
+    """
+    blocks = read_range(path, start, end)
+    get_next = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            block = await get_next(blocks, None)
+            if block is None:
+                return
+            yield block
+    finally:
+        blocks.close()
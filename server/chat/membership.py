@@ -0,0 +1,44 @@
+"""
+Per-user set of joined room ids.
+
+Room listings need ``is_participant`` for every room on the page. Instead of
+a correlated ``EXISTS`` per row, the ids of the rooms the user takes part in
+are read once (one indexed query on the participants table) and kept in the
+cache for ``MEMBERSHIP_CACHE_TIMEOUT`` seconds. Every ``Participant``
+saved or deleted, and every ``participants.add()`` / ``remove()``,
+invalidates the user's entry (chat.signals), right away and again after
+commit so a concurrent request cannot cache the old set. Bulk writes
+(room creation, import, purge) invalidate explicitly. Without a shared
+cache backend (``peer_port.caching``) the set is read on every call: an
+invalidation in one worker would not reach the others.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from peer_port import caching
+
+
+def _key(user_id):
+    return f"chat:joined-rooms:{user_id}"
+
+
+def joined_room_ids(user_id):
+    """Ids of the rooms the user takes part in (owned rooms included)."""
+    from .models import Participant
+
+    shared = caching.is_shared()
+    key = _key(user_id)
+    room_ids = cache.get(key) if shared else None
+    if room_ids is None:
+        room_ids = frozenset(
+            Participant.objects.filter(user_id=user_id).values_list("room_id", flat=True)
+        )
+        if shared:
+            cache.set(key, room_ids, settings.MEMBERSHIP_CACHE_TIMEOUT)
+    return room_ids
+
+
+def invalidate(*user_ids):
+    keys = [_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
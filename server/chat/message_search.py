@@ -0,0 +1,116 @@
+"""
+Full-text search over a room's message history.
+
+Every text message is split into its distinct words when it is written and
+the words are stored in ``MessageTerm`` (room, term, seq, message), in the
+same transaction as the message INSERT. Search never reads ``content``:
+
+- the longest query word picks the candidate rows through the
+  (room, term, -seq) index, newest first;
+- every other word is an ``EXISTS`` probe on the (message, term) constraint;
+- pages are keyset based, ``before=<seq>`` continues below the last hit.
+
+Context windows around the hits are read by ``seq`` range through the
+(room, seq) constraint, so jumping to a hit never pages through the room.
+"""
+import re
+from django.db import connection
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.constants import OnConflict
+
+
+TERM_MAX_LENGTH = 64
+_WORD = re.compile(r"\w+")
+
+
+def tokenize(text):
+    """Distinct lowercased words of ``text``, in order of appearance."""
+    terms = {}
+    for word in _WORD.findall(text.lower()):
+        terms.setdefault(word[:TERM_MAX_LENGTH], None)
+    return list(terms)
+
+
+def term_rows(messages):
+    return [
+        (message.room_id, message.pk, message.seq, term)
+        for message in messages
+        if message.type == "text"
+        for term in tokenize(message.content)
+    ]
+
+
+def insert_terms(rows):
+    """
+    ``bulk_create(ignore_conflicts=True)`` of MessageTerm rows given as
+    (room_id, message_id, seq, term) tuples, as one ``executemany``: a message
+    has a dozen terms, so building model instances would cost more than the
+    message INSERT itself.
+    """
+    from .models import MessageTerm
+
+    if not rows:
+        return
+    ops = connection.ops
+    meta = MessageTerm._meta
+    fields = [meta.get_field(name) for name in ("room", "message", "seq", "term")]
+    sql = "%s %s (%s) VALUES (%s) %s" % (
+        ops.insert_statement(on_conflict=OnConflict.IGNORE),
+        ops.quote_name(meta.db_table),
+        ", ".join(ops.quote_name(field.column) for field in fields),
+        ", ".join(["%s"] * len(fields)),
+        ops.on_conflict_suffix_sql(fields, OnConflict.IGNORE, None, None),
+    )
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, rows)
+
+
+def index_messages(messages, replace=False):
+    """Write the terms of saved messages. ``replace`` drops their old terms first."""
+    from .models import MessageTerm
+
+    if replace:
+        MessageTerm.objects.filter(message_id__in=[message.pk for message in messages]).delete()
+    insert_terms(term_rows(messages))
+
+
+def search_message_seqs(room_id, query, before=None, limit=20):
+    """
+    ``seq`` of the messages of the room containing every word of ``query``,
+    newest first, below ``before`` when given.
+    """
+    from .models import MessageTerm
+
+    terms = sorted(tokenize(query), key=len, reverse=True)
+    if not terms:
+        return []
+
+    postings = MessageTerm.objects.filter(room_id=room_id, term=terms[0])
+    for term in terms[1:]:
+        postings = postings.filter(
+            Exists(MessageTerm.objects.filter(message_id=OuterRef("message_id"), term=term))
+        )
+    if before is not None:
+        postings = postings.filter(seq__lt=before)
+    return list(postings.order_by("-seq").values_list("seq", flat=True)[:limit])
+
+
+def context_windows(queryset, seqs, size):
+    """
+    Messages of ``queryset`` within ``size`` positions of each seq, as
+    ``{seq: (before, after)}`` with both lists oldest first.
+    """
+    if not seqs:
+        return {}
+
+    ranges = Q()
+    for seq in seqs:
+        ranges |= Q(seq__gte=seq - size, seq__lte=seq + size)
+    around = {message.seq: message for message in queryset.filter(ranges)}
+
+    windows = {}
+    for seq in seqs:
+        before = [around[s] for s in range(seq - size, seq) if s in around]
+        after = [around[s] for s in range(seq + 1, seq + size + 1) if s in around]
+        windows[seq] = (before, after)
+    return windows
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_message_seq(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    room_ids = list(Message.objects.order_by().values_list('room_id', flat=True).distinct())
+    for room_id in room_ids:
+        messages = list(Message.objects.filter(room_id=room_id).order_by('id').only('id'))
+        for seq, message in enumerate(messages, start=1):
+            message.seq = seq
+        Message.objects.bulk_update(messages, ['seq'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0002_alter_message_options_alter_room_options'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='seq',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_message_seq, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='message',
+            constraint=models.UniqueConstraint(fields=('room', 'seq'), name='chat_message_room_seq_uniq'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.2.5 on 2026-10-19 17:56
+
+from django.db import migrations, models
+
+
+def backfill_snapshot(apps, schema_editor):
+    Room = apps.get_model('chat', 'Room')
+    rooms = Room.objects.filter(last_message__isnull=False).select_related('last_message__sender')
+    for room in rooms.iterator(chunk_size=500):
+        message = room.last_message
+        Room.objects.filter(pk=room.pk).update(
+            last_message_seq=message.seq,
+            last_message_sender_id=message.sender_id,
+            last_message_sender_username=message.sender.username,
+            last_message_type=message.type,
+            last_message_preview=message.content[:255],
+            last_message_at=message.timestamp,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0003_message_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_preview',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_sender_id',
+            field=models.BigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_sender_username',
+            field=models.CharField(blank=True, default='', max_length=150),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='last_message_type',
+            field=models.CharField(blank=True, default='', max_length=10),
+        ),
+        migrations.RunPython(backfill_snapshot, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:02
+
+from django.conf import settings
+from django.db import migrations, models
+from peer_port.migration_operations import AddIndexConcurrentlyIfSupported
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('chat', '0004_room_last_message_snapshot'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyIfSupported(
+            model_name='message',
+            index=models.Index(fields=['room', '-timestamp'], name='chat_msg_room_ts_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='room',
+            index=models.Index(fields=['status', '-created_at'], name='chat_room_status_created_idx'),
+        ),
+        AddIndexConcurrentlyIfSupported(
+            model_name='room',
+            index=models.Index(fields=['owner', '-created_at'], name='chat_room_owner_created_idx'),
+        ),
+    ]
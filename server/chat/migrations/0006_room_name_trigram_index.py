@@ -0,0 +1,31 @@
+from django.db import migrations
+
+
+def create_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    # matches the UPPER(name) LIKE UPPER(...) that name__icontains compiles to
+    schema_editor.execute(
+        'CREATE INDEX CONCURRENTLY IF NOT EXISTS chat_room_name_trgm_idx '
+        'ON chat_room USING gin ((UPPER(name::text)) gin_trgm_ops)'
+    )
+
+
+def drop_trigram_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX CONCURRENTLY IF EXISTS chat_room_name_trgm_idx')
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    atomic = False
+
+    dependencies = [
+        ('chat', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_index, drop_trigram_index),
+    ]
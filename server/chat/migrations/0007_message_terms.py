@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:12
+
+import django.db.models.deletion
+from django.db import migrations, models
+from chat.message_search import tokenize
+
+
+def backfill_terms(apps, schema_editor):
+    Message = apps.get_model('chat', 'Message')
+    MessageTerm = apps.get_model('chat', 'MessageTerm')
+    batch = []
+    messages = Message.objects.filter(type='text').only('id', 'room_id', 'seq', 'content')
+    for message in messages.iterator(chunk_size=1000):
+        batch.extend(
+            MessageTerm(room_id=message.room_id, message_id=message.id, seq=message.seq, term=term)
+            for term in tokenize(message.content)
+        )
+        if len(batch) >= 5000:
+            MessageTerm.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    MessageTerm.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_room_name_trigram_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageTerm',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('term', models.CharField(max_length=64)),
+                ('seq', models.PositiveBigIntegerField()),
+                ('message', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='terms', to='chat.message')),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='chat.room')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['room', 'term', '-seq'], name='chat_msgterm_room_term_idx')],
+                'constraints': [models.UniqueConstraint(fields=('message', 'term'), name='chat_msgterm_message_term_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_terms, migrations.RunPython.noop),
+    ]
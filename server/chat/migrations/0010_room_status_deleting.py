@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0009_room_expiry'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='room',
+            name='status',
+            field=models.CharField(choices=[('active', 'Active'), ('inactive', 'Inactive'), ('deleting', 'Deleting')], default='active', max_length=10),
+        ),
+    ]
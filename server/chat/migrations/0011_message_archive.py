@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_room_status_deleting'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='room',
+            name='retention_days',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='MessageArchiveBlock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_seq', models.PositiveBigIntegerField()),
+                ('last_seq', models.PositiveBigIntegerField()),
+                ('count', models.PositiveIntegerField()),
+                ('first_timestamp', models.DateTimeField()),
+                ('last_timestamp', models.DateTimeField()),
+                ('data', models.BinaryField()),
+                ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archive_blocks', to='chat.room')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('room', 'first_seq'), name='chat_archive_room_seq_uniq')],
+            },
+        ),
+    ]
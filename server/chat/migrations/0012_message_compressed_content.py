@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-19 18:59
+
+import peer_port.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0011_message_archive'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='message',
+            name='content',
+            field=peer_port.fields.CompressedTextField(),
+        ),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.2.5 on 2026-10-19 21:40
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+
+
+def backfill_participants(apps, schema_editor):
+    # joined_at is unknown for existing members: the room's creation keeps its
+    # whole history theirs, as before. Everything up to now counts as read.
+    Room = apps.get_model('chat', 'Room')
+    Participant = apps.get_model('chat', 'Participant')
+    rooms = Room.objects.filter(id=OuterRef('room_id'))
+    Participant.objects.update(
+        joined_at=Subquery(rooms.values('created_at')[:1]),
+        last_read_seq=Subquery(rooms.values('last_message_seq')[:1]),
+    )
+    Participant.objects.filter(user_id=Subquery(rooms.values('owner_id')[:1])).update(role='owner')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_media'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # the auto-created through table becomes the Participant model as it is
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Participant',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('room', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.room')),
+                        ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='room_memberships', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'chat_room_participants',
+                        'unique_together': {('room', 'user')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='room',
+                    name='participants',
+                    field=models.ManyToManyField(blank=True, related_name='participating_rooms', through='chat.Participant', to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+            database_operations=[],
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='joined_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='last_read_seq',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='muted',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='participant',
+            name='role',
+            field=models.CharField(choices=[('owner', 'Owner'), ('member', 'Member')], default='member', max_length=10),
+        ),
+        migrations.RunPython(backfill_participants, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['user', 'room'], name='chat_participant_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='participant',
+            index=models.Index(fields=['room', 'joined_at'], name='chat_participant_joined_idx'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='room',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='chat.room'),
+        ),
+        migrations.AlterField(
+            model_name='participant',
+            name='user',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='room_memberships', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,6 +1,14 @@
-from django.db import models
+import uuid
+from django.db import models, transaction, IntegrityError
+from django.db.models import Max, Q
 from django.contrib.auth import get_user_model
+from django.utils import timezone
 from django.core.validators import MinValueValidator, MaxValueValidator
+from peer_port.fields import CompressedTextField
+from . import expiry
+from . import last_message as last_messages
+from . import membership
+from . import message_search
 
 
 User = get_user_model()
@@ -16,36 +24,130 @@ class Room(models.Model):
 
     ACTIVE = "active"
     INACTIVE = "inactive"
+    # deleted or expired, waiting for chat.expiry to purge it
+    DELETING = "deleting"
     STATUS_CHOICES = (
         (ACTIVE, 'Active'),
         (INACTIVE, 'Inactive'),
+        (DELETING, 'Deleting'),
     )
 
     owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='owned_rooms')
     name = models.CharField(max_length=255, unique=True, null=False, blank=False)
-    participants = models.ManyToManyField(User, related_name='participating_rooms', blank=True)
+    participants = models.ManyToManyField(User, through="Participant", related_name='participating_rooms', blank=True)
     last_message = models.ForeignKey("Message", on_delete=models.SET_NULL, null=True, blank=True, related_name="+")
+    # snapshot of last_message, kept by chat.last_message so listings never join Message
+    last_message_seq = models.PositiveBigIntegerField(null=True, blank=True)
+    last_message_sender_id = models.BigIntegerField(null=True, blank=True)
+    last_message_sender_username = models.CharField(max_length=150, blank=True, default="")
+    last_message_type = models.CharField(max_length=10, blank=True, default="")
+    last_message_preview = models.CharField(max_length=255, blank=True, default="")
+    last_message_at = models.DateTimeField(null=True, blank=True)
     access = models.CharField(max_length=10, choices=ACCESS_CHOICES, default=PUBLIC)
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=ACTIVE)
     limit = models.PositiveIntegerField(default=10, validators=[MinValueValidator(1), MaxValueValidator(50)])
+    # seconds from creation to expiry; without one the room expires ROOM_IDLE_TIMEOUT after its last message
+    lifetime = models.PositiveIntegerField(null=True, blank=True)
+    # maintained by chat.expiry, null when the room never expires
+    expires_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # days messages stay in chat_message before chat.archive moves them, MESSAGE_RETENTION_DAYS when unset
+    retention_days = models.PositiveIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-created_at"]
+        indexes = [
+            # public listing: status filter ordered by newest
+            models.Index(fields=["status", "-created_at"], name="chat_room_status_created_idx"),
+            # owner listing
+            models.Index(fields=["owner", "-created_at"], name="chat_room_owner_created_idx"),
+            # expiry sweep: rooms past their deadline, oldest first
+            models.Index(fields=["expires_at"], name="chat_room_expires_idx"),
+        ]
 
     def __str__(self):
         return f"{self.name} ({self.get_access_display()})"
 
+    def latest_seq(self):
+        """Seq of the newest message, exact where the flushed ``last_message_seq`` may lag."""
+        last = self.messages.aggregate(last=Max("seq"))["last"]
+        return max(last or 0, self.last_message_seq or 0)
+
     def can_add_participant(self):
         """Check if room is full or not"""
-        return self.participants.count() < self.limit
+        return self.memberships.count() < self.limit
 
-    # Add the owner to participants on creation of a new room.
     def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if not self.participants.filter(id=self.owner.id).exists():
-            self.participants.add(self.owner)
+        """
+        The owner joins the room in the same transaction that creates it.
+        Any later save is just the UPDATE, membership is never re-checked.
+        ``expires_at`` follows the lifetime whenever it is saved. The
+        ``last_message_*`` snapshot is only written by ``chat.last_message``,
+        a full save of an existing room leaves it out of the UPDATE.
+        """
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "lifetime" in update_fields:
+            self.expires_at = expiry.expires_at_for(self, now=timezone.now())
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "expires_at"}
+        if not self._state.adding:
+            if update_fields is None:
+                kwargs["update_fields"] = [
+                    field.name for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname not in last_messages.FIELDS
+                ]
+            return super().save(*args, **kwargs)
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            Participant.objects.bulk_create(
+                [Participant(room_id=self.pk, user_id=self.owner_id, role=Participant.OWNER, joined_at=self.created_at)]
+            )
+            membership.invalidate(self.owner_id)
+
+
+class Participant(models.Model):
+    """
+    Membership of a user in a room, the through model of ``Room.participants``.
+    ``last_read_seq`` is the seq of the last message the user has read, so the
+    unread count is ``room.last_message_seq - last_read_seq`` without counting
+    rows; seqs stay valid when messages move to the archive. Writing a message
+    moves its sender's marker to it, one's own messages are never unread.
+    """
+    OWNER = "owner"
+    MEMBER = "member"
+    ROLE_CHOICES = (
+        (OWNER, 'Owner'),
+        (MEMBER, 'Member'),
+    )
+
+    # no single column indexes: the unique (room, user) and (user, room) cover both
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="memberships", db_index=False)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="room_memberships", db_index=False)
+    role = models.CharField(max_length=10, choices=ROLE_CHOICES, default=MEMBER)
+    joined_at = models.DateTimeField(default=timezone.now)
+    last_read_seq = models.PositiveBigIntegerField(null=True, blank=True)
+    # notifications of the room are muted by the user
+    muted = models.BooleanField(default=False)
+
+    class Meta:
+        # the table and unique constraint of the former auto-created through model
+        db_table = "chat_room_participants"
+        unique_together = [("room", "user")]
+        indexes = [
+            # joined_room_ids: the rooms of a user, read from the index alone
+            models.Index(fields=["user", "room"], name="chat_participant_user_idx"),
+            # members of a room in join order
+            models.Index(fields=["room", "joined_at"], name="chat_participant_joined_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} in room {self.room_id} ({self.role})"
+
+    def unread_count(self, room=None):
+        last_seq = (room or self.room).last_message_seq or 0
+        return max(last_seq - (self.last_read_seq or 0), 0)
 
 
 class Message(models.Model):
@@ -57,17 +159,165 @@ class Message(models.Model):
     sender = models.ForeignKey(User, on_delete=models.CASCADE)
     room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='messages')
     type = models.CharField(max_length=10, choices=TYPE_CHOICES, default='text')
-    content = models.TextField(blank=False, null=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # long pastes and image payloads are stored compressed, see peer_port.fields
+    content = CompressedTextField(blank=False, null=False)
+    # a default rather than auto_now_add, so imported messages keep their original time
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # per room position, assigned in the INSERT transaction - gap free and in commit order
+    seq = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+
+    SEQ_INSERT_ATTEMPTS = 5
 
     class Meta:
         ordering = ["-timestamp"]
+        indexes = [
+            # room history, newest first
+            models.Index(fields=["room", "-timestamp"], name="chat_msg_room_ts_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["room", "seq"], name="chat_message_room_seq_uniq"),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} in {self.room.name}"
 
+    def _insert_with_next_seq(self, *args, **kwargs):
+        """
+        Take the next seq of the room and insert. A concurrent writer that took
+        the same number makes the unique constraint fail; the loser retries with
+        the next free number, so seq order always matches commit order.
+        """
+        for attempt in range(self.SEQ_INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    last_seq = Message.objects.filter(room_id=self.room_id).aggregate(last=Max("seq"))["last"]
+                    self.seq = (last_seq or 0) + 1
+                    super().save(*args, **kwargs)
+                return
+            except IntegrityError:
+                self.seq = None
+                if attempt == self.SEQ_INSERT_ATTEMPTS - 1:
+                    raise
+
+    @staticmethod
+    def _mark_read_by_senders(room_id, messages):
+        """Move each sender's read marker forward to their newest message, one UPDATE per sender."""
+        newest = {}
+        for message in messages:
+            newest[message.sender_id] = max(newest.get(message.sender_id, 0), message.seq)
+        for sender_id, seq in newest.items():
+            Participant.objects.filter(room_id=room_id, user_id=sender_id).filter(
+                Q(last_read_seq__isnull=True) | Q(last_read_seq__lt=seq)
+            ).update(last_read_seq=seq)
+
+    @classmethod
+    def bulk_create_in_room(cls, room, messages, track_last_message=True):
+        """
+        Insert a batch of messages of one room with a single INSERT, numbered
+        after the room's last seq, and point last_message at the newest one
+        (unless ``track_last_message`` is off, for callers fixing it up later).
+        """
+        for attempt in range(cls.SEQ_INSERT_ATTEMPTS):
+            try:
+                with transaction.atomic():
+                    last_seq = cls.objects.filter(room_id=room.id).aggregate(last=Max("seq"))["last"] or 0
+                    for offset, message in enumerate(messages, start=1):
+                        message.seq = last_seq + offset
+                    cls.objects.bulk_create(messages)
+                    message_search.index_messages(messages)
+                    cls._mark_read_by_senders(room.id, messages)
+                    if track_last_message:
+                        last_messages.note_on_commit(messages[-1])
+                return messages
+            except IntegrityError:
+                for message in messages:
+                    message.seq = None
+                if attempt == cls.SEQ_INSERT_ATTEMPTS - 1:
+                    raise
+
     def save(self, *args, **kwargs):
-        """Update last_message field in room whenever a message is saved"""
-        super().save(*args, **kwargs)
-        self.room.last_message = self
-        self.room.save(update_fields=["last_message"])
+        """
+        INSERT plus its search terms in one transaction; the room's last
+        message snapshot is refreshed after commit.
+        """
+        adding = self._state.adding
+        update_fields = kwargs.get("update_fields")
+        with transaction.atomic():
+            if adding and self.seq is None:
+                self._insert_with_next_seq(*args, **kwargs)
+            else:
+                super().save(*args, **kwargs)
+            if adding:
+                self._mark_read_by_senders(self.room_id, [self])
+            if adding or update_fields is None or "content" in update_fields:
+                message_search.index_messages([self], replace=not adding)
+        if adding:
+            last_messages.note_on_commit(self)
+
+
+class MessageTerm(models.Model):
+    """One distinct word of a text message, see chat.message_search"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="+")
+    message = models.ForeignKey(Message, on_delete=models.CASCADE, related_name="terms")
+    term = models.CharField(max_length=message_search.TERM_MAX_LENGTH)
+    # copy of message.seq, so hits are ordered and paged without joining chat_message
+    seq = models.PositiveBigIntegerField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["room", "term", "-seq"], name="chat_msgterm_room_term_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=["message", "term"], name="chat_msgterm_message_term_uniq"),
+        ]
+
+    def __str__(self):
+        return f"{self.term} in message {self.message_id}"
+
+
+class MessageArchiveBlock(models.Model):
+    """Consecutive archived messages of a room, zlib compressed, see chat.archive"""
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="archive_blocks")
+    first_seq = models.PositiveBigIntegerField()
+    last_seq = models.PositiveBigIntegerField()
+    count = models.PositiveIntegerField()
+    first_timestamp = models.DateTimeField()
+    last_timestamp = models.DateTimeField()
+    data = models.BinaryField()
+
+    class Meta:
+        constraints = [
+            # also the index of the newest first block walk
+            models.UniqueConstraint(fields=["room", "first_seq"], name="chat_archive_room_seq_uniq"),
+        ]
+
+    def __str__(self):
+        return f"messages {self.first_seq}-{self.last_seq} of room {self.room_id}"
+
+
+class Media(models.Model):
+    """A stored media file, addressed by its SHA-256, see chat.media"""
+    sha256 = models.CharField(max_length=64, unique=True)
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    # rooms it was posted in: who may download it
+    rooms = models.ManyToManyField(Room, related_name="media", blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.sha256} ({self.content_type}, {self.size} bytes)"
+
+
+class MediaUpload(models.Model):
+    """A chunked upload in progress, its bytes under CHAT_MEDIA_ROOT/uploads"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name="+")
+    size = models.PositiveBigIntegerField()
+    content_type = models.CharField(max_length=100)
+    received = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"upload {self.id}: {self.received}/{self.size} bytes"
@@ -0,0 +1,134 @@
+"""
+Broadcast committed messages to their room group in ``seq`` order, as far as
+this process can tell.
+
+``save_message`` hands each message over from ``transaction.on_commit`` in the
+database worker thread; image messages of completed uploads are sent from
+the view's thread with ``send`` (see ``chat.media.announce``). Callbacks of racing transactions may fire out of
+order, so the dispatcher keeps a small heap per room and only sends a message
+once every lower ``seq`` it knows of has gone out.
+
+The guarantee is weaker than strict order. A room's outbox starts without a
+``next_seq`` (it is not read from the database), so the first message it
+sees goes out at once, even when a lower ``seq`` of this process is still
+committing; that one follows late and is logged. The same holds for the
+first message after the outbox was dropped. Clients order by ``seq`` (and
+fetch the history) whatever the arrival order.
+
+Only writes of this process can fill a gap: the consumer wraps each save in
+``writing(group)``. A gap while none of them is in flight belongs to another
+worker process (which broadcasts it itself) or to a rolled back write, and
+is skipped at once; otherwise it is waited for, ``gap_timeout`` seconds at
+most. A room's outbox is dropped once it has nothing pending or in flight,
+so memory follows the active rooms, not every room ever seen.
+"""
+import asyncio
+import contextlib
+import heapq
+import logging
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+_dispatchers = {}
+
+
+class _RoomOutbox:
+    def __init__(self):
+        self.pending = []
+        self.next_seq = None
+        self.in_flight = 0
+        self.wakeup = asyncio.Event()
+        self.sender = None
+
+    @property
+    def idle(self):
+        return not self.pending and not self.in_flight and (self.sender is None or self.sender.done())
+
+
+class RoomDispatcher:
+    def __init__(self, channel_layer, loop, gap_timeout=0.5):
+        self.channel_layer = channel_layer
+        self.loop = loop
+        self.gap_timeout = gap_timeout
+        self._rooms = {}
+
+    def publish(self, group, seq, event):
+        """Thread safe entry point, called from on_commit callbacks."""
+        self.loop.call_soon_threadsafe(self._push, group, seq, event)
+
+    async def send(self, group, seq, event):
+        """Publish from the loop thread and wait until the room's outbox has sent it."""
+        self._push(group, seq, event)
+        # shielded: the outbox goes on for the other writers if this caller is cancelled
+        await asyncio.shield(self._rooms[group].sender)
+
+    @contextlib.contextmanager
+    def writing(self, group):
+        """Mark a write of this process to the room as in flight, on the loop thread."""
+        outbox = self._outbox(group)
+        outbox.in_flight += 1
+        try:
+            yield
+        finally:
+            outbox.in_flight -= 1
+            # its commit callback, if any, was queued before this resumes
+            outbox.wakeup.set()
+            self._evict(group, outbox)
+
+    def _outbox(self, group):
+        outbox = self._rooms.get(group)
+        if outbox is None:
+            outbox = self._rooms[group] = _RoomOutbox()
+        return outbox
+
+    def _evict(self, group, outbox):
+        if outbox.idle and self._rooms.get(group) is outbox:
+            del self._rooms[group]
+
+    def _push(self, group, seq, event):
+        outbox = self._outbox(group)
+        heapq.heappush(outbox.pending, (seq, id(event), event))
+        outbox.wakeup.set()
+        if outbox.sender is None or outbox.sender.done():
+            outbox.sender = self.loop.create_task(self._drain(group, outbox))
+
+    async def _drain(self, group, outbox):
+        while outbox.pending:
+            seq, _, event = outbox.pending[0]
+            if outbox.next_seq is not None and seq > outbox.next_seq and outbox.in_flight:
+                # an earlier commit of this process has not reached us yet, give it a moment
+                outbox.wakeup.clear()
+                try:
+                    await asyncio.wait_for(outbox.wakeup.wait(), self.gap_timeout)
+                    continue
+                except asyncio.TimeoutError:
+                    logger.debug("outbox %s: skipping gap before seq %s", group, seq)
+
+            heapq.heappop(outbox.pending)
+            if outbox.next_seq is not None and seq < outbox.next_seq:
+                logger.warning("outbox %s: seq %s arrived after its gap was skipped", group, seq)
+            else:
+                outbox.next_seq = seq + 1
+            try:
+                await self.channel_layer.group_send(group, event)
+            except Exception as e:
+                logger.error("outbox %s: broadcasting seq %s failed: %s", group, seq, e, exc_info=True)
+        outbox.sender = None
+        self._evict(group, outbox)
+
+
+def get_dispatcher(channel_layer):
+    """Dispatcher of the running loop for the given channel layer."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _dispatchers if key[0].is_closed()]:
+        del _dispatchers[key]
+
+    key = (loop, id(channel_layer))
+    dispatcher = _dispatchers.get(key)
+    if dispatcher is None:
+        dispatcher = _dispatchers[key] = RoomDispatcher(
+            channel_layer, loop, gap_timeout=settings.CHAT_OUTBOX_GAP_TIMEOUT
+        )
+    return dispatcher
@@ -0,0 +1,220 @@
+"""
+Image previews.
+
+Clients show image messages through previews: the image scaled to fit each
+of ``MEDIA_PREVIEW_SIZES`` (pixels, longest side), stored as WebP next to
+the media under ``CHAT_MEDIA_ROOT/previews``. Media never changes, so the
+file name (digest and size) is the whole cache key: a preview is rendered
+once per distinct image, however many times it is posted.
+
+Decoding and resizing are CPU bound and hold the GIL, so they run in a
+``ProcessPoolExecutor`` of ``MEDIA_PREVIEW_WORKERS`` processes (0 renders
+in the caller, for tests and single process setups) and never in an ASGI
+worker. At most ``MEDIA_PREVIEW_MAX_PENDING`` images wait for the pool;
+beyond that ``schedule`` declines, and a preview requested before it
+exists is scheduled then (the request gets a 404 with ``Retry-After``), so
+a burst of uploads queues neither memory nor work without bound. An image
+already queued for the same sizes is not submitted again: the caller gets
+the pending render.
+
+When the previews of a posted image are ready, the room gets a
+``preview_ready`` event with the message id, digest and sizes.
+
+Pillow is optional: without it no previews are made and clients fall back
+to the media itself.
+"""
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from peer_port import metrics
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "image/webp"
+
+_lock = threading.Lock()
+_pool = None
+_pending = None
+_in_flight = {}  # (sha256, sizes) -> future of the render
+
+
+def available():
+    return Image is not None
+
+
+def relative_path(sha256, size):
+    return os.path.join("previews", sha256[:2], sha256[2:4], f"{sha256}-{size}.webp")
+
+
+def preview_path(sha256, size):
+    return os.path.join(settings.CHAT_MEDIA_ROOT, relative_path(sha256, size))
+
+
+def missing_sizes(sha256):
+    return [size for size in settings.MEDIA_PREVIEW_SIZES if not os.path.exists(preview_path(sha256, size))]
+
+
+def render(source, targets, max_pixels):
+    """
+    Write the previews of the image at ``source``: ``targets`` maps sizes to
+    paths. Runs in the pool processes, so it only takes plain arguments.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source) as image:
+        # Pillow only raises above twice MAX_IMAGE_PIXELS (it warns below), check before decoding
+        width, height = image.size
+        if width * height > max_pixels:
+            raise Image.DecompressionBombError(f"{width}x{height} image is over the {max_pixels} pixel limit")
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        # largest first, each one scaled down from the previous
+        for size, target in sorted(targets.items(), reverse=True):
+            image.thumbnail((size, size))
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            partial = f"{target}.{os.getpid()}.{threading.get_ident()}.part"
+            image.save(partial, "WEBP", quality=80)
+            os.replace(partial, target)
+    return sorted(targets)
+
+
+def render_previews(sha256):
+    """Render the missing previews of a stored media file in the caller; returns the sizes now available."""
+    from . import media
+
+    sizes = missing_sizes(sha256)
+    if sizes:
+        render(
+            media.stored_path(sha256),
+            {size: preview_path(sha256, size) for size in sizes},
+            settings.MEDIA_PREVIEW_MAX_PIXELS,
+        )
+        metrics.counter("media.previews").inc(len(sizes))
+    return list(settings.MEDIA_PREVIEW_SIZES)
+
+
+def get_pool():
+    global _pool, _pending
+    with _lock:
+        if _pool is None:
+            # spawn: forking a process that runs threads (ASGI server, database
+            # connections) can copy held locks into the child
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.MEDIA_PREVIEW_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _pending = threading.BoundedSemaphore(settings.MEDIA_PREVIEW_MAX_PENDING)
+        return _pool
+
+
+def shutdown():
+    global _pool, _pending
+    with _lock:
+        pool, _pool, _pending = _pool, None, None
+        _in_flight.clear()
+    if pool is not None:
+        pool.shutdown(wait=True)
+
+
+def schedule(sha256, room_id=None, message_id=None):
+    """
+    Render the previews of a stored media file in the pool, then announce
+    them to ``room_id``. Returns the future, or None when there is nothing
+    to do or the pool is saturated.
+    """
+    from . import media
+
+    if not available() or not settings.MEDIA_PREVIEW_SIZES:
+        return None
+    sizes = missing_sizes(sha256)
+    if not sizes:
+        if room_id is not None:
+            announce(room_id, message_id, sha256)
+        return None
+
+    if not settings.MEDIA_PREVIEW_WORKERS:
+        try:
+            render_previews(sha256)
+        except Exception as e:
+            logger.warning("Rendering previews of %s failed: %s", sha256, e)
+            return None
+        if room_id is not None:
+            announce(room_id, message_id, sha256)
+        return None
+
+    pool = get_pool()
+    key = (sha256, tuple(sizes))
+    pending = None
+    with _lock:
+        # one render per image and sizes: later requests wait for the queued one
+        future = _in_flight.get(key)
+        if future is None:
+            pending = _pending
+            if not pending.acquire(blocking=False):
+                metrics.counter("media.previews.declined").inc()
+                return None
+            future = pool.submit(
+                render,
+                media.stored_path(sha256),
+                {size: preview_path(sha256, size) for size in sizes},
+                settings.MEDIA_PREVIEW_MAX_PIXELS,
+            )
+            _in_flight[key] = future
+    if pending is None:
+        metrics.counter("media.previews.deduplicated").inc()
+    else:
+        # outside the lock: a render already done runs the callback right here
+        future.add_done_callback(partial(_rendered, key, pending))
+
+    if room_id is not None:
+        future.add_done_callback(partial(_announce_rendered, room_id, message_id, sha256))
+    return future
+
+
+def _rendered(key, pending, future):
+    # runs in the pool's management thread
+    with _lock:
+        if _in_flight.get(key) is future:
+            del _in_flight[key]
+    pending.release()
+    try:
+        rendered = future.result()
+    except Exception as e:
+        logger.warning("Rendering previews of %s failed: %s", key[0], e)
+        return
+    metrics.counter("media.previews").inc(len(rendered))
+
+
+def _announce_rendered(room_id, message_id, sha256, future):
+    if future.exception() is not None:
+        return
+    try:
+        announce(room_id, message_id, sha256)
+    except Exception as e:
+        logger.error("Announcing previews of %s failed: %s", sha256, e, exc_info=True)
+
+
+def announce(room_id, message_id, sha256):
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(channel_layer.group_send)(
+        f"room_{room_id}",
+        {
+            "type": "media_preview",
+            "room_id": room_id,
+            "payload": {"message_id": message_id, "sha256": sha256, "sizes": list(settings.MEDIA_PREVIEW_SIZES)},
+        },
+    )
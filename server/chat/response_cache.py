@@ -0,0 +1,139 @@
+"""
+Versioned response cache for the public room listing and room detail.
+
+Entries are the serialized response bodies, kept in a per-process LRU
+(``ROOM_RESPONSE_CACHE_SIZE`` entries, ``ROOM_RESPONSE_CACHE_TIMEOUT``
+seconds at most). Their keys carry a version counter instead of being
+deleted on writes:
+
+- the listing key holds the global rooms version, bumped by room saves and
+  deletes, joins and leaves, and the current ``ROOM_RESPONSE_CACHE_TIMEOUT``
+  window (``listing_version``);
+- the detail key holds the version of that room only.
+
+Last message flushes only bump the room version (``listing=False``): on a
+busy server every message would otherwise retire every cached listing page,
+so the last message shown in listings may lag by one window.
+
+Counters live in the Django cache, so a bump in one worker retires the
+entries of every worker. That needs a shared cache backend: without one
+(``peer_port.caching``) nothing is cached. Old entries are never read again
+and age out of the LRU.
+
+``is_participant`` depends on the user, so cached bodies hold ``None`` and
+views apply the user's flag on every response with ``overlay_is_participant``.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from peer_port import caching, metrics
+
+
+GLOBAL_VERSION_KEY = "chat:rooms:version"
+
+
+def _room_version_key(room_id):
+    return f"chat:room:{room_id}:version"
+
+
+def _version(key):
+    version = cache.get(key)
+    if version is None:
+        # start from the clock, not 1: a counter evicted from the cache and
+        # created again must not bring back entries of its previous life
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def rooms_version():
+    return _version(GLOBAL_VERSION_KEY)
+
+
+def listing_version():
+    """The rooms version and the current cache window, for listing keys and ETags."""
+    return f"{rooms_version()}.{int(time.time()) // max(settings.ROOM_RESPONSE_CACHE_TIMEOUT, 1)}"
+
+
+def room_version(room_id):
+    return _version(_room_version_key(room_id))
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, time.time_ns(), None)
+
+
+def bump(*room_ids, listing=True):
+    """Retire the cached details of these rooms and, unless ``listing`` is false, cached listings, now and after commit."""
+    keys = [_room_version_key(room_id) for room_id in room_ids]
+    if listing:
+        keys.append(GLOBAL_VERSION_KEY)
+    _bump(keys)
+    transaction.on_commit(lambda: _bump(keys))
+
+
+class ResponseCache:
+    def __init__(self, max_entries=1000, timeout=60, name="chat.room_cache"):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()  # key -> (expires at, data)
+        self._lock = threading.Lock()
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _record(self, hit):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        metrics.counter(f"{self.name}.{'hits' if hit else 'misses'}").inc()
+        metrics.gauge(f"{self.name}.hit_rate").set(self.hits / (self.hits + self.misses))
+
+    def get(self, key):
+        if not caching.is_shared():
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._entries[key]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+            self._record(entry is not None)
+        return None if entry is None else entry[1]
+
+    def set(self, key, data):
+        if not caching.is_shared():
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                metrics.counter(f"{self.name}.evictions").inc()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+room_responses = ResponseCache(
+    max_entries=settings.ROOM_RESPONSE_CACHE_SIZE,
+    timeout=settings.ROOM_RESPONSE_CACHE_TIMEOUT,
+)
+
+
+def overlay_is_participant(room, joined_room_ids):
+    """Copy of a cached room body with the requesting user's flag."""
+    return {**room, "is_participant": room["id"] in joined_room_ids}
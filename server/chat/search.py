@@ -0,0 +1,241 @@
+"""
+Room name search backends for PublicAllRoomListView.
+
+- ``postgres``: ``icontains`` (a prefix for terms under 3 characters, which
+  have no trigram) served by the pg_trgm GIN index created in migration
+  0006, ranked prefix matches first, then by trigram similarity, on the
+  active rooms' ids before the listing query runs for the page.
+- ``memory``: an in-process prefix + n-gram index of active rooms
+  (RoomNameIndex), built lazily from the database, kept up to date by the
+  Room signals in ``chat.signals`` and rebuilt every
+  ``ROOM_SEARCH_INDEX_MAX_AGE`` seconds for the changes signals do not see
+  (``update()``, ``bulk_create``, other processes). Matches are checked
+  against the queryset before the result cap. Opt-in, for single process
+  deployments.
+- ``db``: the plain ``name__icontains`` filter.
+
+``ROOM_SEARCH_BACKEND = "auto"`` picks ``postgres`` on PostgreSQL and ``db``
+elsewhere. Every backend returns matches ranked best first and capped at
+``ROOM_SEARCH_MAX_RESULTS``.
+"""
+import bisect
+import threading
+import time
+from array import array
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, When, Value, IntegerField
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _grams(text):
+    # trigrams, plus the 1 and 2 character grams that short terms look up
+    return {text[i:i + n] for n in (1, 2, 3) for i in range(len(text) - n + 1)}
+
+
+class RoomNameIndex:
+    """
+    Case-insensitive index over room names.
+
+    Prefix lookups bisect a sorted list of names. Substring lookups take the
+    postings of the rarest trigram of the term (of the term itself when it is
+    shorter than a trigram) and verify each candidate
+    against the current name, so postings left behind by renames or deletes
+    are harmless and removals never have to touch them.
+    """
+
+    def __init__(self):
+        self._names = {}  # room id -> lowered name
+        self._sorted = []  # (lowered name, room id)
+        self._postings = {}  # trigram -> array of room ids
+        self._lock = threading.Lock()
+        self.loaded = False
+        self.loaded_at = None
+
+    def __len__(self):
+        return len(self._names)
+
+    def load(self, rows):
+        """Replace the index content with ``(id, name)`` rows."""
+        with self._lock:
+            self._names = {}
+            self._postings = {}
+            for room_id, name in rows:
+                self._add(room_id, name.lower())
+            self._sorted = sorted((name, room_id) for room_id, name in self._names.items())
+            self.loaded = True
+            self.loaded_at = time.monotonic()
+
+    def _add(self, room_id, lowered):
+        self._names[room_id] = lowered
+        for gram in _grams(lowered):
+            postings = self._postings.get(gram)
+            if postings is None:
+                postings = self._postings[gram] = array("q")
+            postings.append(room_id)
+
+    def _remove_sorted(self, room_id, lowered):
+        position = bisect.bisect_left(self._sorted, (lowered, room_id))
+        if position < len(self._sorted) and self._sorted[position] == (lowered, room_id):
+            del self._sorted[position]
+
+    def add(self, room_id, name):
+        lowered = name.lower()
+        with self._lock:
+            previous = self._names.get(room_id)
+            if previous == lowered:
+                return
+            if previous is not None:
+                self._remove_sorted(room_id, previous)
+            self._add(room_id, lowered)
+            bisect.insort(self._sorted, (lowered, room_id))
+
+    def remove(self, room_id):
+        with self._lock:
+            previous = self._names.pop(room_id, None)
+            if previous is not None:
+                self._remove_sorted(room_id, previous)
+
+    def search(self, term, limit=100):
+        """
+        Room ids whose name contains ``term``: prefix matches first, by name,
+        then inner matches (newest rooms first, up to ``limit``) by match
+        position and name.
+        """
+        term = term.lower().strip()
+        if not term:
+            return []
+
+        with self._lock:
+            results = []
+            position = bisect.bisect_left(self._sorted, (term,))
+            while position < len(self._sorted) and len(results) < limit:
+                name, room_id = self._sorted[position]
+                if not name.startswith(term):
+                    break
+                results.append(room_id)
+                position += 1
+
+            if len(results) >= limit:
+                return results
+
+            grams = _trigrams(term) if len(term) >= 3 else {term}
+            postings = min((self._postings.get(gram, ()) for gram in grams), key=len)
+            seen = set(results)
+            matches = []
+            wanted = limit - len(results)
+            # newest rooms first; stop once the page budget is filled so a very
+            # common trigram never means walking its whole postings list
+            for room_id in reversed(postings):
+                if room_id in seen:
+                    continue
+                seen.add(room_id)
+                name = self._names.get(room_id)
+                if name is None:
+                    continue
+                index = name.find(term)
+                if index > 0:
+                    matches.append((index, name, room_id))
+                    if len(matches) >= wanted:
+                        break
+
+        matches.sort()
+        results.extend(room_id for _, _, room_id in matches)
+        return results
+
+
+room_name_index = RoomNameIndex()
+
+
+def _order_by_ids(queryset, ids):
+    ranking = Case(
+        *[When(id=room_id, then=Value(rank)) for rank, room_id in enumerate(ids)],
+        output_field=IntegerField(),
+    )
+    return queryset.filter(id__in=ids).annotate(search_rank=ranking).order_by("search_rank")
+
+
+class MemoryRoomSearch:
+    def __init__(self, index=room_name_index):
+        self.index = index
+
+    def ensure_loaded(self):
+        index = self.index
+        if not index.loaded or time.monotonic() - index.loaded_at > settings.ROOM_SEARCH_INDEX_MAX_AGE:
+            from .models import Room
+            rooms = Room.objects.filter(status=Room.ACTIVE).order_by("id").values_list("id", "name")
+            index.load(rooms.iterator(chunk_size=10000))
+
+    def search(self, queryset, term, limit):
+        self.ensure_loaded()
+        # the index may hold rooms the queryset excludes (status changed by an
+        # update(), another process): filter before capping, asking the index
+        # for more matches while it has them
+        wanted = limit
+        while True:
+            ids = self.index.search(term, limit=wanted)
+            kept = set(queryset.filter(id__in=ids).values_list("id", flat=True)) if ids else set()
+            if len(kept) >= limit or len(ids) < wanted:
+                break
+            wanted *= 4
+        ids = [room_id for room_id in ids if room_id in kept][:limit]
+        if not ids:
+            return queryset.none()
+        return _order_by_ids(queryset, ids)
+
+
+class PostgresRoomSearch:
+    def search(self, queryset, term, limit):
+        from django.contrib.postgres.search import TrigramSimilarity
+        from .models import Room
+
+        # ranked on chat_room alone, so the listing's joins and participant
+        # count only run for the page, not for every match
+        rooms = Room.objects.filter(status=Room.ACTIVE)
+        if len(term) < 3:
+            # '%ab%' has no trigram for the index to look up, a prefix has
+            rooms = rooms.filter(name__istartswith=term)
+        else:
+            rooms = rooms.filter(name__icontains=term)
+        ids = list(
+            rooms.annotate(
+                search_prefix=Case(
+                    When(name__istartswith=term, then=Value(0)),
+                    default=Value(1),
+                    output_field=IntegerField(),
+                ),
+                search_similarity=TrigramSimilarity("name", term),
+            )
+            .order_by("search_prefix", "-search_similarity", "name")
+            .values_list("id", flat=True)[:limit]
+        )
+        if not ids:
+            return queryset.none()
+        return _order_by_ids(queryset, ids)
+
+
+class DatabaseRoomSearch:
+    def search(self, queryset, term, limit):
+        return queryset.filter(name__icontains=term)
+
+
+BACKENDS = {
+    "memory": MemoryRoomSearch,
+    "postgres": PostgresRoomSearch,
+    "db": DatabaseRoomSearch,
+}
+
+
+def get_room_search_backend(using="default"):
+    name = settings.ROOM_SEARCH_BACKEND
+    if name == "auto":
+        # the memory index is per process, never a default
+        name = "postgres" if connections[using].vendor == "postgresql" else "db"
+    return BACKENDS[name]()
+
+
+def search_rooms(queryset, term):
+    return get_room_search_backend(queryset.db).search(queryset, term, settings.ROOM_SEARCH_MAX_RESULTS)
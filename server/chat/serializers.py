@@ -1,6 +1,6 @@
 from rest_framework import serializers
-from .models import Room, Message
-from .validators import validate_name, validate_access, validate_status, validate_limit
+from .models import Room, Message, Participant
+from .validators import validate_name, validate_access, validate_status, validate_limit, validate_lifetime, validate_retention_days
 from users.serializers import MiniUserSerializer
 
 
@@ -9,8 +9,35 @@ class MiniMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Message
-        fields = ["id", "room", "sender", "sender_username", "type", "content", "timestamp"]
-        read_only_fields = ["id", "timestamp", "sender", "room"]
+        fields = ["id", "room", "sender", "sender_username", "type", "content", "timestamp", "seq"]
+        read_only_fields = ["id", "timestamp", "sender", "room", "seq"]
+
+
+class LastMessageSnapshotField(serializers.Field):
+    """
+    Renders the room's denormalized last message snapshot in the same shape
+    as MiniMessageSerializer, without touching the Message table.
+    """
+    timestamp_field = serializers.DateTimeField()
+
+    def __init__(self, **kwargs):
+        kwargs["source"] = "*"
+        kwargs["read_only"] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, room):
+        if room.last_message_id is None:
+            return None
+        return {
+            "id": room.last_message_id,
+            "room": room.id,
+            "sender": room.last_message_sender_id,
+            "sender_username": room.last_message_sender_username,
+            "type": room.last_message_type,
+            "content": room.last_message_preview,
+            "timestamp": self.timestamp_field.to_representation(room.last_message_at) if room.last_message_at else None,
+            "seq": room.last_message_seq,
+        }
 
 
 class RoomOwnerSerializer(serializers.ModelSerializer):
@@ -19,12 +46,14 @@ class RoomOwnerSerializer(serializers.ModelSerializer):
     access = serializers.CharField(validators=[validate_access], required=False)
     status = serializers.CharField(validators=[validate_status], required=False)
     limit = serializers.IntegerField(validators=[validate_limit], required=False)
-    last_message = MiniMessageSerializer(read_only=True)
+    lifetime = serializers.IntegerField(validators=[validate_lifetime], required=False, allow_null=True)
+    retention_days = serializers.IntegerField(validators=[validate_retention_days], required=False, allow_null=True)
+    last_message = LastMessageSnapshotField()
 
     class Meta:
         model = Room
-        fields = ['id', 'name', 'access', 'status', 'limit', 'participant_count', 'last_message', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'participant_count', 'last_message', 'created_at', 'updated_at']
+        fields = ['id', 'name', 'access', 'status', 'limit', 'lifetime', 'expires_at', 'retention_days', 'participant_count', 'last_message', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'expires_at', 'participant_count', 'last_message', 'created_at', 'updated_at']
 
 
 class RoomOwnerDetailSerializer(RoomOwnerSerializer):
@@ -36,15 +65,22 @@ class RoomOwnerDetailSerializer(RoomOwnerSerializer):
 
 class PublicRoomSerializer(serializers.ModelSerializer):
     participant_count = serializers.IntegerField(read_only=True)
-    is_participant = serializers.BooleanField(read_only=True)
+    is_participant = serializers.SerializerMethodField()
     owner = MiniUserSerializer(read_only=True)
-    last_message = MiniMessageSerializer(read_only=True)
+    last_message = LastMessageSnapshotField()
 
     class Meta:
         model = Room
         fields = ['id', 'name', 'owner', 'access', 'limit', 'participant_count', 'is_participant', 'last_message', 'created_at', 'updated_at']
         read_only_fields = ['id', 'participant_count', 'is_participant', 'last_message', 'created_at', 'updated_at']
 
+    def get_is_participant(self, room) -> bool:
+        # views pass the user's joined room ids (chat.membership), one lookup per page
+        joined_room_ids = self.context.get("joined_room_ids")
+        if joined_room_ids is None:
+            return getattr(room, "is_participant", None)
+        return room.id in joined_room_ids
+
 
 class MessageSerializer(serializers.ModelSerializer):
     sender_username = serializers.CharField(read_only=True)
@@ -52,5 +88,30 @@ class MessageSerializer(serializers.ModelSerializer):
   
     class Meta:
         model = Message
-        fields = ["id", "sender", "sender_username", "room", "type", "content", "timestamp", "msg_type"]
-        read_only_fields = ["id", "timestamp", "sender", "room"]
+        fields = ["id", "sender", "sender_username", "room", "type", "content", "timestamp", "seq", "msg_type"]
+        read_only_fields = ["id", "timestamp", "sender", "room", "seq"]
+
+
+class ParticipantSerializer(serializers.ModelSerializer):
+    """The requesting user's membership of a room, with its unread count"""
+    unread_count = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Participant
+        fields = ["room", "role", "joined_at", "last_read_seq", "muted", "unread_count"]
+        read_only_fields = ["room", "role", "joined_at", "unread_count"]
+
+    def get_unread_count(self, participant) -> int:
+        return participant.unread_count()
+
+    def validate_last_read_seq(self, value):
+        if value is not None and value > self.instance.room.latest_seq():
+            raise serializers.ValidationError("The room has no message with this seq yet.")
+        return value
+
+    def update(self, instance, validated_data):
+        # the read marker only moves forward
+        seq = validated_data.get("last_read_seq")
+        if seq is None or (instance.last_read_seq or 0) > seq:
+            validated_data.pop("last_read_seq", None)
+        return super().update(instance, validated_data)
@@ -1,9 +1,14 @@
 import logging
+from functools import partial
 from channels.db import database_sync_to_async
 from django.contrib.auth import get_user_model
 from django.core.exceptions import PermissionDenied
-from .models import Room, Message
+from django.db import transaction
+from django.db.models import Count, Exists, Q
+from . import media
+from .models import Room, Message, Participant
 from .serializers import MiniMessageSerializer
+from .tracing import SAVE_START, SAVE_END
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -12,25 +17,36 @@ logger = logging.getLogger(__name__)
 # websocket services:
 @database_sync_to_async
 def permission_to_join_room(user, room_id):
-    logger.debug(user, room_id)
+    """
+    ``(allowed, joined_now)`` for a user opening the room's socket. Members
+    are recognised with one indexed query; a new member of a public room is
+    added with the room row locked, so concurrent joins cannot overfill it.
+    """
+    logger.debug('join request: user=%s room=%s', user.id, room_id)
     try:
-        room = Room.objects.get(id=room_id, status=Room.ACTIVE)
-        logger.info(f'join room count: {room.participants.count()}')
-        if room.participants.filter(id=user.id).exists():
+        if Participant.objects.filter(room_id=room_id, user_id=user.id, room__status=Room.ACTIVE).exists():
             return True, False
-        if room.limit <= room.participants.count():
-            return False, False
-        if room.access == Room.PUBLIC:
-            room.participants.add(user)
-            room.save(update_fields=[])
-            logger.info(f'join inside room count: {room.participants.count()}')
-            return True, True
-        else:
-            return False, False
+
+        with transaction.atomic():
+            room = Room.objects.select_for_update().get(id=room_id, status=Room.ACTIVE)
+            if room.access != Room.PUBLIC:
+                return False, False
+            members = Participant.objects.filter(room_id=room.id).aggregate(
+                total=Count("id"), mine=Count("id", filter=Q(user_id=user.id)),
+            )
+            if members["mine"]:
+                return True, False
+            if room.limit <= members["total"]:
+                return False, False
+            # history from before the join is not unread; the post_save signal
+            # invalidates the cached memberships and responses
+            Participant.objects.create(room=room, user=user, last_read_seq=room.latest_seq() or None)
+        logger.info('user %s joined room %s', user.id, room.id)
+        return True, True
     except Room.DoesNotExist:
         return False, False
     except Exception as e:
-        logger.error(f"Error adding user to room: {e}")
+        logger.error("Error adding user to room: %s", e)
         return False, False
 
 
@@ -40,20 +56,15 @@ def participant_leave_room(user, room_id):
     Allow a participant to voluntarily leave a room.
     """
     try:
-        room = Room.objects.get(id=room_id, status=Room.ACTIVE)
-        logger.debug('room:', room)
-        if room.owner == user:
-            return False
-        if room.participants.filter(id=user.id).exists():
-            room.participants.remove(user)
-            room.save(update_fields=[])
-            return True
-        return False
-
-    except Room.DoesNotExist:
-        return False
+        # the owner's membership is never deleted; post_delete invalidates the caches
+        deleted, _ = (
+            Participant.objects.filter(room_id=room_id, user_id=user.id, room__status=Room.ACTIVE)
+            .exclude(role=Participant.OWNER)
+            .delete()
+        )
+        return deleted > 0
     except Exception as e:
-        logger.error(f"Error leaving room: {e}")
+        logger.error("Error leaving room: %s", e)
         return False
 
 
@@ -62,43 +73,117 @@ def remove_participant(owner, room_id, target_user_id):
     """
     Allow the room owner to remove a participant from the room.
     """
+    try:
+        deleted, _ = (
+            Participant.objects.filter(
+                room_id=room_id, user_id=target_user_id, room__owner_id=owner.id, room__status=Room.ACTIVE,
+            )
+            .exclude(role=Participant.OWNER)
+            .delete()
+        )
+        return deleted > 0
+    except Exception as e:
+        logger.error("Error removing participant from room: %s", e)
+        return False
+
+
+@database_sync_to_async
+def mark_read(user, room_id, seq):
+    """
+    Move the user's read marker forward to ``seq``, never back and never past
+    the room's last message (the snapshot lags, so chat_message is checked too).
+    One UPDATE; returns whether it moved.
+    """
+    exists = Exists(Message.objects.filter(room_id=room_id, seq__gte=seq))
+    updated = (
+        Participant.objects.filter(Q(room__last_message_seq__gte=seq) | exists, room_id=room_id, user_id=user.id)
+        .filter(Q(last_read_seq__isnull=True) | Q(last_read_seq__lt=seq))
+        .update(last_read_seq=seq)
+    )
+    return updated > 0
+
+@database_sync_to_async
+def save_message(user, room_id, message, message_type, trace=None, publish=None):
+    """
+    Persist a chat message. ``publish(seq, data)`` is called once the write has
+    committed, so nothing is ever broadcast that a rollback could undo.
+    """
+    if trace is not None:
+        trace.mark(SAVE_START)
     try:
         room = Room.objects.get(id=room_id, status=Room.ACTIVE)
+    except Room.DoesNotExist:
+        raise PermissionDenied("Room does not exist or is inactive.")  # I have to improve, by giving proper return
 
-        if room.owner_id != owner.id:
-            return False  # only the owner can remove participants
+    if not Participant.objects.filter(room_id=room.id, user_id=user.id).exists():
+        raise PermissionDenied("You are not a participant of this room.")
+    check_message_type(room.id, message, message_type)
 
-        target_user = User.objects.get(id=target_user_id)
+    with transaction.atomic():
+        msg = Message(
+            sender=user,
+            room=room,
+            content=message,
+            type=message_type,
+        )
+        msg.save()
+        data = MiniMessageSerializer(msg).data
+        if trace is not None:
+            trace.mark(SAVE_END)
+        if publish is not None:
+            transaction.on_commit(partial(publish, msg.seq, data))
+    return data
 
-        if room.participants.filter(id=target_user.id).exists():
-            room.participants.remove(target_user)
-            room.save(update_fields=[])
-            return True
-        return False  # target not in room
 
-    except Room.DoesNotExist:
-        return False
-    except User.DoesNotExist:
-        return False
-    except Exception as e:
-        logger.error(f"Error removing participant from room: {e}")
-        return False
+def check_message_type(room_id, message, message_type):
+    """
+    Socket messages are text, or images whose content references media
+    already posted in the room; image bytes only come through uploads.
+    """
+    if message_type == "text":
+        return
+    if message_type == "image" and media.is_room_reference(message, room_id):
+        return
+    raise PermissionDenied("Images must reference media uploaded to this room.")
+
 
 @database_sync_to_async
-def save_message(user, room_id, message, message_type):
+def save_message_batch(room_id, items):
+    """
+    Persist a batch of ``(user, message, message_type, trace)`` items of one room
+    in a single transaction. Returns, per item, the serialized message or the
+    exception that rejected it.
+    """
+    for _, _, _, trace in items:
+        if trace is not None:
+            trace.mark(SAVE_START)
+
     try:
         room = Room.objects.get(id=room_id, status=Room.ACTIVE)
     except Room.DoesNotExist:
-        raise PermissionDenied("Room does not exist or is inactive.")  # I have to improve, by giving proper return
+        return [PermissionDenied("Room does not exist or is inactive.") for _ in items]
 
-    if not room.participants.filter(id=user.id).exists():
-        raise PermissionDenied("You are not a participant of this room.")
+    sender_ids = {user.id for user, _, _, _ in items}
+    allowed = set(Participant.objects.filter(room_id=room.id, user_id__in=sender_ids).values_list("user_id", flat=True))
 
-    msg = Message(
-        sender=user,
-        room=room,
-        content=message,
-        type=message_type,
-    )
-    msg.save()
-    return MiniMessageSerializer(msg).data
+    results = [None] * len(items)
+    pending = []
+    for index, (user, message, message_type, _) in enumerate(items):
+        if user.id not in allowed:
+            results[index] = PermissionDenied("You are not a participant of this room.")
+            continue
+        try:
+            check_message_type(room.id, message, message_type)
+        except PermissionDenied as e:
+            results[index] = e
+            continue
+        pending.append((index, Message(sender=user, room=room, content=message, type=message_type)))
+
+    if pending:
+        Message.bulk_create_in_room(room, [msg for _, msg in pending])
+        for index, msg in pending:
+            results[index] = MiniMessageSerializer(msg).data
+            trace = items[index][3]
+            if trace is not None:
+                trace.mark(SAVE_END)
+    return results
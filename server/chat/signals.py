@@ -0,0 +1,51 @@
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from . import membership
+from .models import Room, Participant
+from .response_cache import bump
+from .search import room_name_index
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def retire_cached_room_responses(sender, instance, **kwargs):
+    bump(instance.id)
+
+
+@receiver(post_save, sender=Room)
+def index_room_name(sender, instance, update_fields=None, **kwargs):
+    # the index loads itself from the database on first search
+    if not room_name_index.loaded:
+        return
+    if update_fields is not None and not {"name", "status"} & set(update_fields):
+        return
+    if instance.status == Room.ACTIVE:
+        room_name_index.add(instance.id, instance.name)
+    else:
+        room_name_index.remove(instance.id)
+
+
+@receiver(post_delete, sender=Room)
+def unindex_room_name(sender, instance, **kwargs):
+    if room_name_index.loaded:
+        room_name_index.remove(instance.id)
+
+
+@receiver(post_save, sender=Participant)
+@receiver(post_delete, sender=Participant)
+def retire_cached_membership(sender, instance, created=True, **kwargs):
+    # read marker and mute changes touch neither the member set nor the counts
+    if not created:
+        return
+    membership.invalidate(instance.user_id)
+    bump(instance.room_id)
+
+
+@receiver(m2m_changed, sender=Participant)
+def retire_cached_memberships(sender, instance, action, reverse, pk_set, **kwargs):
+    # room.participants.add() / remove() and user.participating_rooms, as the admin uses them
+    if action not in ("post_add", "post_remove") or not pk_set:
+        return
+    user_ids, room_ids = (pk_set, [instance.pk]) if not reverse else ([instance.pk], pk_set)
+    membership.invalidate(*user_ids)
+    bump(*room_ids)
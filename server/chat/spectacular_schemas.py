@@ -1,5 +1,5 @@
-from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample
-from .serializers import RoomOwnerSerializer, RoomOwnerDetailSerializer, PublicRoomSerializer, MessageSerializer
+from drf_spectacular.utils import extend_schema, OpenApiResponse, OpenApiExample, OpenApiParameter
+from .serializers import RoomOwnerSerializer, RoomOwnerDetailSerializer, PublicRoomSerializer, MessageSerializer, MiniMessageSerializer, ParticipantSerializer
 
 
 def doc_owner_room_list_schema():
@@ -115,4 +115,133 @@ def doc_room_message_list_schema():
             403: OpenApiResponse(description="Forbidden (user is not the owner or a participant)"),
             404: OpenApiResponse(description="Room not found")
         }
-    )
\ No newline at end of file
+    )
+
+def doc_room_message_search_schema():
+    return extend_schema(
+        summary="Search the messages of a specific room",
+        parameters=[
+            OpenApiParameter("q", str, description="Words every hit must contain", required=True),
+            OpenApiParameter("before", int, description="Only hits with a lower seq (keyset cursor from next)"),
+            OpenApiParameter("context", int, description="Messages returned before and after each hit"),
+        ],
+        responses={
+            200: OpenApiResponse(description="Hits newest first, each with its surrounding messages"),
+            400: OpenApiResponse(description="Missing q or invalid before / context"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            403: OpenApiResponse(description="Forbidden (user is not the owner or a participant)"),
+        }
+    )
+
+
+def doc_room_export_schema():
+    return extend_schema(
+        summary="Export the history of an owned room",
+        parameters=[
+            OpenApiParameter("output", str, enum=["ndjson", "csv"], description="Export format, ndjson by default"),
+            OpenApiParameter("since", int, description="Only messages after this seq (incremental export)"),
+            OpenApiParameter("gzip", bool, description="Gzip the stream"),
+        ],
+        responses={
+            (200, "application/x-ndjson"): OpenApiResponse(description="Room line, then one line per message"),
+            (200, "text/csv"): OpenApiResponse(description="Header row, then one row per message"),
+            400: OpenApiResponse(description="Invalid output or since"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            404: OpenApiResponse(description="Room not found or not owned by the user"),
+        }
+    )
+
+
+def doc_room_import_schema():
+    return extend_schema(
+        summary="Import NDJSON room archives (admin only)",
+        parameters=[
+            OpenApiParameter("owner", str, description="Username owning the created rooms, the caller by default"),
+        ],
+        request={"application/x-ndjson": bytes},
+        responses={
+            200: OpenApiResponse(description="Counts of created rooms, imported, skipped, already imported and out of order messages"),
+            400: OpenApiResponse(description="Malformed archive or unknown owner"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            403: OpenApiResponse(description="Forbidden (admin only)"),
+        }
+    )
+
+
+def doc_media_upload_schema():
+    return extend_schema(
+        summary="Open a chunked image upload in a room",
+        request={"application/json": {"type": "object", "properties": {"size": {"type": "integer"}, "content_type": {"type": "string"}}}},
+        responses={
+            201: OpenApiResponse(description="Upload id, size, bytes received and the maximum chunk size"),
+            400: OpenApiResponse(description="Missing size, too large or unsupported content type"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            403: OpenApiResponse(description="Forbidden (user is not a participant or the room is inactive)"),
+        }
+    )
+
+
+def doc_media_upload_chunk_schema():
+    return extend_schema(
+        summary="Append a chunk to an image upload",
+        parameters=[
+            OpenApiParameter("Content-Range", str, location=OpenApiParameter.HEADER, required=True,
+                             description="bytes <first>-<last>/<size> of this chunk"),
+        ],
+        request={"application/octet-stream": bytes},
+        responses={
+            200: OpenApiResponse(description="Chunk stored, bytes received so far"),
+            201: OpenApiResponse(response=MiniMessageSerializer, description="Last chunk stored, the image message"),
+            400: OpenApiResponse(description="Missing or invalid Content-Range, chunk too large"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            404: OpenApiResponse(description="Upload not found"),
+            409: OpenApiResponse(description="Chunk at the wrong offset, resume from received"),
+        }
+    )
+
+
+def doc_media_schema():
+    return extend_schema(
+        summary="Download a media file",
+        parameters=[
+            OpenApiParameter("Range", str, location=OpenApiParameter.HEADER, description="bytes=<first>-<last>"),
+        ],
+        responses={
+            (200, "application/octet-stream"): OpenApiResponse(description="The whole file"),
+            (206, "application/octet-stream"): OpenApiResponse(description="The requested range"),
+            304: OpenApiResponse(description="Not modified (If-None-Match)"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            404: OpenApiResponse(description="Not found or not posted in a room of the user"),
+            416: OpenApiResponse(description="Range not satisfiable"),
+        }
+    )
+
+
+def doc_media_preview_schema():
+    return extend_schema(
+        summary="Download an image preview",
+        parameters=[
+            OpenApiParameter("Range", str, location=OpenApiParameter.HEADER, description="bytes=<first>-<last>"),
+        ],
+        responses={
+            (200, "image/webp"): OpenApiResponse(description="The preview, fit to size pixels"),
+            (206, "image/webp"): OpenApiResponse(description="The requested range"),
+            304: OpenApiResponse(description="Not modified (If-None-Match)"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            404: OpenApiResponse(description="Not found, unknown size, or not rendered yet (with Retry-After)"),
+            416: OpenApiResponse(description="Range not satisfiable"),
+        }
+    )
+
+
+def doc_room_membership_schema():
+    return extend_schema(
+        summary="Own membership of a room: read marker, mute and unread count",
+        request=ParticipantSerializer,
+        responses={
+            200: ParticipantSerializer,
+            400: OpenApiResponse(description="Read marker past the room's last message"),
+            401: OpenApiResponse(description="Unauthorized (authentication required)"),
+            404: OpenApiResponse(description="Not a participant of this room"),
+        }
+    )
@@ -49,11 +49,12 @@ class CrossComponentIntegrationTest(APITestCase):
         room.participants.add(self.participant)
         
         # Step 3: Create message
-        Message.objects.create(
-            sender=self.owner,
-            room=room,
-            content='Welcome to the room!'
-        )
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(
+                sender=self.owner,
+                room=room,
+                content='Welcome to the room!'
+            )
         
         # Step 4: Retrieve messages
         messages_url = reverse('room-messages', kwargs={'room_id': room_id})
@@ -0,0 +1,114 @@
+import asyncio
+from django.test import TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db import connections
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from chat.actors import RoomActor
+from chat.consumers.chat_consumer import ChatConsumer
+from chat.models import Room, Message
+
+User = get_user_model()
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.sent.append((group, event))
+
+
+class RoomActorTest(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(
+            username='room_owner',
+            email='owner@example.com',
+            password='TestPass123!'
+        )
+        self.outsider = User.objects.create_user(
+            username='outsider',
+            email='outsider@example.com',
+            password='TestPass123!'
+        )
+        self.room = Room.objects.create(owner=self.owner, name='Actor Room')
+
+    def tearDown(self):
+        for conn in connections.all():
+            conn.close()
+        super().tearDown()
+
+    async def test_queued_messages_are_batched(self):
+        """Test messages queued while a batch is saving go out together"""
+        layer = RecordingLayer()
+        actor = RoomActor(self.room.id, layer, asyncio.get_running_loop(), idle_timeout=0.1)
+        actor.start()
+
+        results = await asyncio.gather(*[
+            actor.submit(self.owner, f"message {i}", "text") for i in range(5)
+        ])
+
+        self.assertEqual([result["content"] for result in results], [f"message {i}" for i in range(5)])
+        self.assertEqual([result["seq"] for result in results], [1, 2, 3, 4, 5])
+        self.assertEqual(len(layer.sent), 1)
+        group, event = layer.sent[0]
+        self.assertEqual(group, f"room_{self.room.id}")
+        self.assertEqual(event["type"], "chat_message_batch")
+        self.assertEqual(len(event["messages"]), 5)
+
+        last_message_id = await database_sync_to_async(
+            lambda: Room.objects.get(id=self.room.id).last_message_id
+        )()
+        self.assertEqual(last_message_id, results[-1]["id"])
+
+    async def test_non_participant_is_rejected(self):
+        """Test a rejected sender does not break the rest of the batch"""
+        layer = RecordingLayer()
+        actor = RoomActor(self.room.id, layer, asyncio.get_running_loop(), idle_timeout=0.1)
+        actor.start()
+
+        accepted, rejected = await asyncio.gather(
+            actor.submit(self.owner, "hello", "text"),
+            actor.submit(self.outsider, "intruder", "text"),
+            return_exceptions=True,
+        )
+
+        self.assertEqual(accepted["content"], "hello")
+        self.assertIsInstance(rejected, Exception)
+        count = await database_sync_to_async(Message.objects.count)()
+        self.assertEqual(count, 1)
+
+    async def test_idle_actor_stops(self):
+        """Test an actor without connected users stops after the idle timeout"""
+        actor = RoomActor(self.room.id, RecordingLayer(), asyncio.get_running_loop(), idle_timeout=0.01)
+        actor.start()
+        await asyncio.sleep(0.05)
+        self.assertFalse(actor.running)
+
+    @override_settings(CHAT_ROOM_ACTORS=True)
+    async def test_consumer_sends_through_actor(self):
+        """Test the consumer delivers messages through the room actor"""
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(),
+            f"/ws/room/{self.room.id}/"
+        )
+        communicator.scope["user"] = self.owner
+        communicator.scope['url_route'] = {'kwargs': {'room_id': str(self.room.id)}}
+
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({
+            "type": "send_chat",
+            "message_type": "text",
+            "payload": {
+                "message": "Via actor"
+            }
+        })
+
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "chat_recieved")
+        self.assertEqual(response["payload"]["message"]["content"], "Via actor")
+
+        await communicator.disconnect()
@@ -0,0 +1,97 @@
+import datetime
+import io
+import json
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat import archive, export, expiry
+from chat.models import Room, Message, MessageArchiveBlock, MessageTerm
+
+User = get_user_model()
+
+
+def fill(room, senders, count, days_old):
+    """``count`` messages, one a day, the first ``days_old`` days (less 12 hours) ago."""
+    start = timezone.now() - datetime.timedelta(days=days_old, hours=-12)
+    for n in range(count):
+        message = Message.objects.create(sender=senders[n % len(senders)], room=room, content=f"note {n}")
+        Message.objects.filter(id=message.id).update(timestamp=start + datetime.timedelta(days=n))
+    room.refresh_from_db()
+
+
+class ArchiveRoomTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="archive_owner", email="archive_owner@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Archive Room", retention_days=5)
+        with self.captureOnCommitCallbacks(execute=True):
+            fill(self.room, [self.owner], 10, days_old=9)
+        self.room.refresh_from_db()
+
+    def test_moves_old_prefix(self):
+        """Test messages older than the retention move in blocks, their terms go with them"""
+        self.assertEqual(archive.archive_room(self.room, block_size=2), 4)
+        self.assertEqual(list(self.room.messages.order_by("seq").values_list("seq", flat=True)), [5, 6, 7, 8, 9, 10])
+        self.assertFalse(MessageTerm.objects.filter(room_id=self.room.id, seq__lt=5).exists())
+        blocks = list(MessageArchiveBlock.objects.filter(room=self.room).order_by("first_seq").values_list("first_seq", "last_seq", "count"))
+        self.assertEqual(blocks, [(1, 2, 2), (3, 4, 2)])
+        rows = archive.decode_block(MessageArchiveBlock.objects.get(room=self.room, first_seq=1).data)
+        self.assertEqual([(row[1], row[3], row[5]) for row in rows], [(1, "archive_owner", "note 0"), (2, "archive_owner", "note 1")])
+
+    def test_last_message_stays_hot(self):
+        """Test the room's last message is never archived"""
+        archive.archive_room(self.room, now=timezone.now() + datetime.timedelta(days=30))
+        self.assertEqual(list(self.room.messages.values_list("seq", flat=True)), [10])
+
+    def test_global_retention(self):
+        """Test rooms without their own retention follow MESSAGE_RETENTION_DAYS, 0 keeps everything"""
+        self.room.retention_days = None
+        self.room.save(update_fields=["retention_days"])
+        self.assertEqual(archive.archive_rooms(), 0)
+        with self.settings(MESSAGE_RETENTION_DAYS=7):
+            out = io.StringIO()
+            call_command("archive_messages", stdout=out)
+        self.assertIn("2 messages archived", out.getvalue())
+
+    def test_purge_drops_archive(self):
+        """Test deleting a room deletes its archive blocks"""
+        archive.archive_room(self.room)
+        expiry.delete_room(self.room)
+        expiry.purge_rooms([self.room.id])
+        self.assertFalse(MessageArchiveBlock.objects.exists())
+
+
+class ReadThroughTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="cold_owner", email="cold_owner@example.com", password="TestPass123!")
+        self.member = User.objects.create_user(username="cold_member", email="cold_member@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Cold Room", retention_days=5)
+        self.room.participants.add(self.member)
+        with self.captureOnCommitCallbacks(execute=True):
+            fill(self.room, [self.owner, self.member], 12, days_old=11)
+        self.room.refresh_from_db()
+        self.url = reverse("room-messages", kwargs={"room_id": self.room.id})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.member).access_token}")
+
+    def pages(self):
+        return [self.client.get(self.url, {"page": page, "page_size": 5}).data for page in (1, 2, 3)]
+
+    def test_pages_are_unchanged_by_archiving(self):
+        """Test every page reads the same once older messages are archived"""
+        before = self.pages()
+        with override_settings(ARCHIVE_BLOCK_SIZE=3):
+            self.assertEqual(archive.archive_room(self.room), 6)
+        self.assertEqual(self.room.messages.count(), 6)
+        self.assertEqual(json.dumps(self.pages()), json.dumps(before))
+        self.assertEqual([m["seq"] for m in before[2]["results"]], [1, 2])
+
+    def test_export_includes_archive(self):
+        """Test the export reads the archive first, then the hot messages"""
+        archive.archive_room(self.room)
+        records = [json.loads(line) for line in b"".join(export.ndjson_lines(self.room)).splitlines()]
+        self.assertEqual([r["seq"] for r in records[1:]], list(range(1, 13)))
+        records = [json.loads(line) for line in b"".join(export.ndjson_lines(self.room, since=4)).splitlines()]
+        self.assertEqual([r["seq"] for r in records[1:]], list(range(5, 13)))
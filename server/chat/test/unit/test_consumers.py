@@ -1,4 +1,4 @@
-from django.test import TransactionTestCase
+from django.test import TransactionTestCase, override_settings
 from django.contrib.auth import get_user_model
 from channels.testing import WebsocketCommunicator
 from channels.db import database_sync_to_async
@@ -127,6 +127,36 @@ class ChatConsumerTest(TransactionTestCase):
         
         await communicator.disconnect()
 
+    @override_settings(CHAT_TRACE_PAYLOAD=True)
+    async def test_send_message_carries_trace(self):
+        """Test outbound chat frames carry per stage timestamps when enabled"""
+        communicator = WebsocketCommunicator(
+            ChatConsumer.as_asgi(),
+            f"/ws/room/{self.room.id}/"
+        )
+        communicator.scope["user"] = self.participant
+        communicator.scope['url_route'] = {'kwargs': {'room_id': str(self.room.id)}}
+
+        connected, subprotocol = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()
+
+        await communicator.send_json_to({
+            "type": "send_chat",
+            "message_type": "text",
+            "payload": {
+                "message": "Traced"
+            }
+        })
+
+        response = await communicator.receive_json_from()
+        trace = response["payload"]["trace"]
+        for stage in ("received", "save_start", "save_end", "enqueued", "delivered"):
+            self.assertIn(stage, trace)
+        self.assertLessEqual(trace["received"], trace["delivered"])
+
+        await communicator.disconnect()
+
     async def test_empty_message_ignored(self):
         """Test empty messages are ignored"""
         communicator = WebsocketCommunicator(
@@ -0,0 +1,223 @@
+import asyncio
+import datetime
+import io
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.exceptions import PermissionDenied
+from rest_framework.test import APIClient
+from chat import export, expiry, membership, response_cache
+from chat.importer import import_rooms
+from chat.consumers.chat_consumer import ChatConsumer
+from chat.models import Room, Message, MessageTerm
+from chat.views import get_readable_room
+from chat.serializers import RoomOwnerSerializer
+
+User = get_user_model()
+
+
+class RoomExpiresAtTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="ttl_owner", email="ttl_owner@example.com", password="TestPass123!")
+
+    def test_lifetime_sets_deadline_from_creation(self):
+        """Test a room with a lifetime expires that long after it was created"""
+        room = Room.objects.create(owner=self.owner, name="Lifetime Room", lifetime=600)
+        # taken just before the INSERT sets created_at
+        self.assertAlmostEqual(room.expires_at, room.created_at + datetime.timedelta(seconds=600), delta=datetime.timedelta(seconds=1))
+
+    def test_no_expiry_without_idle_timeout(self):
+        """Test rooms never expire when ROOM_IDLE_TIMEOUT is 0 and they have no lifetime"""
+        room = Room.objects.create(owner=self.owner, name="Forever Room")
+        self.assertIsNone(room.expires_at)
+
+    @override_settings(ROOM_IDLE_TIMEOUT=3600)
+    def test_messages_move_idle_deadline(self):
+        """Test the idle deadline follows the last message, lifetime deadlines do not move"""
+        idle = Room.objects.create(owner=self.owner, name="Idle Room")
+        fixed = Room.objects.create(owner=self.owner, name="Fixed Room", lifetime=600)
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(sender=self.owner, room=idle, content="still here")
+            Message.objects.create(sender=self.owner, room=fixed, content="still here")
+        idle.refresh_from_db()
+        self.assertAlmostEqual(idle.expires_at, message.timestamp + datetime.timedelta(seconds=3600), delta=datetime.timedelta(seconds=1))
+        fixed_expires_at = fixed.expires_at
+        fixed.refresh_from_db()
+        self.assertEqual(fixed.expires_at, fixed_expires_at)
+
+    @override_settings(ROOM_IDLE_TIMEOUT=3600)
+    def test_imported_messages_do_not_expire_room(self):
+        """Test the idle deadline counts from the import, not from the archived message timestamps"""
+        source = Room.objects.create(owner=self.owner, name="Old Room")
+        Message.objects.create(sender=self.owner, room=source, content="long ago")
+        source.messages.update(timestamp=timezone.now() - datetime.timedelta(days=365))
+        archive = b"".join(export.ndjson_lines(source)).replace(b'"Old Room"', b'"Restored Room"')
+        import_rooms(io.BytesIO(archive), self.owner)
+        restored = Room.objects.get(name="Restored Room")
+        self.assertGreater(restored.expires_at, timezone.now() + datetime.timedelta(seconds=3500))
+        self.assertEqual(expiry.claim_expired(), [])
+
+    @override_settings(ROOM_IDLE_TIMEOUT=3600)
+    def test_saving_an_imported_room_keeps_it_alive(self):
+        """Test a PATCH of a room imported with old messages counts the idle deadline from the save"""
+        source = Room.objects.create(owner=self.owner, name="Ancient Room")
+        Message.objects.create(sender=self.owner, room=source, content="in 2020")
+        source.messages.update(timestamp=datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc))
+        archive = b"".join(export.ndjson_lines(source)).replace(b'"Ancient Room"', b'"Patched Room"')
+        import_rooms(io.BytesIO(archive), self.owner)
+        restored = Room.objects.get(name="Patched Room")
+
+        client = APIClient()
+        client.force_authenticate(self.owner)
+        response = client.patch(reverse("create-room", kwargs={"id": restored.id}), {"limit": 20}, format="json")
+        self.assertEqual(response.status_code, 200)
+        restored.refresh_from_db()
+        self.assertEqual(restored.limit, 20)
+        self.assertGreater(restored.expires_at, timezone.now() + datetime.timedelta(seconds=3500))
+        self.assertEqual(expiry.claim_expired(), [])
+
+    def test_owner_sets_lifetime(self):
+        """Test owners can set and clear the lifetime within bounds"""
+        room = Room.objects.create(owner=self.owner, name="Owned Room")
+        serializer = RoomOwnerSerializer(room, data={"lifetime": 120}, partial=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+        self.assertEqual(room.expires_at, room.created_at + datetime.timedelta(seconds=120))
+        self.assertFalse(RoomOwnerSerializer(room, data={"lifetime": 10}, partial=True).is_valid())
+
+
+class SweepTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="sweep_owner", email="sweep_owner@example.com", password="TestPass123!")
+        self.member = User.objects.create_user(username="sweep_member", email="sweep_member@example.com", password="TestPass123!")
+        self.expired = Room.objects.create(owner=self.owner, name="Expired Room", lifetime=60)
+        self.expired.participants.add(self.member)
+        for n in range(5):
+            Message.objects.create(sender=self.member, room=self.expired, content=f"old words {n}")
+        self.alive = Room.objects.create(owner=self.owner, name="Alive Room", lifetime=3600)
+        Message.objects.create(sender=self.owner, room=self.alive, content="fresh words")
+        self.later = timezone.now() + datetime.timedelta(seconds=120)
+
+    def test_purge_skips_the_delete_collector(self):
+        """Test messages are deleted without being loaded, one batch per transaction"""
+        expiry.claim_expired(now=self.later)
+        with self.settings(ROOM_PURGE_BATCH_SIZE=2), CaptureQueriesContext(connection) as queries:
+            expiry.purge_rooms([self.expired.id])
+        selects = [q["sql"] for q in queries.captured_queries if 'FROM "chat_message"' in q["sql"] and q["sql"].startswith("SELECT")]
+        # three id batches and the empty one, plus the collector's check on the emptied room
+        self.assertEqual(len(selects), 5)
+        self.assertFalse(any('"chat_message"."content"' in sql for sql in selects[:4]))
+
+    def test_sweep_deletes_expired_rooms_only(self):
+        """Test expired rooms go with their messages, terms and memberships, others stay"""
+        self.assertEqual(membership.joined_room_ids(self.member.id), frozenset({self.expired.id}))
+        version = response_cache.room_version(self.expired.id)
+        with self.settings(ROOM_PURGE_BATCH_SIZE=2):
+            self.assertEqual(expiry.sweep(now=self.later, notify=False), 1)
+
+        self.assertFalse(Room.objects.filter(id=self.expired.id).exists())
+        self.assertFalse(Message.objects.filter(room_id=self.expired.id).exists())
+        self.assertFalse(MessageTerm.objects.filter(room_id=self.expired.id).exists())
+        self.assertFalse(Room.participants.through.objects.filter(room_id=self.expired.id).exists())
+        self.assertEqual(self.alive.messages.count(), 1)
+        self.assertEqual(membership.joined_room_ids(self.member.id), frozenset())
+        self.assertNotEqual(response_cache.room_version(self.expired.id), version)
+
+    def test_claim_hides_rooms(self):
+        """Test claimed rooms are marked deleting before they are purged"""
+        self.assertEqual(expiry.claim_expired(now=self.later), [self.expired.id])
+        self.expired.refresh_from_db()
+        self.assertEqual(self.expired.status, Room.DELETING)
+        with self.assertRaises(PermissionDenied):
+            get_readable_room(self.expired.id, self.owner)
+        # not claimed again while its purge lease runs, a purge that died is picked up after it
+        self.assertEqual(expiry.claim_expired(now=self.later), [])
+        self.assertEqual(expiry.sweep(now=self.later, notify=False), 0)
+        after_lease = self.later + datetime.timedelta(seconds=settings.ROOM_PURGE_LEASE + 1)
+        self.assertEqual(expiry.sweep(now=after_lease, notify=False), 1)
+        self.assertTrue(Room.objects.filter(id=self.alive.id).exists())
+
+    def test_purge_skips_rooms_it_did_not_claim(self):
+        """Test rooms not claimed for deletion, or whose lease ran out, are left alone"""
+        self.assertEqual(expiry.purge_rooms([self.alive.id]), [])
+        self.assertEqual(self.alive.messages.count(), 1)
+        expiry.claim_expired(now=self.later)
+        Room.objects.filter(id=self.expired.id).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        self.assertEqual(expiry.purge_rooms([self.expired.id]), [])
+        self.assertEqual(self.expired.messages.count(), 5)
+
+    @override_settings(ROOM_IDLE_TIMEOUT=3600)
+    def test_rooms_without_a_deadline_get_one(self):
+        """Test a sweep gives rooms from before idle expiry a deadline from their last activity"""
+        Room.objects.filter(id=self.alive.id).update(lifetime=None, expires_at=None)
+        last_activity = timezone.now() - datetime.timedelta(seconds=7200)
+        stale = Room.objects.create(owner=self.owner, name="Stale Room")
+        Room.objects.filter(id=stale.id).update(expires_at=None, updated_at=last_activity, last_message_at=last_activity)
+        self.assertEqual(expiry.backfill_idle_deadlines(), 2)
+        self.alive.refresh_from_db()
+        self.assertGreater(self.alive.expires_at, timezone.now() + datetime.timedelta(seconds=3500))
+        self.assertEqual(expiry.sweep(notify=False), 1)
+        self.assertFalse(Room.objects.filter(id=stale.id).exists())
+        self.assertEqual(expiry.backfill_idle_deadlines(), 0)
+
+    def test_command(self):
+        """Test expire_rooms reports what it deleted"""
+        Room.objects.filter(id=self.expired.id).update(expires_at=timezone.now() - datetime.timedelta(seconds=1))
+        out = io.StringIO()
+        call_command("expire_rooms", "--no-notify", stdout=out)
+        self.assertIn("1 rooms expired", out.getvalue())
+
+
+class ExpiryNotificationTest(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="notify_owner", email="notify_owner@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Notify Room", lifetime=60)
+
+    def tearDown(self):
+        for conn in connections.all():
+            conn.close()
+        super().tearDown()
+
+    async def test_connected_sockets_are_told_and_closed(self):
+        """Test sockets of an expired room get an expired notification and are closed"""
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/room/{self.room.id}/")
+        communicator.scope["user"] = self.owner
+        communicator.scope["url_route"] = {"kwargs": {"room_id": str(self.room.id)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # joined
+
+        await expiry.notify_closed([self.room.id])
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["sub_type"], "expired")
+        self.assertEqual(response["room_id"], self.room.id)
+        closed = await communicator.receive_output()
+        self.assertEqual(closed, {"type": "websocket.close", "code": 4004, "reason": "Room expired"})
+        await communicator.disconnect()
+
+
+class RoomSweeperTest(SimpleTestCase):
+    @override_settings(ROOM_SWEEPER_ENABLED=True)
+    def test_one_sweeper_per_loop(self):
+        """Test ensure_room_sweeper starts a single sweeper per running loop"""
+        async def run():
+            first = expiry.ensure_room_sweeper()
+            second = expiry.ensure_room_sweeper()
+            first.stop()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIs(first, second)
+
+    def test_disabled_in_tests(self):
+        """Test the test settings leave the sweeper off"""
+        async def run():
+            return expiry.ensure_room_sweeper()
+
+        self.assertIsNone(asyncio.run(run()))
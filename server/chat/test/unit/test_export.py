@@ -0,0 +1,101 @@
+import csv
+import gzip
+import io
+import json
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat import export
+from chat.models import Room, Message
+
+User = get_user_model()
+
+
+class RoomExportViewTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="export_owner", email="export_owner@example.com", password="TestPass123!")
+        self.member = User.objects.create_user(username="export_member", email="export_member@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Export Room")
+        self.room.participants.add(self.member)
+        for n, sender in enumerate([self.owner, self.member, self.owner], start=1):
+            Message.objects.create(sender=sender, room=self.room, content=f'line {n}, "quoted"\nnext')
+        self.url = reverse("room-export", kwargs={"room_id": self.room.id})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.owner).access_token}")
+
+    def lines(self, response):
+        return [json.loads(line) for line in b"".join(response.streaming_content).splitlines()]
+
+    def test_ndjson_export(self):
+        """Test a room line followed by one line per message in seq order"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        self.assertIn('filename="room-', response["Content-Disposition"])
+        records = self.lines(response)
+        self.assertEqual(records[0]["record"], "room")
+        self.assertEqual(records[0]["name"], "Export Room")
+        self.assertEqual([r["seq"] for r in records[1:]], [1, 2, 3])
+        self.assertEqual(records[2]["sender_username"], "export_member")
+        self.assertEqual(records[1]["content"], 'line 1, "quoted"\nnext')
+
+    def test_since_exports_only_newer_messages(self):
+        """Test since continues after a previous export"""
+        records = self.lines(self.client.get(self.url, {"since": 2}))
+        self.assertEqual([r["seq"] for r in records[1:]], [3])
+
+    def test_csv_export(self):
+        """Test the CSV export has a header and quotes multi-line content"""
+        response = self.client.get(self.url, {"output": "csv"})
+        rows = list(csv.reader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual(rows[0], list(export.CSV_HEADER))
+        self.assertEqual([row[0] for row in rows[1:]], ["1", "2", "3"])
+        self.assertEqual(rows[1][5], 'line 1, "quoted"\nnext')
+
+    def test_gzip_export(self):
+        """Test gzip=1 streams a gzip file of the same content"""
+        plain = b"".join(self.client.get(self.url).streaming_content)
+        response = self.client.get(self.url, {"gzip": "1"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        self.assertTrue(response["Content-Disposition"].endswith('.ndjson.gz"'))
+        self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plain)
+
+    def test_only_owner_can_export(self):
+        """Test participants cannot export the room"""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.member).access_token}")
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_room_being_deleted_is_not_exported(self):
+        """Test a room whose purge has started is not found"""
+        Room.objects.filter(id=self.room.id).update(status=Room.DELETING)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_parameters(self):
+        """Test unknown output and non numeric since are rejected"""
+        self.assertEqual(self.client.get(self.url, {"output": "xml"}).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.client.get(self.url, {"since": "x"}).status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ExportChunksTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="chunk_owner", email="chunk_owner@example.com", password="TestPass123!")
+        cls.room = Room.objects.create(owner=cls.owner, name="Chunk Room")
+        Message.bulk_create_in_room(cls.room, [
+            Message(sender=cls.owner, room=cls.room, content="x" * 100) for _ in range(50)
+        ])
+
+    def test_lines_are_buffered_into_chunks(self):
+        """Test small lines are sent in chunks of about the buffer size"""
+        chunks = list(export.buffered(export.ndjson_lines(self.room), size=1024))
+        self.assertGreater(len(chunks), 3)
+        self.assertTrue(all(len(chunk) >= 1024 for chunk in chunks[:-1]))
+
+    @override_settings(EXPORT_CHUNK_SIZE=10)
+    async def test_async_iteration_matches_sync(self):
+        """Test the ASGI adapter yields the same bytes chunk by chunk"""
+        sync_chunks = await export.sync_to_async(lambda: list(export.export_chunks(self.room)))()
+        async_chunks = [chunk async for chunk in export.aiterate(export.export_chunks(self.room))]
+        self.assertEqual(async_chunks, sync_chunks)
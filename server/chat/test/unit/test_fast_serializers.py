@@ -0,0 +1,53 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db.models import Count
+from rest_framework.renderers import JSONRenderer
+from chat.fast_serializers import FastMessageSerializer, FastPublicRoomSerializer
+from chat.models import Room, Message
+from chat.serializers import MessageSerializer, PublicRoomSerializer
+from chat.views import room_messages
+
+User = get_user_model()
+
+
+class FastSerializerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username="fast_owner", email="fast_owner@example.com", password="TestPass123!")
+        cls.member = User.objects.create_user(username="fast_member", email="fast_member@example.com", password="TestPass123!")
+        cls.room = Room.objects.create(owner=cls.owner, name="Fast Room")
+        cls.room.participants.add(cls.member)
+        Room.objects.create(owner=cls.member, name="Quiet Room")
+        with cls.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=cls.owner, room=cls.room, content="Hi é \"quoted\"")
+            Message.objects.create(sender=cls.member, room=cls.room, content="https://cdn/x.png", type="image")
+
+    def render(self, data):
+        return JSONRenderer().render(data)
+
+    def test_messages_render_byte_identical(self):
+        """Test the fast message rows render exactly like MessageSerializer"""
+        queryset = room_messages(self.room, self.owner)
+        expected = self.render(MessageSerializer(queryset, many=True).data)
+        actual = self.render(FastMessageSerializer().serialize(FastMessageSerializer.values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_rooms_render_byte_identical(self):
+        """Test the fast room rows render exactly like PublicRoomSerializer, with and without a last message"""
+        queryset = Room.objects.select_related("owner").annotate(participant_count=Count("participants")).order_by("-created_at")
+        joined = {self.room.id}
+        expected = self.render(PublicRoomSerializer(queryset, many=True, context={"joined_room_ids": joined}).data)
+        actual = self.render(FastPublicRoomSerializer().serialize(FastPublicRoomSerializer.values(queryset), joined))
+        self.assertEqual(actual, expected)
+
+        expected = self.render(PublicRoomSerializer(queryset, many=True).data)
+        actual = self.render(FastPublicRoomSerializer().serialize(FastPublicRoomSerializer.values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_fields_match_model_serializers(self):
+        """Test the fast paths keep the ModelSerializers' field lists"""
+        message = FastMessageSerializer().serialize(FastMessageSerializer.values(room_messages(self.room, self.owner)))[0]
+        self.assertEqual(list(message), MessageSerializer.Meta.fields)
+        queryset = Room.objects.annotate(participant_count=Count("participants"))
+        room = FastPublicRoomSerializer().serialize(FastPublicRoomSerializer.values(queryset))[0]
+        self.assertEqual(list(room), PublicRoomSerializer.Meta.fields)
@@ -0,0 +1,214 @@
+import datetime
+import gzip
+import io
+import os
+import tempfile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from django.utils import timezone
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat import export
+from chat.importer import ArchiveError, import_rooms
+from chat.message_search import search_message_seqs
+from chat.models import Room, Message, Media
+
+User = get_user_model()
+
+
+class RoomImporterTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="import_owner", email="import_owner@example.com", password="TestPass123!")
+        self.member = User.objects.create_user(username="import_member", email="import_member@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Source Room")
+        for n, sender in enumerate([self.owner, self.member, self.member], start=1):
+            Message.objects.create(sender=sender, room=self.room, content=f"archived line {n}")
+        self.archive = b"".join(export.ndjson_lines(self.room))
+        self.archive = self.archive.replace(b'"Source Room"', b'"Imported Room"')
+
+    def test_round_trip_of_an_export(self):
+        """Test an exported room is recreated with its messages, timestamps, participants and last message"""
+        stats = import_rooms(io.BytesIO(self.archive), self.owner, chunk_size=2)
+        self.assertEqual(stats, {"rooms": 1, "messages": 3, "skipped": 0, "duplicates": 0, "out_of_order": 0})
+
+        room = Room.objects.get(name="Imported Room")
+        imported = list(room.messages.order_by("seq").values_list("seq", "sender_id", "content", "timestamp"))
+        source = list(self.room.messages.order_by("seq").values_list("seq", "sender_id", "content", "timestamp"))
+        self.assertEqual(imported, source)
+        self.assertEqual(set(room.participants.values_list("id", flat=True)), {self.owner.id, self.member.id})
+        room.refresh_from_db()
+        self.assertEqual(room.last_message_seq, 3)
+        self.assertEqual(room.last_message_preview, "archived line 3")
+        self.assertEqual(search_message_seqs(room.id, "archived"), [3, 2, 1])
+
+    def test_existing_room_is_appended_to(self):
+        """Test a room of the same name keeps its messages and gets the newer archive messages after them"""
+        other = Room.objects.create(owner=self.owner, name="Later Room")
+        Message.objects.create(sender=self.member, room=other, content="later line")
+        archive = b"".join(export.ndjson_lines(other)).replace(b'"Later Room"', b'"Source Room"')
+        stats = import_rooms(io.BytesIO(archive), self.owner)
+        self.assertEqual(stats["rooms"], 0)
+        self.assertEqual(stats["messages"], 1)
+        self.assertEqual(
+            list(self.room.messages.order_by("seq").values_list("seq", "content")),
+            [(1, "archived line 1"), (2, "archived line 2"), (3, "archived line 3"), (4, "later line")],
+        )
+
+    def test_reimport_adds_nothing(self):
+        """Test importing the same archive twice does not duplicate its messages"""
+        import_rooms(io.BytesIO(self.archive), self.owner)
+        stats = import_rooms(io.BytesIO(self.archive), self.owner)
+        self.assertEqual(stats, {"rooms": 0, "messages": 0, "skipped": 0, "duplicates": 3, "out_of_order": 0})
+        self.assertEqual(Room.objects.get(name="Imported Room").messages.count(), 3)
+
+    def test_older_messages_are_not_taken_for_duplicates(self):
+        """Test an appended message older than the room's newest is reported out of order unless it is already there"""
+        first = self.room.messages.order_by("seq").first()
+        lines = [
+            b'{"record": "room", "name": "Source Room"}',
+            ('{"record": "message", "sender_username": "import_owner", "content": "archived line 1", "timestamp": "%s"}'
+             % first.timestamp.isoformat()).encode(),
+            ('{"record": "message", "sender_username": "import_owner", "content": "forgotten line", "timestamp": "%s"}'
+             % first.timestamp.isoformat()).encode(),
+        ]
+        stats = import_rooms(lines, self.owner)
+        self.assertEqual((stats["messages"], stats["duplicates"], stats["out_of_order"]), (0, 1, 1))
+        self.assertEqual(self.room.messages.count(), 3)
+
+    def test_seq_follows_timestamp_order(self):
+        """Test a message older than the one before it in the archive is refused so seqs keep timestamp order"""
+        lines = [b'{"record": "room", "name": "Ordered Room"}'] + [
+            ('{"record": "message", "sender_username": "import_owner", "content": "%s", "timestamp": "%s"}' % (content, ts)).encode()
+            for content, ts in [("one", "2020-01-01T00:00:00Z"), ("three", "2020-01-03T00:00:00Z"),
+                                ("two", "2020-01-02T00:00:00Z"), ("three again", "2020-01-03T00:00:00Z")]
+        ]
+        stats = import_rooms(lines, self.owner)
+        self.assertEqual((stats["messages"], stats["out_of_order"]), (3, 1))
+        messages = list(Room.objects.get(name="Ordered Room").messages.order_by("seq").values_list("content", "timestamp"))
+        self.assertEqual([content for content, _ in messages], ["one", "three", "three again"])
+        self.assertEqual(messages, sorted(messages, key=lambda m: m[1]))
+
+    def test_rooms_of_other_users_are_refused(self):
+        """Test a name taken by another user's room or a room being deleted is an ArchiveError"""
+        archive = b"".join(export.ndjson_lines(self.room))
+        with self.assertRaisesMessage(ArchiveError, "belongs to another user"):
+            import_rooms(io.BytesIO(archive), self.member)
+        Room.objects.filter(id=self.room.id).update(status=Room.DELETING)
+        with self.assertRaisesMessage(ArchiveError, "is being deleted"):
+            import_rooms(io.BytesIO(archive), self.owner)
+        self.assertEqual(self.room.messages.count(), 3)
+
+    def test_naive_timestamps(self):
+        """Test timestamps without an offset are read in the current time zone, bad ones are ArchiveErrors"""
+        import_rooms(io.BytesIO(self.archive), self.owner)
+        room = Room.objects.get(name="Imported Room")
+        lines = [
+            b'{"record": "room", "name": "Imported Room"}',
+            b'{"record": "message", "sender_username": "import_owner", "content": "naive", "timestamp": "2999-01-01T00:00:00"}',
+        ]
+        stats = import_rooms(lines, self.owner)
+        self.assertEqual(stats["messages"], 1)
+        message = room.messages.get(content="naive")
+        self.assertEqual(message.timestamp, timezone.make_aware(datetime.datetime(2999, 1, 1)))
+
+        lines[1] = lines[1].replace(b"2999-01-01T00:00:00", b"2999-13-01T00:00:00")
+        with self.assertRaisesMessage(ArchiveError, "line 2: invalid timestamp"):
+            import_rooms(lines, self.owner)
+
+    def test_message_types(self):
+        """Test unknown types are ArchiveErrors and images need a media reference of the room"""
+        room_line = b'{"record": "room", "name": "Typed Room"}'
+        with self.assertRaisesMessage(ArchiveError, "line 2: unknown message type"):
+            import_rooms([room_line, b'{"record": "message", "sender_username": "import_owner", "type": "executable", "content": "x"}'], self.owner)
+
+        sha256 = "b" * 64
+        stored = Media.objects.create(sha256=sha256, size=1, content_type="image/png")
+        stored.rooms.add(Room.objects.get(name="Typed Room"))
+        stats = import_rooms([
+            room_line,
+            b'{"record": "message", "sender_username": "import_owner", "type": "image", "content": "data:image/png;base64,AAAA"}',
+            b'{"record": "message", "sender_username": "import_owner", "type": "image", "content": "media:' + sha256.encode() + b'"}',
+        ], self.owner)
+        self.assertEqual((stats["messages"], stats["skipped"]), (1, 1))
+        self.assertEqual(list(Room.objects.get(name="Typed Room").messages.values_list("content", flat=True)), [f"media:{sha256}"])
+
+    def test_invalid_room_records(self):
+        """Test room fields are validated and missing fields are ArchiveErrors"""
+        for line in [
+            b'{"record": "room"}',
+            b'{"record": "room", "name": "Bad Limit", "limit": 500}',
+            b'{"record": "room", "name": "Bad Status", "status": "deleting"}',
+            b'{"record": "room", "name": "Bad Access", "access": "secret"}',
+            b'{"record": "room", "name": "x"}',
+        ]:
+            with self.subTest(line=line), self.assertRaisesMessage(ArchiveError, "line 1"):
+                import_rooms([line], self.owner)
+        self.assertFalse(Room.objects.exclude(id=self.room.id).exists())
+
+    def test_unknown_sender_is_skipped(self):
+        """Test messages of users missing here are counted, not imported"""
+        archive = self.archive.replace(b'"import_member"', b'"nobody"')
+        stats = import_rooms(io.BytesIO(archive), self.owner)
+        self.assertEqual(stats, {"rooms": 1, "messages": 1, "skipped": 2, "duplicates": 0, "out_of_order": 0})
+
+    def test_malformed_archive(self):
+        """Test bad lines raise ArchiveError with the line number"""
+        with self.assertRaisesMessage(ArchiveError, "line 1"):
+            import_rooms([b'{"record": "message", "content": "x"}'], self.owner)
+        with self.assertRaisesMessage(ArchiveError, "line 2"):
+            import_rooms([self.archive.splitlines()[0], b"not json"], self.owner)
+
+    def test_management_command(self):
+        """Test import_rooms reads gzipped archive files"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "rooms.ndjson.gz")
+        with gzip.open(path, "wb") as archive:
+            archive.write(self.archive)
+        out = io.StringIO()
+        call_command("import_rooms", path, "--owner", "import_owner", stdout=out)
+        self.assertIn("1 rooms created, 3 messages imported, 0 skipped (unknown sender or media), 0 already imported, 0 out of order", out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command("import_rooms", path, "--owner", "nobody", stdout=out)
+
+
+class RoomImportViewTest(APITestCase):
+    def setUp(self):
+        self.admin = User.objects.create_user(username="import_admin", email="import_admin@example.com", password="TestPass123!", is_staff=True)
+        self.user = User.objects.create_user(username="import_user", email="import_user@example.com", password="TestPass123!")
+        room = Room.objects.create(owner=self.user, name="Exported")
+        Message.objects.create(sender=self.user, room=room, content="hello")
+        self.archive = b"".join(export.ndjson_lines(room)).replace(b'"Exported"', b'"Restored"')
+        self.url = reverse("room-import")
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def test_admin_only(self):
+        """Test non admin users are refused"""
+        self.authenticate(self.user)
+        response = self.client.post(self.url, self.archive, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_gzipped_import_with_owner(self):
+        """Test a gzipped body is imported into rooms owned by the given user"""
+        self.authenticate(self.admin)
+        response = self.client.post(
+            f"{self.url}?owner=import_user", gzip.compress(self.archive),
+            content_type="application/x-ndjson", HTTP_CONTENT_ENCODING="gzip",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, {"rooms": 1, "messages": 1, "skipped": 0, "duplicates": 0, "out_of_order": 0})
+        self.assertEqual(Room.objects.get(name="Restored").owner, self.user)
+
+    def test_bad_archive(self):
+        """Test malformed archives and unknown owners are 400s"""
+        self.authenticate(self.admin)
+        response = self.client.post(self.url, b"nope\n", content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(f"{self.url}?owner=nobody", self.archive, content_type="application/x-ndjson")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
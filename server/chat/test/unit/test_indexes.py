@@ -0,0 +1,90 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Max
+from rest_framework.test import APIRequestFactory, force_authenticate
+from chat.models import Room, Message, Participant
+from chat.views import OwnerRoomListCreateAPIView, PublicAllRoomListView, RoomMessageListView
+
+User = get_user_model()
+
+
+class HotQueryIndexTest(TestCase):
+    """EXPLAIN the hot querysets of chat views and services on a seeded dataset."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create([
+            User(username=f"user{i}", email=f"user{i}@example.com") for i in range(50)
+        ])
+        cls.rooms = Room.objects.bulk_create([
+            Room(
+                owner=cls.users[i % 50],
+                name=f"Room {i}",
+                status=Room.ACTIVE if i % 3 else Room.INACTIVE,
+            )
+            for i in range(2000)
+        ])
+        Room.participants.through.objects.bulk_create([
+            Room.participants.through(room_id=room.id, user_id=cls.users[(i + offset) % 50].id)
+            for i, room in enumerate(cls.rooms)
+            for offset in range(3)
+        ])
+        Message.objects.bulk_create([
+            Message(sender=cls.users[i % 50], room=cls.rooms[i % 2000], content="hello", seq=i // 2000 + 1)
+            for i in range(20000)
+        ])
+        cls.room = cls.rooms[1]
+        cls.user = cls.users[1]
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def view_queryset(self, view_class, **kwargs):
+        request = APIRequestFactory().get("/")
+        force_authenticate(request, user=self.user)
+        view = view_class()
+        view.setup(request, **kwargs)
+        view.request = view.initialize_request(request)
+        view.request.user = self.user
+        return view.get_queryset()
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain()
+        if connection.vendor == "postgresql":
+            self.assertRegex(plan, rf"Index (Only )?Scan.* on {table}\b|Bitmap Index Scan", plan)
+            self.assertNotRegex(plan, rf"Seq Scan on {table}\b", plan)
+        else:
+            self.assertRegex(plan, rf"SEARCH {table}\b.*USING", plan)
+            self.assertNotRegex(plan, rf"SCAN {table}\b", plan)
+
+    def test_room_history_uses_index(self):
+        """Test RoomMessageListView pages through the (room, -timestamp) index"""
+        queryset = self.view_queryset(RoomMessageListView, room_id=self.room.id)
+        self.assertUsesIndex(queryset[:9], "chat_message")
+        self.assertIn("chat_msg_room_ts_idx", queryset[:9].explain())
+
+    def test_public_room_list_uses_index(self):
+        """Test PublicAllRoomListView filters and orders through the (status, -created_at) index"""
+        queryset = self.view_queryset(PublicAllRoomListView)
+        self.assertUsesIndex(queryset[:9], "chat_room")
+
+    def test_owner_room_list_uses_index(self):
+        """Test OwnerRoomListCreateAPIView uses the (owner, -created_at) index"""
+        queryset = self.view_queryset(OwnerRoomListCreateAPIView)
+        self.assertUsesIndex(queryset[:9], "chat_room")
+
+    def test_membership_check_uses_index(self):
+        """Test the participant check used by services hits the (room_id, user_id) index"""
+        queryset = self.room.participants.filter(id=self.user.id)
+        self.assertUsesIndex(queryset, "chat_room_participants")
+
+    def test_joined_rooms_lookup_uses_index(self):
+        """Test joined_room_ids reads the rooms of a user from the (user, room) index"""
+        queryset = Participant.objects.filter(user_id=self.user.id).values_list("room_id", flat=True)
+        self.assertUsesIndex(queryset, "chat_room_participants")
+        self.assertIn("chat_participant_user_idx", queryset.explain())
+
+    def test_next_seq_lookup_uses_index(self):
+        """Test the seq lookup on insert uses the (room, seq) unique index"""
+        queryset = Message.objects.filter(room_id=self.room.id).values("room_id").annotate(last=Max("seq"))
+        self.assertUsesIndex(queryset, "chat_message")
@@ -0,0 +1,254 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat import media
+from chat.outbox import RoomDispatcher
+from chat.models import Room, Message, Media, MediaUpload
+
+User = get_user_model()
+
+IMAGE = bytes(range(256)) * 10
+
+
+class MediaTestCase(APITestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        overrides = override_settings(CHAT_MEDIA_ROOT=self.root, MEDIA_CHUNK_SIZE=1000, MEDIA_PREVIEW_WORKERS=0)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+
+        self.owner = User.objects.create_user(username="media_owner", email="media_owner@example.com", password="TestPass123!")
+        self.outsider = User.objects.create_user(username="media_outsider", email="media_outsider@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Media Room")
+        self.room.participants.add(self.owner)
+        self.authenticate(self.owner)
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+
+    def open_upload(self, data=IMAGE, content_type="image/png"):
+        response = self.client.post(
+            reverse("media-upload", kwargs={"room_id": self.room.id}),
+            {"size": len(data), "content_type": content_type},
+            format="json",
+        )
+        return response
+
+    def put_chunk(self, upload_id, data, first, total=len(IMAGE)):
+        return self.client.generic(
+            "PUT",
+            reverse("media-upload-chunk", kwargs={"room_id": self.room.id, "upload_id": upload_id}),
+            data,
+            content_type="application/octet-stream",
+            HTTP_CONTENT_RANGE=f"bytes {first}-{first + len(data) - 1}/{total}",
+        )
+
+    def upload(self, data=IMAGE):
+        upload_id = self.open_upload(data).data["id"]
+        for first in range(0, len(data), 1000):
+            response = self.put_chunk(upload_id, data[first:first + 1000], first, len(data))
+        return response
+
+
+class MediaUploadTest(MediaTestCase):
+    def test_chunked_upload_posts_image_message(self):
+        """Test the last chunk stores the file by digest and posts a message carrying only the reference"""
+        response = self.open_upload()
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["chunk_size"], 1000)
+
+        upload_id = response.data["id"]
+        response = self.put_chunk(upload_id, IMAGE[:1000], 0)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["received"], 1000)
+
+        # the upload file is removed once the completion commits
+        with self.captureOnCommitCallbacks(execute=True):
+            for first in (1000, 2000):
+                response = self.put_chunk(upload_id, IMAGE[first:first + 1000], first)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        sha256 = hashlib.sha256(IMAGE).hexdigest()
+        message = Message.objects.get(room=self.room)
+        self.assertEqual(message.type, "image")
+        self.assertEqual(message.content, f"media:{sha256}")
+        self.assertEqual(response.data["content"], message.content)
+        with open(media.stored_path(sha256), "rb") as file:
+            self.assertEqual(file.read(), IMAGE)
+        self.assertEqual(list(Media.objects.get(sha256=sha256).rooms.all()), [self.room])
+        self.assertFalse(MediaUpload.objects.exists())
+        self.assertFalse(os.path.exists(media.upload_path(upload_id)))
+
+    def test_image_message_is_broadcast_through_the_outbox(self):
+        """Test the committed image message reaches the room group by way of the room outbox, with its seq"""
+        layer = get_channel_layer()
+        channel = async_to_sync(layer.new_channel)()
+        async_to_sync(layer.group_add)(f"room_{self.room.id}", channel)
+        with patch.object(RoomDispatcher, "send", autospec=True, side_effect=RoomDispatcher.send) as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.upload()
+        message = Message.objects.get(room=self.room)
+        send.assert_called_once()
+        event = async_to_sync(layer.receive)(channel)
+        self.assertEqual(event["type"], "chat_message")
+        self.assertEqual(event["payload"]["message"]["seq"], message.seq)
+        self.assertEqual(event["payload"]["message"]["content"], message.content)
+
+    def test_wrong_offset_conflicts_with_received(self):
+        """Test a chunk at another offset is refused with the offset to resume from"""
+        upload_id = self.open_upload().data["id"]
+        self.put_chunk(upload_id, IMAGE[:1000], 0)
+
+        response = self.put_chunk(upload_id, IMAGE[2000:], 2000)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["received"], 1000)
+
+        response = self.put_chunk(upload_id, IMAGE[1000:2000], 1000)
+        self.assertEqual(response.data["received"], 2000)
+
+    def test_identical_files_are_stored_once(self):
+        """Test a second upload of the same bytes reuses the stored media"""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.upload()
+            self.upload()
+        self.assertEqual(Media.objects.count(), 1)
+        self.assertEqual(Message.objects.filter(room=self.room, type="image").count(), 2)
+        files = [name for _, _, names in os.walk(self.root) for name in names]
+        self.assertEqual(files, [hashlib.sha256(IMAGE).hexdigest()])
+
+    def test_invalid_uploads_are_refused(self):
+        """Test unsupported types, oversized files and oversized chunks are rejected"""
+        self.assertEqual(self.open_upload(content_type="text/html").status_code, status.HTTP_400_BAD_REQUEST)
+        with self.settings(MEDIA_MAX_SIZE=100):
+            self.assertEqual(self.open_upload().status_code, status.HTTP_400_BAD_REQUEST)
+
+        upload_id = self.open_upload().data["id"]
+        response = self.put_chunk(upload_id, IMAGE[:1500], 0)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_completion_can_be_retried_after_a_rollback(self):
+        """Test a failed completion keeps the upload file, so the last chunk can be sent again"""
+        upload_id = self.open_upload().data["id"]
+        last = len(IMAGE) // 1000 * 1000
+        for first in range(0, last, 1000):
+            self.put_chunk(upload_id, IMAGE[first:first + 1000], first)
+        with patch("chat.models.Message.save", side_effect=DatabaseError("lost connection")):
+            with self.assertRaises(DatabaseError):
+                self.put_chunk(upload_id, IMAGE[last:], last)
+        self.assertFalse(Message.objects.filter(room=self.room, type="image").exists())
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.put_chunk(upload_id, IMAGE[last:], last)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(MediaUpload.objects.filter(id=upload_id).exists())
+        with open(media.stored_path(hashlib.sha256(IMAGE).hexdigest()), "rb") as stored:
+            self.assertEqual(stored.read(), IMAGE)
+        self.assertFalse(os.path.exists(media.upload_path(upload_id)))
+
+    def test_uploads_stop_when_the_uploader_leaves(self):
+        """Test chunks are refused once the uploader left the room or the room closed"""
+        member = User.objects.create_user(username="media_member", email="media_member@example.com", password="TestPass123!")
+        self.room.participants.add(member)
+        self.authenticate(member)
+        upload_id = self.open_upload().data["id"]
+        self.put_chunk(upload_id, IMAGE[:1000], 0)
+        self.room.participants.remove(member)
+        self.assertEqual(self.put_chunk(upload_id, IMAGE[1000:2000], 1000).status_code, status.HTTP_403_FORBIDDEN)
+
+        self.room.participants.add(member)
+        Room.objects.filter(id=self.room.id).update(status=Room.INACTIVE)
+        self.assertEqual(self.put_chunk(upload_id, IMAGE[1000:2000], 1000).status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Message.objects.filter(room=self.room).exists())
+
+    def test_outsiders_cannot_upload(self):
+        """Test users outside the room can neither open nor continue uploads"""
+        upload_id = self.open_upload().data["id"]
+        self.authenticate(self.outsider)
+        self.assertEqual(self.open_upload().status_code, status.HTTP_403_FORBIDDEN)
+        self.assertEqual(self.put_chunk(upload_id, IMAGE[:1000], 0).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MediaViewTest(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.upload()
+        self.sha256 = hashlib.sha256(IMAGE).hexdigest()
+        self.url = reverse("media", kwargs={"sha256": self.sha256})
+        self.access_token = str(RefreshToken.for_user(self.owner).access_token)
+
+    def test_whole_file(self):
+        """Test participants get the file with an immutable ETag"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(b"".join(response.streaming_content), IMAGE)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertEqual(response["ETag"], f'"{self.sha256}"')
+        self.assertIn("immutable", response["Cache-Control"])
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=f'"{self.sha256}"')
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_range(self):
+        """Test a single byte range is answered with 206 and an unsatisfiable one with 416"""
+        response = self.client.get(self.url, HTTP_RANGE="bytes=100-199")
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertEqual(b"".join(response.streaming_content), IMAGE[100:200])
+        self.assertEqual(response["Content-Range"], f"bytes 100-199/{len(IMAGE)}")
+
+        response = self.client.get(self.url, HTTP_RANGE=f"bytes={len(IMAGE)}-")
+        self.assertEqual(response.status_code, status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+
+    async def test_asgi_streams_blocks(self):
+        """Test ASGI requests are streamed from an async iterator instead of being read whole"""
+        headers = {"Authorization": f"Bearer {self.access_token}"}
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b"".join([block async for block in response.streaming_content]), IMAGE)
+
+        response = await self.async_client.get(self.url, headers={**headers, "Range": "bytes=100-199"})
+        self.assertEqual(response.status_code, status.HTTP_206_PARTIAL_CONTENT)
+        self.assertTrue(response.is_async)
+        self.assertEqual(b"".join([block async for block in response.streaming_content]), IMAGE[100:200])
+
+    def test_sendfile_header(self):
+        """Test the front server is handed the file path when a sendfile header is configured"""
+        with self.settings(MEDIA_SENDFILE_HEADER="X-Accel-Redirect"):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(
+            response["X-Accel-Redirect"],
+            f"/protected-media/{self.sha256[:2]}/{self.sha256[2:4]}/{self.sha256}",
+        )
+
+    def test_outsiders_get_not_found(self):
+        """Test users outside every room of the file are told it does not exist"""
+        self.authenticate(self.outsider)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ParseRangeTest(TestCase):
+    def test_ranges(self):
+        """Test range parsing, suffix ranges, clamping and unsatisfiable ranges"""
+        self.assertIsNone(media.parse_range(None, 100))
+        self.assertIsNone(media.parse_range("bytes=0-1,5-6", 100))
+        self.assertEqual(media.parse_range("bytes=10-19", 100), (10, 19))
+        self.assertEqual(media.parse_range("bytes=90-", 100), (90, 99))
+        self.assertEqual(media.parse_range("bytes=-10", 100), (90, 99))
+        self.assertEqual(media.parse_range("bytes=50-500", 100), (50, 99))
+        for header in ("bytes=100-", "bytes=20-10", "bytes=-0"):
+            with self.assertRaises(ValueError):
+                media.parse_range(header, 100)
@@ -0,0 +1,104 @@
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat.models import Room, Message, MessageTerm
+from chat.message_search import tokenize, search_message_seqs
+
+User = get_user_model()
+
+
+class TokenizeTest(SimpleTestCase):
+    def test_tokenize_lowercases_and_dedupes(self):
+        """Test words are lowercased, distinct and in order"""
+        self.assertEqual(tokenize("Hello, hello WORLD! world_2"), ["hello", "world", "world_2"])
+
+    def test_tokenize_truncates_long_words(self):
+        """Test words longer than a term are cut to the column size"""
+        self.assertEqual(tokenize("a" * 100), ["a" * 64])
+
+
+class MessageIndexingTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="writer", email="writer@example.com", password="TestPass123!")
+        cls.room = Room.objects.create(owner=cls.user, name="Index Room")
+
+    def test_terms_written_with_message(self):
+        """Test a text message's words are indexed in its INSERT transaction"""
+        message = Message.objects.create(sender=self.user, room=self.room, content="Deploy the build")
+        terms = set(MessageTerm.objects.filter(message=message).values_list("term", flat=True))
+        self.assertEqual(terms, {"deploy", "the", "build"})
+        self.assertTrue(all(term.seq == message.seq for term in MessageTerm.objects.filter(message=message)))
+
+    def test_image_messages_are_not_indexed(self):
+        """Test image urls are not indexed"""
+        message = Message.objects.create(sender=self.user, room=self.room, content="https://cdn/x.png", type="image")
+        self.assertFalse(MessageTerm.objects.filter(message=message).exists())
+
+    def test_editing_content_reindexes(self):
+        """Test changing the content replaces the message's terms"""
+        message = Message.objects.create(sender=self.user, room=self.room, content="old words")
+        message.content = "new words"
+        message.save()
+        terms = set(MessageTerm.objects.filter(message=message).values_list("term", flat=True))
+        self.assertEqual(terms, {"new", "words"})
+
+    def test_bulk_created_messages_are_indexed(self):
+        """Test batches written by bulk_create_in_room are searchable"""
+        Message.bulk_create_in_room(self.room, [
+            Message(sender=self.user, room=self.room, content="batch alpha"),
+            Message(sender=self.user, room=self.room, content="batch beta"),
+        ])
+        self.assertEqual(search_message_seqs(self.room.id, "batch"), [2, 1])
+
+    def test_search_requires_every_word(self):
+        """Test hits contain all the query words, newest first, within the room"""
+        other_room = Room.objects.create(owner=self.user, name="Other Index Room")
+        Message.objects.create(sender=self.user, room=self.room, content="release notes")
+        Message.objects.create(sender=self.user, room=self.room, content="release party")
+        Message.objects.create(sender=self.user, room=self.room, content="Party at the release!")
+        Message.objects.create(sender=self.user, room=other_room, content="release party")
+        self.assertEqual(search_message_seqs(self.room.id, "party release"), [3, 2])
+        self.assertEqual(search_message_seqs(self.room.id, "release", before=3), [2, 1])
+        self.assertEqual(search_message_seqs(self.room.id, "   "), [])
+
+
+@override_settings(MESSAGE_SEARCH_PAGE_SIZE=2)
+class RoomMessageSearchViewTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="room_owner", email="owner@example.com", password="TestPass123!")
+        self.outsider = User.objects.create_user(username="outsider", email="outsider@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Search Room")
+        for content in ["one", "deploy now", "two", "three", "deploy again", "four", "deploy later"]:
+            Message.objects.create(sender=self.owner, room=self.room, content=content)
+        self.url = reverse("room-message-search", kwargs={"room_id": self.room.id})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.owner).access_token}")
+
+    def test_hits_with_context_and_keyset_next(self):
+        """Test hits come newest first with their context and a keyset next link"""
+        response = self.client.get(self.url, {"q": "deploy", "context": 1})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual([hit["message"]["seq"] for hit in results], [7, 5])
+        self.assertEqual([m["content"] for m in results[1]["before"]], ["three"])
+        self.assertEqual([m["content"] for m in results[1]["after"]], ["four"])
+        self.assertEqual(results[0]["after"], [])
+        self.assertIn("before=5", response.data["next"])
+
+        response = self.client.get(response.data["next"])
+        self.assertEqual([hit["message"]["seq"] for hit in response.data["results"]], [2])
+        self.assertIsNone(response.data["next"])
+
+    def test_missing_query_rejected(self):
+        """Test q is required"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_non_participant_denied(self):
+        """Test only the owner and participants can search"""
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.outsider).access_token}")
+        response = self.client.get(self.url, {"q": "deploy"})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
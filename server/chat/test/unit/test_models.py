@@ -1,7 +1,13 @@
-from django.test import TestCase
+import io
+from django.core.management import call_command
+from django.test import TestCase, override_settings
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError
+from django.db import IntegrityError, connection
+from django.test.utils import CaptureQueriesContext
+from unittest.mock import patch
 from chat.models import Room, Message
+from chat import last_message as last_messages
+from peer_port.fields import MARKER
 
 User = get_user_model()
 
@@ -58,6 +64,23 @@ class RoomModelTest(TestCase):
         """Test that owner is automatically added as participant"""
         self.assertTrue(self.base_room.participants.filter(id=self.user1.id).exists())
 
+    def test_create_room_adds_owner_in_same_transaction(self):
+        """Test creating a room costs the room INSERT and one membership INSERT"""
+        with CaptureQueriesContext(connection) as queries:
+            room = Room.objects.create(owner=self.user2, name="Counted Room")
+        statements = [query["sql"] for query in queries.captured_queries if not query["sql"].startswith(("SAVEPOINT", "RELEASE"))]
+        self.assertEqual(len(statements), 2)
+        self.assertTrue(room.participants.filter(id=self.user2.id).exists())
+
+    def test_routine_save_costs_one_query(self):
+        """Test saving an existing room is a single UPDATE"""
+        room = Room.objects.get(id=self.base_room.id)
+        room.status = Room.INACTIVE
+        with self.assertNumQueries(1):
+            room.save()
+        with self.assertNumQueries(1):
+            room.save(update_fields=["status"])
+
     def test_room_ordering(self):
         """Test that rooms are ordered by created_at descending"""
         room2 = Room.objects.create(owner=self.user1, name="Second Room")
@@ -98,9 +121,57 @@ class MessageModelTest(TestCase):
 
     def test_message_updates_room_last_message(self):
         """Test that saving a message updates room's last_message"""
-        message = Message.objects.create(sender=self.user1, room=self.room, content="Latest message")
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(sender=self.user1, room=self.room, content="Latest message")
         self.room.refresh_from_db()
         self.assertEqual(self.room.last_message, message)
+        self.assertEqual(self.room.last_message_preview, "Latest message")
+        self.assertEqual(self.room.last_message_seq, message.seq)
+
+    def test_message_insert_does_not_write_room(self):
+        """Test the INSERT transaction never updates the room row"""
+        message = Message(sender=self.user1, room=self.room, content="Quiet")
+        with self.captureOnCommitCallbacks() as callbacks:
+            with CaptureQueriesContext(connection) as queries:
+                message.save()
+        self.assertFalse(any(query["sql"].startswith('UPDATE "chat_room" ') for query in queries.captured_queries))
+        self.assertEqual(len(callbacks), 1)
+
+    def test_stale_snapshot_never_overwrites_newer(self):
+        """Test an older message flushed late does not roll the snapshot back"""
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Message.objects.create(sender=self.user1, room=self.room, content="Newer")
+        older = Message.objects.get(pk=self.message.pk)
+        last_messages.tracker.note(self.room.id, last_messages.snapshot_of(older))
+        last_messages.flush()
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_id, newer.id)
+
+    def test_full_room_save_keeps_snapshot(self):
+        """Test saving a room loaded before a flush does not write its older snapshot back"""
+        stale = Room.objects.get(pk=self.room.pk)
+        with self.captureOnCommitCallbacks(execute=True):
+            newer = Message.objects.create(sender=self.user1, room=self.room, content="Newer")
+        stale.name = "Renamed Room"
+        stale.save()
+        self.room.refresh_from_db()
+        self.assertEqual((self.room.name, self.room.last_message_id), ("Renamed Room", newer.id))
+
+    @override_settings(LAST_MESSAGE_FLUSH_INTERVAL=60)
+    def test_messages_within_the_interval_flush_once(self):
+        """Test a burst of messages is written to the room with a single UPDATE"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                Message.objects.create(sender=self.user1, room=self.room, content=f"Burst {n}")
+        timer = last_messages.tracker._timer
+        self.assertIsNotNone(timer)
+        timer.cancel()
+        with CaptureQueriesContext(connection) as queries:
+            last_messages.flush()
+        updates = [q for q in queries.captured_queries if q["sql"].startswith("UPDATE") and "chat_room" in q["sql"]]
+        self.assertEqual(len(updates), 1)
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.last_message_preview, "Burst 4")
 
     def test_message_ordering(self):
         """Test that messages are ordered by timestamp descending"""
@@ -109,6 +180,79 @@ class MessageModelTest(TestCase):
         self.assertEqual(messages.first(), msg2)
         self.assertEqual(messages.last(), self.message)
 
+    def test_message_seq_is_assigned_per_room(self):
+        """Test messages get a gap free sequence number per room"""
+        other_room = Room.objects.create(owner=self.user1, name="Other Room")
+        second = Message.objects.create(sender=self.user1, room=self.room, content="Second message")
+        first_in_other = Message.objects.create(sender=self.user1, room=other_room, content="Other")
+        self.assertEqual(self.message.seq, 1)
+        self.assertEqual(second.seq, 2)
+        self.assertEqual(first_in_other.seq, 1)
+
+    def test_message_seq_taken_concurrently_is_retried(self):
+        """Test a seq already taken by a racing writer is retried with the next one"""
+        taken = Message(sender=self.user1, room=self.room, content="Racer", seq=2)
+        taken.save()
+        message = Message(sender=self.user1, room=self.room, content="Late")
+        with patch("chat.models.Message.objects.filter") as mock_filter:
+            # first attempt still sees the old maximum, as a racing writer would
+            mock_filter.return_value.aggregate.side_effect = [{"last": 1}, {"last": 2}]
+            message.save()
+        self.assertEqual(message.seq, 3)
+
     def test_message_default_type(self):
         """Test default message type is text"""
         self.assertEqual(self.message.type, "text")
+
+
+class CompressedContentTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="paste_user", email="paste@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.user, name="Paste Room")
+        self.paste = "Traceback (most recent call last):\n  File \"app.py\", line 1\n" * 200
+
+    def stored(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT content FROM chat_message WHERE id = %s", [message.id])
+            return cursor.fetchone()[0]
+
+    def test_long_content_is_stored_compressed(self):
+        """Test long content is compressed in the table and read back transparently"""
+        message = Message.objects.create(sender=self.user, room=self.room, content=self.paste)
+        short = Message.objects.create(sender=self.user, room=self.room, content="hi")
+        self.assertTrue(self.stored(message).startswith(MARKER))
+        self.assertLess(len(self.stored(message)), len(self.paste) / 5)
+        self.assertEqual(self.stored(short), "hi")
+        self.assertEqual(Message.objects.get(id=message.id).content, self.paste)
+        self.assertEqual(Message.objects.filter(id=message.id).values_list("content", flat=True)[0], self.paste)
+
+    def test_backfill_command(self):
+        """Test compress_messages compresses rows stored raw"""
+        message = Message.objects.create(sender=self.user, room=self.room, content="x")
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE chat_message SET content = %s WHERE id = %s", [self.paste, message.id])
+        out = io.StringIO()
+        call_command("compress_messages", stdout=out)
+        self.assertIn("1 messages rewritten", out.getvalue())
+        self.assertTrue(self.stored(message).startswith(MARKER))
+        self.assertEqual(Message.objects.get(id=message.id).content, self.paste)
+
+    def test_backfill_escapes_raw_values_with_the_marker(self):
+        """Test compress_messages escapes legacy rows starting with the marker and leaves encoded rows alone"""
+        escaped = Message.objects.create(sender=self.user, room=self.room, content=MARKER + "already escaped")
+        compressed = Message.objects.create(sender=self.user, room=self.room, content=self.paste)
+        legacy = {}
+        for raw in [MARKER + "raw text", MARKER + "zz not compressed", MARKER + "r" + self.paste]:
+            message = Message.objects.create(sender=self.user, room=self.room, content="x")
+            with connection.cursor() as cursor:
+                cursor.execute("UPDATE chat_message SET content = %s WHERE id = %s", [raw, message.id])
+            legacy[message.id] = raw
+        encoded = {message.id: self.stored(message) for message in (escaped, compressed)}
+
+        out = io.StringIO()
+        call_command("compress_messages", stdout=out)
+        self.assertIn("3 messages rewritten", out.getvalue())
+        for message_id, raw in legacy.items():
+            self.assertEqual(Message.objects.get(id=message_id).content, raw)
+        for message in (escaped, compressed):
+            self.assertEqual(self.stored(message), encoded[message.id])
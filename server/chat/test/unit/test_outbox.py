@@ -0,0 +1,80 @@
+import asyncio
+import contextlib
+from django.test import SimpleTestCase
+from chat.outbox import RoomDispatcher
+
+
+class RecordingLayer:
+    def __init__(self):
+        self.sent = []
+
+    async def group_send(self, group, event):
+        self.sent.append((group, event["seq"]))
+
+
+class RoomDispatcherTest(SimpleTestCase):
+    def run_dispatcher(self, publishes, gap_timeout=0.2, wait=0.05, writing=()):
+        """Push ``publishes`` with a write of this process in flight for each group of ``writing``."""
+        layer = RecordingLayer()
+
+        async def run():
+            dispatcher = RoomDispatcher(layer, asyncio.get_running_loop(), gap_timeout=gap_timeout)
+            with contextlib.ExitStack() as writes:
+                for group in writing:
+                    writes.enter_context(dispatcher.writing(group))
+                for group, seq in publishes:
+                    dispatcher._push(group, seq, {"seq": seq})
+                    await asyncio.sleep(0)
+                await asyncio.sleep(wait)
+            await asyncio.sleep(0.01)
+            self.rooms_left = dict(dispatcher._rooms)
+
+        asyncio.run(run())
+        return layer.sent
+
+    def test_in_order_messages_are_sent_in_order(self):
+        """Test contiguous seqs go straight out"""
+        sent = self.run_dispatcher([("room_1", 1), ("room_1", 2), ("room_1", 3)])
+        self.assertEqual(sent, [("room_1", 1), ("room_1", 2), ("room_1", 3)])
+
+    def test_out_of_order_commit_is_reordered(self):
+        """Test a later seq waits for the missing earlier one"""
+        sent = self.run_dispatcher([("room_1", 1), ("room_1", 3), ("room_1", 2)], writing=["room_1"])
+        self.assertEqual(sent, [("room_1", 1), ("room_1", 2), ("room_1", 3)])
+
+    def test_gap_is_skipped_after_timeout(self):
+        """Test a gap that never fills does not stall the room"""
+        sent = self.run_dispatcher([("room_1", 1), ("room_1", 3)], gap_timeout=0.05, wait=0.2, writing=["room_1"])
+        self.assertEqual(sent, [("room_1", 1), ("room_1", 3)])
+
+    def test_gap_without_local_writes_is_skipped_at_once(self):
+        """Test a gap no write of this process can fill (another worker's message) costs no wait"""
+        sent = self.run_dispatcher([("room_1", 1), ("room_1", 3)], gap_timeout=10, wait=0.02)
+        self.assertEqual(sent, [("room_1", 1), ("room_1", 3)])
+
+    def test_first_message_of_a_new_outbox_is_not_held(self):
+        """Test an outbox without a next seq sends its first message at once, a lower seq follows late"""
+        sent = self.run_dispatcher([("room_1", 6), ("room_1", 5)], gap_timeout=10, wait=0.02, writing=["room_1"])
+        self.assertEqual(sent, [("room_1", 6), ("room_1", 5)])
+
+    def test_rooms_are_independent(self):
+        """Test a gap in one room does not hold back another room"""
+        sent = self.run_dispatcher([("room_1", 1), ("room_1", 3), ("room_2", 1)], wait=0.05, writing=["room_1"])
+        self.assertEqual(sent[:2], [("room_1", 1), ("room_2", 1)])
+
+    def test_idle_rooms_are_dropped(self):
+        """Test a room's outbox goes away once nothing is pending or in flight"""
+        self.run_dispatcher([("room_1", 1), ("room_2", 1), ("room_1", 3)], writing=["room_1"], gap_timeout=0.01)
+        self.assertEqual(self.rooms_left, {})
+
+    def test_publish_from_another_thread(self):
+        """Test publish is safe to call from the database thread"""
+        layer = RecordingLayer()
+
+        async def run():
+            dispatcher = RoomDispatcher(layer, asyncio.get_running_loop())
+            await asyncio.to_thread(dispatcher.publish, "room_1", 1, {"seq": 1})
+            await asyncio.sleep(0.05)
+
+        asyncio.run(run())
+        self.assertEqual(layer.sent, [("room_1", 1)])
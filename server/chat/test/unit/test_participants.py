@@ -0,0 +1,168 @@
+from channels.db import database_sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat.consumers.chat_consumer import ChatConsumer
+from chat.membership import joined_room_ids
+from chat.models import Room, Message, Participant
+from chat.services import permission_to_join_room, remove_participant, mark_read
+
+User = get_user_model()
+
+
+class ParticipantTest(TestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="member_owner", email="member_owner@example.com", password="TestPass123!")
+        self.user = User.objects.create_user(username="member_user", email="member_user@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Members Room")
+        # the room's last message snapshot is written after commit
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                Message.objects.create(sender=self.owner, room=self.room, content=f"before {n}")
+        self.room.refresh_from_db()
+
+    def test_owner_membership(self):
+        """Test the owner joins their room as owner when it is created"""
+        membership = Participant.objects.get(room=self.room, user=self.owner)
+        self.assertEqual(membership.role, Participant.OWNER)
+        self.assertEqual(membership.joined_at, self.room.created_at)
+
+    def test_join_starts_read_at_last_message(self):
+        """Test history from before the join does not count as unread"""
+        permission_to_join_room.func(self.user, self.room.id)
+        membership = Participant.objects.get(room=self.room, user=self.user)
+        self.assertEqual(membership.role, Participant.MEMBER)
+        self.assertEqual(membership.last_read_seq, 3)
+        self.assertEqual(membership.unread_count(), 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.owner, room=self.room, content="after")
+        membership = Participant.objects.select_related("room").get(room=self.room, user=self.user)
+        self.assertEqual(membership.unread_count(), 1)
+
+    def test_mark_read_moves_forward_only(self):
+        """Test the read marker never moves back nor past the last message"""
+        self.room.participants.add(self.user)
+        self.assertTrue(mark_read.func(self.user, self.room.id, 2))
+        self.assertFalse(mark_read.func(self.user, self.room.id, 1))
+        self.assertFalse(mark_read.func(self.user, self.room.id, 9))
+        self.assertEqual(Participant.objects.get(room=self.room, user=self.user).last_read_seq, 2)
+
+    def test_own_messages_are_read(self):
+        """Test writing a message moves the sender's read marker to it"""
+        self.assertEqual(Participant.objects.get(room=self.room, user=self.owner).last_read_seq, 3)
+        permission_to_join_room.func(self.user, self.room.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.user, room=self.room, content="mine")
+        membership = Participant.objects.select_related("room").get(room=self.room, user=self.user)
+        self.assertEqual(membership.last_read_seq, 4)
+        self.assertEqual(membership.unread_count(), 0)
+
+    def test_mark_read_before_the_snapshot_is_flushed(self):
+        """Test a message the room snapshot does not show yet can be marked read"""
+        self.room.participants.add(self.user)
+        with self.captureOnCommitCallbacks():  # not flushed
+            Message.objects.create(sender=self.owner, room=self.room, content="unflushed")
+        self.assertTrue(mark_read.func(self.user, self.room.id, 4))
+        self.assertFalse(mark_read.func(self.user, self.room.id, 5))
+
+    def test_membership_changes_invalidate_cache(self):
+        """Test adding and removing participants outside the services updates the cached room ids"""
+        self.assertNotIn(self.room.id, joined_room_ids(self.user.id))
+        self.room.participants.add(self.user)
+        self.assertIn(self.room.id, joined_room_ids(self.user.id))
+        self.user.participating_rooms.remove(self.room)
+        self.assertNotIn(self.room.id, joined_room_ids(self.user.id))
+
+    def test_owner_membership_cannot_be_removed(self):
+        """Test the owner cannot remove their own membership"""
+        self.assertFalse(remove_participant.func(self.owner, self.room.id, self.owner.id))
+        self.assertTrue(Participant.objects.filter(room=self.room, user=self.owner).exists())
+
+
+class RoomMembershipViewTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="membership_owner", email="membership_owner@example.com", password="TestPass123!")
+        self.user = User.objects.create_user(username="membership_user", email="membership_user@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Membership Room")
+        self.room.participants.add(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(5):
+                Message.objects.create(sender=self.owner, room=self.room, content=f"message {n}")
+        self.url = reverse("room-membership", kwargs={"room_id": self.room.id})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_get_membership(self):
+        """Test the user's membership with its unread count"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["role"], Participant.MEMBER)
+        self.assertIsNone(response.data["last_read_seq"])
+        self.assertEqual(response.data["unread_count"], 5)
+
+    def test_patch_read_marker_and_mute(self):
+        """Test the read marker moves forward only and the room can be muted"""
+        response = self.client.patch(self.url, {"last_read_seq": 4, "muted": True}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["unread_count"], 1)
+        self.assertTrue(response.data["muted"])
+
+        response = self.client.patch(self.url, {"last_read_seq": 2}, format="json")
+        self.assertEqual(response.data["last_read_seq"], 4)
+
+        response = self.client.patch(self.url, {"last_read_seq": 6}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_patch_read_marker_before_the_snapshot_is_flushed(self):
+        """Test the read marker is checked against the room's messages, not its lagging snapshot"""
+        with self.captureOnCommitCallbacks():  # not flushed
+            Message.objects.create(sender=self.owner, room=self.room, content="unflushed")
+        response = self.client.patch(self.url, {"last_read_seq": 6}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["last_read_seq"], 6)
+
+    def test_role_is_read_only(self):
+        """Test members cannot change their role"""
+        self.client.patch(self.url, {"role": Participant.OWNER}, format="json")
+        self.assertEqual(Participant.objects.get(room=self.room, user=self.user).role, Participant.MEMBER)
+
+    def test_non_participant(self):
+        """Test users outside the room have no membership"""
+        outsider = User.objects.create_user(username="membership_outsider", email="membership_outsider@example.com", password="TestPass123!")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(outsider).access_token}")
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ReadMarkerEventTest(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="marker_owner", email="marker_owner@example.com", password="TestPass123!")
+        self.member = User.objects.create_user(username="marker_member", email="marker_member@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Marker Room")
+        self.room.participants.add(self.member)
+        for n in range(3):
+            Message.objects.create(sender=self.member, room=self.room, content=f"message {n}")
+
+    def tearDown(self):
+        for conn in connections.all():
+            conn.close()
+        super().tearDown()
+
+    async def test_read_event_moves_marker(self):
+        """Test a read event on the socket moves the user's read marker"""
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/room/{self.room.id}/")
+        communicator.scope["user"] = self.owner
+        communicator.scope["url_route"] = {"kwargs": {"room_id": str(self.room.id)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # joined
+
+        await communicator.send_json_to({"type": "read", "payload": {"seq": 2}})
+        await communicator.receive_nothing()
+        membership = await database_sync_to_async(Participant.objects.get)(room=self.room, user=self.owner)
+        self.assertEqual(membership.last_read_seq, 2)
+        await communicator.disconnect()
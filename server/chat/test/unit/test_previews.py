@@ -0,0 +1,188 @@
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+from asgiref.sync import sync_to_async
+from channels.testing import WebsocketCommunicator
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework import status
+from chat import media, previews
+from chat.consumers.chat_consumer import ChatConsumer
+from chat.models import Room, Message
+from chat.test.unit.test_media import MediaTestCase
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+User = get_user_model()
+
+
+def png(width, height, color=(200, 30, 30)):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), color).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+@override_settings(MEDIA_PREVIEW_SIZES=(32, 128), MEDIA_PREVIEW_WORKERS=0)
+class PreviewTest(MediaTestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = png(400, 200)
+        self.sha256 = hashlib.sha256(self.image).hexdigest()
+
+    def test_upload_renders_and_announces_previews(self):
+        """Test previews of every size are rendered after the upload commits and announced to the room"""
+        with mock.patch("chat.previews.announce") as announce, self.captureOnCommitCallbacks(execute=True):
+            self.upload(self.image)
+        message = Message.objects.get(room=self.room, type="image")
+        announce.assert_called_once_with(self.room.id, message.id, self.sha256)
+        for size in (32, 128):
+            with Image.open(previews.preview_path(self.sha256, size)) as preview:
+                self.assertEqual(preview.format, "WEBP")
+                self.assertEqual(preview.size, (size, size // 2))
+
+    def test_preview_view(self):
+        """Test previews are served like media, unknown sizes are not found"""
+        self.upload(self.image)
+        previews.render_previews(self.sha256)
+
+        response = self.client.get(reverse("media-preview", kwargs={"sha256": self.sha256, "size": 128}))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertEqual(response["ETag"], f'"{self.sha256}-128"')
+        with Image.open(io.BytesIO(b"".join(response.streaming_content))) as preview:
+            self.assertEqual(preview.size, (128, 64))
+
+        response = self.client.get(reverse("media-preview", kwargs={"sha256": self.sha256, "size": 100}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+        self.authenticate(self.outsider)
+        response = self.client.get(reverse("media-preview", kwargs={"sha256": self.sha256, "size": 128}))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_missing_preview_is_scheduled(self):
+        """Test a preview requested before it exists is scheduled and answered with Retry-After"""
+        self.upload(self.image)
+        url = reverse("media-preview", kwargs={"sha256": self.sha256, "size": 32})
+        with mock.patch("chat.previews.schedule") as schedule:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response["Retry-After"], "1")
+        schedule.assert_called_once_with(self.sha256)
+
+        # rendered in the request when there are no preview processes
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_rendered_once_per_image(self):
+        """Test previews already on disk are not rendered again"""
+        self.upload(self.image)
+        previews.render_previews(self.sha256)
+        with mock.patch("chat.previews.render") as render:
+            previews.render_previews(self.sha256)
+            previews.schedule(self.sha256)
+        render.assert_not_called()
+
+    def test_pixel_limit(self):
+        """Test an image just above the pixel limit is refused before decoding, one at the limit is rendered"""
+        self.upload(self.image)
+        source, target = media.stored_path(self.sha256), previews.preview_path(self.sha256, 32)
+        with self.assertRaises(Image.DecompressionBombError):
+            previews.render(source, {32: target}, 400 * 200 - 1)
+        self.assertFalse(os.path.exists(target))
+        self.assertEqual(previews.render(source, {32: target}, 400 * 200), [32])
+        self.assertTrue(os.path.exists(target))
+
+    def test_undecodable_image(self):
+        """Test images Pillow cannot read get no previews and no event"""
+        with mock.patch("chat.previews.announce") as announce, self.captureOnCommitCallbacks(execute=True):
+            self.upload(b"\x89PNG not really" * 10)
+        announce.assert_not_called()
+        self.assertFalse(os.path.exists(os.path.join(self.root, "previews")))
+
+
+@unittest.skipIf(Image is None, "Pillow is not installed")
+class PreviewPoolTest(TransactionTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        overrides = override_settings(
+            CHAT_MEDIA_ROOT=self.root, MEDIA_PREVIEW_SIZES=(32,), MEDIA_PREVIEW_WORKERS=1, MEDIA_PREVIEW_MAX_PENDING=1,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.addCleanup(previews.shutdown)
+
+    def stored(self, data):
+        sha256 = hashlib.sha256(data).hexdigest()
+        os.makedirs(os.path.dirname(media.stored_path(sha256)))
+        with open(media.stored_path(sha256), "wb") as file:
+            file.write(data)
+        return sha256
+
+    def test_rendered_in_pool_with_bounded_queue(self):
+        """Test previews render in the process pool and work beyond the pending limit is declined"""
+        first, second = self.stored(png(64, 64)), self.stored(png(64, 64, color=(0, 0, 0)))
+        announced = threading.Event()
+        with mock.patch("chat.previews.announce", side_effect=lambda *args: announced.set()) as announce:
+            future = previews.schedule(first, room_id=7, message_id=9)
+            self.assertIsNone(previews.schedule(second))
+            self.assertEqual(future.result(timeout=60), [32])
+            # the done callback runs in the pool's thread, right after the result is set
+            self.assertTrue(announced.wait(10))
+        announce.assert_called_once_with(7, 9, first)
+        self.assertTrue(os.path.exists(previews.preview_path(first, 32)))
+        self.assertFalse(os.path.exists(previews.preview_path(second, 32)))
+
+    def test_queued_render_is_not_submitted_again(self):
+        """Test an image already queued for the same sizes joins the pending render, announced per message"""
+        sha256 = self.stored(png(64, 64))
+        announced = threading.Semaphore(0)
+        with mock.patch("chat.previews.announce", side_effect=lambda *args: announced.release()) as announce:
+            pool = previews.get_pool()
+            with mock.patch.object(pool, "submit", wraps=pool.submit) as submit:
+                first = previews.schedule(sha256, room_id=7, message_id=9)
+                second = previews.schedule(sha256, room_id=7, message_id=10)
+            self.assertIs(first, second)
+            submit.assert_called_once()
+            self.assertEqual(first.result(timeout=60), [32])
+            self.assertTrue(announced.acquire(timeout=10) and announced.acquire(timeout=10))
+        self.assertEqual(sorted(call.args for call in announce.call_args_list), [(7, 9, sha256), (7, 10, sha256)])
+        self.assertEqual(previews._in_flight, {})
+
+
+class PreviewEventTest(TransactionTestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username="preview_owner", email="preview_owner@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.owner, name="Preview Room")
+
+    def tearDown(self):
+        for conn in connections.all():
+            conn.close()
+        super().tearDown()
+
+    async def test_preview_ready_event(self):
+        """Test sockets of the room get a preview_ready event"""
+        communicator = WebsocketCommunicator(ChatConsumer.as_asgi(), f"/ws/room/{self.room.id}/")
+        communicator.scope["user"] = self.owner
+        communicator.scope["url_route"] = {"kwargs": {"room_id": str(self.room.id)}}
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        await communicator.receive_json_from()  # joined
+
+        await sync_to_async(previews.announce)(self.room.id, 5, "ab" * 32)
+        response = await communicator.receive_json_from()
+        self.assertEqual(response["type"], "preview_ready")
+        self.assertEqual(response["room_id"], self.room.id)
+        self.assertEqual(response["payload"]["message_id"], 5)
+        self.assertEqual(response["payload"]["sha256"], "ab" * 32)
+        await communicator.disconnect()
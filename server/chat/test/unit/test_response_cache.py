@@ -0,0 +1,94 @@
+from unittest.mock import patch
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat.membership import joined_room_ids
+from chat.models import Room, Message
+from chat.response_cache import ResponseCache, rooms_version, room_version, bump
+from peer_port import metrics
+
+User = get_user_model()
+
+
+class ResponseCacheTest(SimpleTestCase):
+    def setUp(self):
+        metrics.registry.clear()
+        self.cache = ResponseCache(max_entries=2, timeout=60, name="test.cache")
+
+    def test_least_recently_used_entry_is_evicted(self):
+        """Test the entry read least recently goes first"""
+        self.cache.set("a", 1)
+        self.cache.set("b", 2)
+        self.cache.get("a")
+        self.cache.set("c", 3)
+        self.assertEqual(self.cache.get("a"), 1)
+        self.assertIsNone(self.cache.get("b"))
+        self.assertEqual(metrics.registry.snapshot()["test.cache.evictions"], 1)
+
+    def test_hit_rate_metrics(self):
+        """Test hits, misses and the hit rate gauge are recorded"""
+        self.cache.set("a", 1)
+        self.cache.get("a")
+        self.cache.get("missing")
+        snapshot = metrics.registry.snapshot()
+        self.assertEqual(snapshot["test.cache.hits"], 1)
+        self.assertEqual(snapshot["test.cache.misses"], 1)
+        self.assertEqual(snapshot["test.cache.hit_rate"], 0.5)
+
+    def test_entries_expire(self):
+        """Test entries are not served past their timeout"""
+        self.cache.set("a", 1)
+        with patch("chat.response_cache.time.monotonic", return_value=10 ** 9):
+            self.assertIsNone(self.cache.get("a"))
+
+
+class VersionTest(TestCase):
+    def test_bump_moves_global_and_room_versions(self):
+        """Test a room change retires the listing and that room's detail only"""
+        listing, room, other = rooms_version(), room_version(1), room_version(2)
+        bump(1)
+        self.assertGreater(rooms_version(), listing)
+        self.assertGreater(room_version(1), room)
+        self.assertEqual(room_version(2), other)
+
+    def test_last_message_flush_leaves_listing_version(self):
+        """Test a new message retires its room's detail but not every listing"""
+        owner = User.objects.create_user(username="version_owner", email="version_owner@example.com", password="TestPass123!")
+        room = Room.objects.create(owner=owner, name="Version Room")
+        listing, detail = rooms_version(), room_version(room.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=owner, room=room, content="hello")
+        self.assertEqual(rooms_version(), listing)
+        self.assertGreater(room_version(room.id), detail)
+
+
+@override_settings(
+    CACHE_SINGLE_PROCESS=False,
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "per-process"}},
+)
+class PerProcessCacheTest(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="locmem_user", email="locmem_user@example.com", password="TestPass123!")
+        self.room = Room.objects.create(owner=self.user, name="LocMem Room")
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+
+    def test_response_cache_is_off(self):
+        """Test nothing is cached when version counters would be per process"""
+        cache = ResponseCache(name="test.locmem")
+        cache.set("a", 1)
+        self.assertIsNone(cache.get("a"))
+
+    def test_membership_is_read_every_time(self):
+        """Test joined room ids come from the database, not a per process cache"""
+        joined_room_ids(self.user.id)
+        with self.assertNumQueries(1):
+            self.assertEqual(joined_room_ids(self.user.id), {self.room.id})
+
+    def test_no_etags(self):
+        """Test responses carry no ETag stamped from per process counters"""
+        for url in [reverse("all-room"), reverse("single-room", args=[self.room.id])]:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn("ETag", response)
@@ -0,0 +1,165 @@
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from rest_framework.test import APITestCase
+from rest_framework import status
+from rest_framework_simplejwt.tokens import RefreshToken
+from chat.models import Room
+from chat.search import DatabaseRoomSearch, MemoryRoomSearch, PostgresRoomSearch, RoomNameIndex, get_room_search_backend, room_name_index
+
+User = get_user_model()
+
+
+class RoomNameIndexTest(SimpleTestCase):
+    def setUp(self):
+        self.index = RoomNameIndex()
+        self.index.load([
+            (1, "Python Lovers"),
+            (2, "Django Python"),
+            (3, "python"),
+            (4, "Rust Club"),
+            (5, "Pythonistas"),
+        ])
+
+    def test_prefix_matches_ranked_first(self):
+        """Test prefix matches come first, sorted by name, then inner matches"""
+        self.assertEqual(self.index.search("python"), [3, 1, 5, 2])
+
+    def test_search_is_case_insensitive(self):
+        """Test search ignores case"""
+        self.assertEqual(self.index.search("RUST"), [4])
+
+    def test_short_terms_match_substrings(self):
+        """Test terms shorter than a trigram still match inside names"""
+        self.assertEqual(self.index.search("ru"), [4])
+        self.assertEqual(self.index.search("lu"), [4])
+        self.assertEqual(self.index.search("j"), [2])
+
+    def test_limit(self):
+        """Test results are capped"""
+        self.assertEqual(self.index.search("python", limit=2), [3, 1])
+
+    def test_add_remove_and_rename(self):
+        """Test the index follows adds, renames and removals"""
+        self.index.add(6, "Go Gophers")
+        self.assertEqual(self.index.search("gopher"), [6])
+
+        self.index.add(4, "Rustaceans")
+        self.assertEqual(self.index.search("club"), [])
+        self.assertEqual(self.index.search("rustac"), [4])
+
+        self.index.remove(1)
+        self.assertEqual(self.index.search("lovers"), [])
+        self.assertEqual(self.index.search("python"), [3, 5, 2])
+
+    def test_empty_term(self):
+        """Test a blank term matches nothing"""
+        self.assertEqual(self.index.search("   "), [])
+
+
+@override_settings(ROOM_SEARCH_BACKEND="memory")
+class RoomSearchViewTest(APITestCase):
+    def setUp(self):
+        room_name_index.loaded = False
+        self.user = User.objects.create_user(
+            username='test_user',
+            email='user@example.com',
+            password='TestPass123!'
+        )
+        Room.objects.create(owner=self.user, name='Chess Club')
+        Room.objects.create(owner=self.user, name='Club Penguin')
+        Room.objects.create(owner=self.user, name='Book Club', status=Room.INACTIVE)
+        self.url = reverse('all-room')
+        refresh = RefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {refresh.access_token}')
+
+    def tearDown(self):
+        room_name_index.loaded = False
+
+    def test_ranked_search(self):
+        """Test prefix matches are listed before inner matches, inactive rooms excluded"""
+        response = self.client.get(self.url, {'search': 'club'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([room['name'] for room in response.data['results']], ['Club Penguin', 'Chess Club'])
+
+    def test_index_follows_model_changes(self):
+        """Test signals keep the loaded index in sync with rooms"""
+        self.client.get(self.url, {'search': 'club'})
+        room = Room.objects.create(owner=self.user, name='Clubhouse')
+        Room.objects.filter(name='Chess Club').get().delete()
+
+        response = self.client.get(self.url, {'search': 'club'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Club Penguin', 'Clubhouse'])
+
+        room.name = 'Treehouse'
+        room.save()
+        response = self.client.get(self.url, {'search': 'house'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Treehouse'])
+
+    def test_rooms_left_active_are_filtered_before_the_cap(self):
+        """Test rooms whose status changed behind the index never take places in the capped results"""
+        self.client.get(self.url, {'search': 'club'})
+        for n in range(3):
+            Room.objects.create(owner=self.user, name=f'Club Extra {n}')
+        Room.objects.filter(name__startswith='Club').update(status=Room.DELETING)
+
+        queryset = Room.objects.filter(status=Room.ACTIVE)
+        results = MemoryRoomSearch().search(queryset, 'club', 1)
+        self.assertEqual([room.name for room in results], ['Chess Club'])
+
+    def test_status_changes_are_indexed(self):
+        """Test rooms saved inactive leave the index and come back when active again"""
+        self.client.get(self.url, {'search': 'club'})
+        room = Room.objects.get(name='Chess Club')
+        room.status = Room.INACTIVE
+        room.save(update_fields=['status'])
+        self.assertNotIn(room.id, room_name_index.search('club'))
+        room.status = Room.ACTIVE
+        room.save(update_fields=['status'])
+        self.assertIn(room.id, room_name_index.search('club'))
+
+    @override_settings(ROOM_SEARCH_INDEX_MAX_AGE=0)
+    def test_index_is_rebuilt_when_old(self):
+        """Test rooms created without signals are found once the index is rebuilt"""
+        self.client.get(self.url, {'search': 'club'})
+        Room.objects.bulk_create([Room(owner=self.user, name='Club Bulk')])
+        response = self.client.get(self.url, {'search': 'bulk'})
+        self.assertEqual([r['name'] for r in response.data['results']], ['Club Bulk'])
+
+
+class RoomSearchBackendTest(SimpleTestCase):
+    @override_settings(ROOM_SEARCH_BACKEND="auto")
+    def test_auto_never_picks_the_memory_index(self):
+        """Test auto uses the database outside PostgreSQL, the memory index is opt-in"""
+        if connection.vendor == "postgresql":
+            self.skipTest("auto picks pg_trgm on PostgreSQL")
+        self.assertIsInstance(get_room_search_backend(), DatabaseRoomSearch)
+
+
+class PostgresRoomSearchTest(TestCase):
+    def setUp(self):
+        if connection.vendor != "postgresql":
+            self.skipTest("pg_trgm needs PostgreSQL")
+        self.user = User.objects.create_user(username="trgm_user", email="trgm_user@example.com", password="TestPass123!")
+        for name in ["Python Lovers", "Django Python", "python", "Rust Club", "Closed Python"]:
+            Room.objects.create(owner=self.user, name=name)
+        Room.objects.filter(name="Closed Python").update(status=Room.INACTIVE)
+        self.queryset = Room.objects.filter(status=Room.ACTIVE).annotate(participant_count=Count("memberships"))
+
+    def test_ranking(self):
+        """Test prefix matches first, then by similarity, and short terms match prefixes"""
+        names = [room.name for room in PostgresRoomSearch().search(self.queryset, "python", 10)]
+        self.assertEqual(names[:2], ["python", "Python Lovers"])
+        self.assertEqual(set(names), {"python", "Python Lovers", "Django Python"})
+        self.assertEqual([room.name for room in PostgresRoomSearch().search(self.queryset, "ru", 10)], ["Rust Club"])
+
+    def test_matches_are_ranked_without_the_listing_joins(self):
+        """Test the ranking query reads chat_room alone, the participant count runs for the page only"""
+        with CaptureQueriesContext(connection) as queries:
+            list(PostgresRoomSearch().search(self.queryset, "python", 10))
+        ranking = queries.captured_queries[0]["sql"]
+        self.assertIn("SIMILARITY", ranking.upper())
+        self.assertNotIn("chat_room_participants", ranking)
@@ -228,7 +228,7 @@ class MiniMessageSerializerTest(TestCase):
         )
         
         serializer = MiniMessageSerializer(message)
-        expected_fields = ['id', 'room', 'sender', 'sender_username', 'type', 'content', 'timestamp']
+        expected_fields = ['id', 'room', 'sender', 'sender_username', 'type', 'content', 'timestamp', 'seq']
         
         self.assertEqual(set(serializer.data.keys()), set(expected_fields))
 
@@ -1,10 +1,11 @@
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 import asyncio
-from chat.models import Room, Message
+from django.core.exceptions import PermissionDenied
+from chat.models import Room, Message, Media
 from chat.services import (
     permission_to_join_room, participant_leave_room, 
-    remove_participant, save_message
+    remove_participant, save_message, save_message_batch
 )
 
 User = get_user_model()
@@ -112,6 +113,18 @@ class ServicesTest(TestCase):
         self.assertFalse(self.public_room.participants.filter(id=self.user1.id).exists())
         
 
+    def test_join_and_leave_query_counts(self):
+        """Test join and leave do not run any hidden room queries"""
+        # membership check, savepoint, locked room, member count, newest seq, insert, release
+        with self.assertNumQueries(7):
+            permission_to_join_room.func(self.user1, self.public_room.id)
+        with self.assertNumQueries(1):  # membership check
+            permission_to_join_room.func(self.user1, self.public_room.id)
+        with self.assertNumQueries(2):  # membership row, delete
+            participant_leave_room.func(self.user1, self.public_room.id)
+        with self.assertNumQueries(1):  # the owner's row is excluded by role
+            participant_leave_room.func(self.owner, self.public_room.id)
+
     def test_owner_cannot_leave_room(self):
         """Test room owner cannot leave room"""
         success = participant_leave_room.func(self.owner, self.public_room.id)
@@ -174,10 +187,33 @@ class ServicesTest(TestCase):
             save_message.func(self.owner, self.inactive_room.id, 'Test message', 'text')
         
 
+    def test_image_messages_need_a_media_reference_of_the_room(self):
+        """Test socket image messages are refused unless they reference media posted in the room"""
+        self.public_room.participants.add(self.user1)
+        sha256 = "a" * 64
+        stored = Media.objects.create(sha256=sha256, size=10, content_type="image/png")
+        for content in ["data:image/png;base64,iVBORw0KGgo=", f"media:{sha256}", "media:not-a-digest"]:
+            with self.subTest(content=content), self.assertRaises(PermissionDenied):
+                save_message.func(self.user1, self.public_room.id, content, 'image')
+        with self.assertRaises(PermissionDenied):
+            save_message.func(self.user1, self.public_room.id, 'hello', 'video')
+
+        stored.rooms.add(self.public_room)
+        message_data = save_message.func(self.user1, self.public_room.id, f"media:{sha256}", 'image')
+        self.assertEqual(message_data['type'], 'image')
+
+        results = save_message_batch.func(self.public_room.id, [
+            (self.user1, "inline bytes", 'image', None),
+            (self.user1, "text", 'text', None),
+        ])
+        self.assertIsInstance(results[0], PermissionDenied)
+        self.assertEqual(results[1]['content'], 'text')
+
     def test_save_message_updates_last_message(self):
         """Test saving message updates room's last_message"""
         self.public_room.participants.add(self.user1)
-        save_message.func(self.user1, self.public_room.id, 'Latest message', 'text')
+        with self.captureOnCommitCallbacks(execute=True):
+            save_message.func(self.user1, self.public_room.id, 'Latest message', 'text')
         
         # Verify room's last_message was updated
         self.public_room.refresh_from_db()
@@ -0,0 +1,29 @@
+from django.test import SimpleTestCase
+from peer_port import metrics
+from chat.tracing import MessageTrace, RECEIVED, SAVE_START, SAVE_END, ENQUEUED, DELIVERED
+
+
+class MessageTraceTest(SimpleTestCase):
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_elapsed_ms(self):
+        """Test elapsed time between two marked stages"""
+        trace = MessageTrace({RECEIVED: 10.0, SAVE_START: 10.25})
+        self.assertEqual(trace.elapsed_ms(RECEIVED, SAVE_START), 250)
+        self.assertIsNone(trace.elapsed_ms(RECEIVED, DELIVERED))
+
+    def test_sender_stages_recorded(self):
+        """Test sender stages are recorded into histograms"""
+        trace = MessageTrace({RECEIVED: 1.0, SAVE_START: 1.001, SAVE_END: 1.011, ENQUEUED: 1.012})
+        trace.observe_sender_stages()
+        self.assertEqual(metrics.histogram("chat.message.save_ms").count, 1)
+        self.assertEqual(metrics.histogram("chat.message.save_wait_ms").count, 1)
+        self.assertEqual(metrics.histogram("chat.message.layer_ms").count, 0)
+
+    def test_recipient_stages_recorded(self):
+        """Test delivery stages are recorded per recipient"""
+        trace = MessageTrace({RECEIVED: 1.0, ENQUEUED: 1.01})
+        trace.mark(DELIVERED)
+        trace.observe_recipient_stages()
+        self.assertEqual(metrics.histogram("chat.message.total_ms").count, 1)
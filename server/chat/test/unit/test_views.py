@@ -1,11 +1,18 @@
+import time
+from django.conf import settings
 from django.test import TestCase
 from django.urls import reverse
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth import get_user_model
 from rest_framework.test import APITestCase
 from rest_framework import status
 from rest_framework_simplejwt.tokens import RefreshToken
 from unittest.mock import patch
+from chat import expiry
 from chat.models import Room, Message
+from chat.response_cache import room_responses
+from chat.services import permission_to_join_room, participant_leave_room
 
 User = get_user_model()
 
@@ -162,11 +169,27 @@ class OwnerSingleRoomAPIViewTest(APITestCase):
     def test_delete_own_room(self):
         """Test owner can delete their room"""
         self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
-        response = self.client.delete(self.url)
+        # run the background purge inline
+        with patch("chat.expiry.start_purge", expiry.purge_rooms), self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url)
         
         self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
         self.assertFalse(Room.objects.filter(id=self.room.id).exists())
 
+    def test_deleted_room_is_hidden_before_purge(self):
+        """Test a deleted room disappears at once and is left for the purge"""
+        Message.objects.create(sender=self.participant, room=self.room, content='hello')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.owner_token}')
+        with patch("chat.expiry.start_purge") as start_purge, self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        start_purge.assert_called_once_with([self.room.id])
+        self.room.refresh_from_db()
+        self.assertEqual(self.room.status, Room.DELETING)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.client.get(reverse('all-room')).data['results'], [])
+
     def test_non_owner_access_denied(self):
         """Test non-owner cannot access room details"""
         refresh = RefreshToken.for_user(self.participant)
@@ -236,6 +259,84 @@ class PublicAllRoomListViewTest(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertIn('is_participant', response.data['results'][0])
 
+    def test_is_participant_from_cached_membership_set(self):
+        """Test is_participant comes from one cached membership lookup, not a subquery per row"""
+        other = User.objects.create_user(username='other_owner', email='other_owner@example.com', password='TestPass123!')
+        joined = Room.objects.create(owner=other, name='Joined Room')
+        Room.objects.create(owner=other, name='Not Joined Room')
+        permission_to_join_room.func(self.user, joined.id)
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        flags = {room['name']: room['is_participant'] for room in response.data['results']}
+        self.assertEqual(flags, {'Active Room': True, 'Joined Room': True, 'Not Joined Room': False})
+        self.assertFalse(any('EXISTS' in query['sql'] for query in queries.captured_queries))
+
+        # cached: the next page view reads neither the membership nor the rooms again
+        with self.assertNumQueries(1):  # authenticated user
+            self.client.get(self.url)
+
+        participant_leave_room.func(self.user, joined.id)
+        response = self.client.get(self.url)
+        flags = {room['name']: room['is_participant'] for room in response.data['results']}
+        self.assertFalse(flags['Joined Room'])
+
+    def test_cached_listing_is_retired_by_changes(self):
+        """Test the cached page is served until a room or membership change, last messages within a cache window"""
+        other = User.objects.create_user(username='joiner', email='joiner@example.com', password='TestPass123!')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.client.get(self.url)
+        hits = room_responses.hits
+
+        response = self.client.get(self.url)
+        self.assertEqual(room_responses.hits, hits + 1)
+        self.assertEqual(response.data['results'][0]['participant_count'], 1)
+
+        permission_to_join_room.func(other, self.active_room.id)
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['participant_count'], 2)
+
+        # a new message leaves the cached page alone until the next cache window
+        with self.captureOnCommitCallbacks(execute=True):
+            Message.objects.create(sender=self.user, room=self.active_room, content='Fresh')
+        response = self.client.get(self.url)
+        self.assertIsNone(response.data['results'][0]['last_message'])
+        later = time.time() + settings.ROOM_RESPONSE_CACHE_TIMEOUT
+        with patch('chat.response_cache.time.time', return_value=later):
+            response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['last_message']['content'], 'Fresh')
+
+        self.active_room.name = 'Renamed Room'
+        self.active_room.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.data['results'][0]['name'], 'Renamed Room')
+
+    def test_cached_listing_overlays_is_participant_per_user(self):
+        """Test a page cached for one user carries the other user's own flag"""
+        other = User.objects.create_user(username='viewer', email='viewer@example.com', password='TestPass123!')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        self.assertTrue(self.client.get(self.url).data['results'][0]['is_participant'])
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(other).access_token}')
+        self.assertFalse(self.client.get(self.url).data['results'][0]['is_participant'])
+
+    def test_last_message_read_from_snapshot(self):
+        """Test the listing renders last_message without querying messages"""
+        with self.captureOnCommitCallbacks(execute=True):
+            message = Message.objects.create(sender=self.user, room=self.active_room, content='Snapshot')
+
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.access_token}')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        last_message = response.data['results'][0]['last_message']
+        self.assertEqual(last_message['id'], message.id)
+        self.assertEqual(last_message['content'], 'Snapshot')
+        self.assertEqual(last_message['sender_username'], 'test_user')
+        self.assertFalse(any('chat_message' in query['sql'] for query in queries.captured_queries))
+
 
 class PublicRoomDetailViewTest(APITestCase):
     def setUp(self):
@@ -390,3 +491,64 @@ class RoomMessageListViewTest(APITestCase):
         
         participant_message = next(msg for msg in messages if msg['sender'] == self.participant.id)
         self.assertEqual(participant_message['sender_username'], 'participant')
+
+
+class ConditionalGetTest(APITestCase):
+    def setUp(self):
+        self.owner = User.objects.create_user(username='etag_owner', email='etag_owner@example.com', password='TestPass123!')
+        self.outsider = User.objects.create_user(username='etag_outsider', email='etag_outsider@example.com', password='TestPass123!')
+        self.room = Room.objects.create(owner=self.owner, name='ETag Room')
+        Message.objects.create(sender=self.owner, room=self.room, content='Hello')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.owner).access_token}')
+
+    def assertNotModifiedUntilChange(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        etag = response['ETag']
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertFalse(response.content)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_room_list_not_modified(self):
+        """Test the room listing answers 304 until a room changes"""
+        def rename():
+            self.room.name = 'Renamed ETag Room'
+            self.room.save()
+        self.assertNotModifiedUntilChange(reverse('all-room'), rename)
+
+    def test_room_list_304_runs_no_room_query(self):
+        """Test a matching If-None-Match skips the room queries"""
+        etag = self.client.get(reverse('all-room'))['ETag']
+        with self.assertNumQueries(1):  # authenticated user
+            response = self.client.get(reverse('all-room'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_room_detail_not_modified(self):
+        """Test the room detail answers 304 until the room changes"""
+        other = User.objects.create_user(username='etag_joiner', email='etag_joiner@example.com', password='TestPass123!')
+        self.assertNotModifiedUntilChange(
+            reverse('single-room', kwargs={'pk': self.room.id}),
+            lambda: permission_to_join_room.func(other, self.room.id),
+        )
+
+    def test_messages_not_modified(self):
+        """Test the message history answers 304 until a message is added"""
+        self.assertNotModifiedUntilChange(
+            reverse('room-messages', kwargs={'room_id': self.room.id}),
+            lambda: Message.objects.create(sender=self.owner, room=self.room, content='Again'),
+        )
+
+    def test_outsider_gets_no_304(self):
+        """Test access is checked before the ETag, a valid ETag does not help outsiders"""
+        url = reverse('room-messages', kwargs={'room_id': self.room.id})
+        etag = self.client.get(url)['ETag']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(self.outsider).access_token}')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
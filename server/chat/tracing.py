@@ -0,0 +1,55 @@
+"""
+Server side latency tracing for chat messages.
+
+A trace is a dict of ``stage -> unix timestamp`` that travels with the
+message through the channel layer (so wall clock time, not perf_counter,
+since the sender and the recipients may live in different processes).
+Stage gaps are recorded into the ``chat.message.*`` histograms.
+"""
+import time
+from peer_port import metrics
+
+
+RECEIVED = "received"
+SAVE_START = "save_start"
+SAVE_END = "save_end"
+ENQUEUED = "enqueued"
+DELIVERED = "delivered"
+
+# histogram name -> (from stage, to stage)
+SENDER_STAGES = {
+    "chat.message.save_wait_ms": (RECEIVED, SAVE_START),  # thread pool wait
+    "chat.message.save_ms": (SAVE_START, SAVE_END),
+    "chat.message.enqueue_ms": (SAVE_END, ENQUEUED),  # commit and outbox hand-off
+}
+RECIPIENT_STAGES = {
+    "chat.message.layer_ms": (ENQUEUED, DELIVERED),
+    "chat.message.total_ms": (RECEIVED, DELIVERED),
+}
+
+
+class MessageTrace:
+    def __init__(self, marks=None):
+        self.marks = dict(marks or {})
+
+    def mark(self, stage):
+        self.marks[stage] = time.time()
+
+    def elapsed_ms(self, start, end):
+        if start not in self.marks or end not in self.marks:
+            return None
+        return (self.marks[end] - self.marks[start]) * 1000
+
+    def _observe(self, stages):
+        for name, (start, end) in stages.items():
+            elapsed = self.elapsed_ms(start, end)
+            if elapsed is not None:
+                metrics.histogram(name).observe(max(elapsed, 0.0))
+
+    def observe_sender_stages(self):
+        """Record the stages up to group_send, once per message."""
+        self._observe(SENDER_STAGES)
+
+    def observe_recipient_stages(self):
+        """Record layer and end to end latency, once per recipient."""
+        self._observe(RECIPIENT_STAGES)
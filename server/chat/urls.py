@@ -1,5 +1,5 @@
 from django.urls import path
-from .views import OwnerRoomListCreateAPIView, OwnerSingleRoomAPIView, PublicAllRoomListView, PublicRoomDetailView, RoomMessageListView
+from .views import OwnerRoomListCreateAPIView, OwnerSingleRoomAPIView, PublicAllRoomListView, PublicRoomDetailView, RoomMessageListView, RoomMessageSearchView, RoomExportView, RoomImportView, MediaUploadView, MediaUploadChunkView, MediaView, MediaPreviewView, RoomMembershipView
 
 urlpatterns = [
     path('rooms/', OwnerRoomListCreateAPIView.as_view(), name='create-room'),
@@ -7,4 +7,12 @@ urlpatterns = [
     path('all-rooms/', PublicAllRoomListView.as_view(), name='all-room'),
     path('rooms/<int:pk>/', PublicRoomDetailView.as_view(), name='single-room'),
     path("rooms/<int:room_id>/messages/", RoomMessageListView.as_view(), name="room-messages"),
+    path("rooms/<int:room_id>/messages/search/", RoomMessageSearchView.as_view(), name="room-message-search"),
+    path("rooms/<int:room_id>/export/", RoomExportView.as_view(), name="room-export"),
+    path("rooms/<int:room_id>/membership/", RoomMembershipView.as_view(), name="room-membership"),
+    path("rooms/import/", RoomImportView.as_view(), name="room-import"),
+    path("rooms/<int:room_id>/media/", MediaUploadView.as_view(), name="media-upload"),
+    path("rooms/<int:room_id>/media/<uuid:upload_id>/", MediaUploadChunkView.as_view(), name="media-upload-chunk"),
+    path("media/<str:sha256>/", MediaView.as_view(), name="media"),
+    path("media/<str:sha256>/preview/<int:size>/", MediaPreviewView.as_view(), name="media-preview"),
 ]
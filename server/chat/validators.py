@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from .models import Room
 
@@ -30,3 +31,15 @@ def validate_limit(value):
     if value < 1 or value > 50:
         raise ValidationError("Limit must be between 1 and 50.")
     return value
+
+
+def validate_lifetime(value):
+    if value is not None and (value < 60 or value > settings.ROOM_MAX_LIFETIME):
+        raise ValidationError(f"Lifetime must be between 60 and {settings.ROOM_MAX_LIFETIME} seconds.")
+    return value
+
+
+def validate_retention_days(value):
+    if value is not None and (value < 1 or value > settings.MESSAGE_MAX_RETENTION_DAYS):
+        raise ValidationError(f"Retention must be between 1 and {settings.MESSAGE_MAX_RETENTION_DAYS} days.")
+    return value
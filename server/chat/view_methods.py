@@ -6,7 +6,15 @@ from .spectacular_schemas import (
     doc_owner_single_room_delete_schema,
     doc_public_all_room_list_schema,
     doc_public_room_detail_schema,
-    doc_room_message_list_schema
+    doc_room_message_list_schema,
+    doc_room_message_search_schema,
+    doc_room_export_schema,
+    doc_room_import_schema,
+    doc_media_upload_schema,
+    doc_media_upload_chunk_schema,
+    doc_media_schema,
+    doc_media_preview_schema,
+    doc_room_membership_schema
 )
 
 
@@ -53,4 +61,55 @@ class PublicRoomDetailMethodsMixin:
 class RoomMessageMethodsMixin:
     @doc_room_message_list_schema()
     def get(self, request, *args, **kwargs):
-        return super().get(request, *args, **kwargs)
\ No newline at end of file
+        return super().get(request, *args, **kwargs)
+
+class RoomMessageSearchMethodsMixin:
+    @doc_room_message_search_schema()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class RoomExportMethodsMixin:
+    @doc_room_export_schema()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class RoomImportMethodsMixin:
+    @doc_room_import_schema()
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+
+class MediaUploadMethodsMixin:
+    @doc_media_upload_schema()
+    def post(self, request, *args, **kwargs):
+        return super().post(request, *args, **kwargs)
+
+
+class MediaUploadChunkMethodsMixin:
+    @doc_media_upload_chunk_schema()
+    def put(self, request, *args, **kwargs):
+        return super().put(request, *args, **kwargs)
+
+
+class MediaMethodsMixin:
+    @doc_media_schema()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class MediaPreviewMethodsMixin:
+    @doc_media_preview_schema()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+
+class RoomMembershipMethodsMixin:
+    @doc_room_membership_schema()
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+
+    @doc_room_membership_schema()
+    def patch(self, request, *args, **kwargs):
+        return super().patch(request, *args, **kwargs)
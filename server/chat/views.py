@@ -1,21 +1,49 @@
+import gzip
+import io
 import logging
-from django.db.models import Count, Case, When, Value, CharField, F, Exists, OuterRef
+import os
+import re
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.handlers.asgi import ASGIRequest
+from django.http import HttpResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.db import transaction
+from django.db.models import Count, Case, When, Value, CharField, F, Max
 from rest_framework import status
 from rest_framework.response import Response
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.views import APIView
-from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView, RetrieveUpdateDestroyAPIView
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveAPIView, RetrieveUpdateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.exceptions import NotFound, PermissionDenied, ValidationError
+from rest_framework.utils.urls import replace_query_param
 from rest_framework_simplejwt.tokens import RefreshToken
-from .models import Room, Message
-from .serializers import RoomOwnerSerializer, RoomOwnerDetailSerializer, PublicRoomSerializer, MessageSerializer
-from peer_port.pagination import CommonPagination
+from .models import Room, Message, Media, MediaUpload, Participant
+from . import export, expiry, media, previews
+from .archive import ReadThroughMessages
+from .importer import ArchiveError, import_rooms
+from .fast_serializers import FastMessageSerializer, FastPublicRoomSerializer
+from .membership import joined_room_ids
+from .response_cache import room_responses, listing_version, room_version, overlay_is_participant
+from .search import search_rooms
+from .message_search import search_message_seqs, context_windows
+from .serializers import RoomOwnerSerializer, RoomOwnerDetailSerializer, PublicRoomSerializer, MessageSerializer, MiniMessageSerializer, ParticipantSerializer
+from peer_port.conditional import ConditionalGetMixin
+from peer_port.pagination import CommonPagination, CountFreePagination, CachedCountPagination
 from .view_methods import (
     OwnerRoomMethodsMixin,
     OwnerSingleRoomMethodsMixin,
     PublicAllRoomMethodsMixin,
     PublicRoomDetailMethodsMixin,
-    RoomMessageMethodsMixin
+    RoomMessageMethodsMixin,
+    RoomMessageSearchMethodsMixin,
+    RoomExportMethodsMixin,
+    RoomImportMethodsMixin,
+    MediaUploadMethodsMixin,
+    MediaUploadChunkMethodsMixin,
+    MediaMethodsMixin,
+    MediaPreviewMethodsMixin,
+    RoomMembershipMethodsMixin
 )
 
 
@@ -29,8 +57,9 @@ class OwnerRoomListCreateAPIView(OwnerRoomMethodsMixin, ListCreateAPIView):
 
     def get_queryset(self):
         return (
-            Room.objects.filter(owner=self.request.user)
-            .annotate(participant_count=Count("participants"))
+            Room.objects.filter(owner=self.request.user).exclude(status=Room.DELETING)
+            .annotate(participant_count=Count("memberships"))
+            .order_by("-created_at")
         )
 
     def perform_create(self, serializer):
@@ -44,77 +73,415 @@ class OwnerSingleRoomAPIView(OwnerSingleRoomMethodsMixin, RetrieveUpdateDestroyA
 
     def get_queryset(self):
         return (
-            Room.objects.filter(owner=self.request.user)
+            Room.objects.filter(owner=self.request.user).exclude(status=Room.DELETING)
             .prefetch_related('participants')
         )
 
+    def perform_destroy(self, instance):
+        # hidden now, messages purged in the background
+        expiry.delete_room(instance)
 
-class PublicAllRoomListView(PublicAllRoomMethodsMixin, ListAPIView):
+
+class PublicAllRoomListView(PublicAllRoomMethodsMixin, ConditionalGetMixin, ListAPIView):
     serializer_class = PublicRoomSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = CommonPagination
+    pagination_class = CachedCountPagination
+
+    def get_etag_stamp(self, request, *args, **kwargs):
+        # room and membership changes bump the rooms version, last messages show within a cache window
+        return f"rooms:{listing_version()}:{request.user.id}:{request.get_full_path()}"
 
     def get_queryset(self):
-        user = self.request.user
         search_term = self.request.query_params.get('search', None)
         queryset = Room.objects.filter(status=Room.ACTIVE).select_related("owner").annotate(
-            participant_count=Count("participants"),
-            is_participant=Exists(
-                Room.participants.through.objects.filter(
-                    room_id=OuterRef("pk"), user_id=user.id
-                )
-            )
+            participant_count=Count("memberships")
         )
         if search_term:
-            queryset = queryset.filter(
-                name__icontains=search_term
-            )
+            # ranked best match first, see chat.search
+            return search_rooms(queryset, search_term)
 
         return queryset.order_by("-created_at")
 
+    def list(self, request, *args, **kwargs):
+        # the version is read before the query, a change made meanwhile retires this entry
+        params = request.query_params
+        key = (
+            "rooms", listing_version(), request.build_absolute_uri(request.path),
+            params.get("page"), params.get("page_size"), params.get("search", "").strip(),
+        )
+        data = room_responses.get(key)
+        if data is None:
+            queryset = FastPublicRoomSerializer.values(self.filter_queryset(self.get_queryset()))
+            page = self.paginate_queryset(queryset)
+            data = dict(self.get_paginated_response(FastPublicRoomSerializer().serialize(page)).data)
+            room_responses.set(key, data)
+
+        joined = joined_room_ids(request.user.id)
+        return Response({**data, "results": [overlay_is_participant(room, joined) for room in data["results"]]})
 
-class PublicRoomDetailView(PublicRoomDetailMethodsMixin, RetrieveAPIView):
+
+class PublicRoomDetailView(PublicRoomDetailMethodsMixin, ConditionalGetMixin, RetrieveAPIView):
     serializer_class = PublicRoomSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_etag_stamp(self, request, *args, **kwargs):
+        return f"room:{room_version(kwargs['pk'])}:{request.user.id}:{request.get_full_path()}"
+
     def get_queryset(self):
         return Room.objects.filter(status=Room.ACTIVE).select_related("owner").annotate(
-            participant_count=Count("participants")
+            participant_count=Count("memberships")
         )
 
+    def retrieve(self, request, *args, **kwargs):
+        room_id = self.kwargs["pk"]
+        key = ("room", room_id, room_version(room_id), request.build_absolute_uri(request.path))
+        data = room_responses.get(key)
+        if data is None:
+            data = dict(super().retrieve(request, *args, **kwargs).data)
+            room_responses.set(key, data)
+        return Response(overlay_is_participant(data, joined_room_ids(request.user.id)))
 
-class RoomMessageListView(RoomMessageMethodsMixin, ListAPIView):
-    serializer_class = MessageSerializer
-    permission_classes = [IsAuthenticated]
-    pagination_class = CommonPagination
 
-    def get_queryset(self):
-        room_id = self.kwargs["room_id"]
-        user = self.request.user
+def get_readable_room(room_id, user):
+    """The room, when the user owns it or takes part in it and it is not being deleted."""
+    try:
+        room = Room.objects.exclude(status=Room.DELETING).get(id=room_id)
+    except Room.DoesNotExist:
+        raise PermissionDenied("Room does not exist.")
 
-        try:
-            room = Room.objects.get(id=room_id)
-        except Room.DoesNotExist:
-            raise PermissionDenied("Room does not exist.")
+    if room.owner_id != user.id and not Participant.objects.filter(room_id=room.id, user_id=user.id).exists():
+        raise PermissionDenied("You are not a participant of this room.")
+    return room
 
-        if room.owner != user and not room.participants.filter(id=user.id).exists():
-            raise PermissionDenied("You are not a participant of this room.")
 
-        return (
-            room.messages
-            .select_related("sender")
-            .annotate(
-                sender_username=F("sender__username"),
-                msg_type=Case(
-                    When(sender=user, then=Value("sent")),
-                    default=Value("received"),
-                    output_field=CharField(),
-                )
+def request_body(request):
+    """
+    The raw request body as a file object, for views that stream it (room
+    imports, media chunks) instead of having a parser load it whole. An
+    empty body reads as empty.
+    """
+    return request.stream or io.BytesIO()
+
+
+def is_asgi(request):
+    """Whether the request came through the ASGI handler, which needs async iterators to stream."""
+    return isinstance(request._request, ASGIRequest)
+
+
+def room_messages(room, user):
+    return (
+        room.messages
+        .select_related("sender")
+        .annotate(
+            sender_username=F("sender__username"),
+            msg_type=Case(
+                When(sender=user, then=Value("sent")),
+                default=Value("received"),
+                output_field=CharField(),
             )
         )
-    
+    )
+
+
+class RoomMessageListView(RoomMessageMethodsMixin, ConditionalGetMixin, ListAPIView):
+    serializer_class = MessageSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = CountFreePagination
+
+    def get_etag_stamp(self, request, *args, **kwargs):
+        # access is checked first, a 304 must not tell outsiders anything
+        self.room = get_readable_room(kwargs["room_id"], request.user)
+        last_seq = Message.objects.filter(room_id=self.room.id).aggregate(last=Max("seq"))["last"]
+        return f"messages:{self.room.id}:{last_seq}:{room_version(self.room.id)}:{request.user.id}:{request.get_full_path()}"
+
+    def get_queryset(self):
+        if getattr(self, "room", None) is None:
+            self.room = get_readable_room(self.kwargs["room_id"], self.request.user)
+        return room_messages(self.room, self.request.user)
+
     def list(self, request, *args, **kwargs):
-        response = super().list(request, *args, **kwargs)
+        queryset = FastMessageSerializer.values(self.filter_queryset(self.get_queryset()))
+        # pages past the newest (hot) messages continue in the archive
+        page = self.paginate_queryset(ReadThroughMessages(queryset, self.room.id, request.user.id))
+        response = self.get_paginated_response(FastMessageSerializer().serialize(page))
         # reversing the list for the UI purpose: oldest - newest
         response.data["results"].reverse()
         return response
+
+
+class RoomMessageSearchView(RoomMessageSearchMethodsMixin, APIView):
+    """
+    Messages of a room containing every word of ``q``, newest first, each with
+    the ``context`` messages around it. Pages are keyset based: ``next`` asks
+    for the hits below the last ``seq`` of this page.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, room_id):
+        room = get_readable_room(room_id, request.user)
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            raise ValidationError({"q": "This query parameter is required."})
+
+        try:
+            before = request.query_params.get("before")
+            before = int(before) if before else None
+            context = int(request.query_params.get("context", settings.MESSAGE_SEARCH_CONTEXT))
+        except ValueError:
+            raise ValidationError("before and context must be integers.")
+        context = max(0, min(context, settings.MESSAGE_SEARCH_MAX_CONTEXT))
+        page_size = settings.MESSAGE_SEARCH_PAGE_SIZE
+
+        seqs = search_message_seqs(room.id, query, before=before, limit=page_size + 1)
+        has_next = len(seqs) > page_size
+        seqs = seqs[:page_size]
+
+        messages = room_messages(room, request.user)
+        hits = {message.seq: message for message in messages.filter(seq__in=seqs)}
+        windows = context_windows(messages, seqs, context)
+
+        results = []
+        for seq in seqs:
+            if seq not in hits:
+                continue
+            before_messages, after_messages = windows[seq]
+            results.append({
+                "message": MessageSerializer(hits[seq]).data,
+                "before": MessageSerializer(before_messages, many=True).data,
+                "after": MessageSerializer(after_messages, many=True).data,
+            })
+
+        next_link = None
+        if has_next:
+            next_link = replace_query_param(request.build_absolute_uri(), "before", seqs[-1])
+        return Response({"next": next_link, "results": results})
+
+
+class RoomExportView(RoomExportMethodsMixin, APIView):
+    """
+    Owner only export of the room history as NDJSON (default) or CSV,
+    streamed with constant memory. ``?since=<seq>`` exports what came after
+    a previous export, ``?gzip=1`` compresses the stream.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, room_id):
+        room = get_object_or_404(Room.objects.exclude(status=Room.DELETING), id=room_id, owner=request.user)
+        output = request.query_params.get("output", export.NDJSON)
+        if output not in export.CONTENT_TYPES:
+            raise ValidationError({"output": f"Choose one of: {', '.join(export.CONTENT_TYPES)}."})
+        try:
+            since = request.query_params.get("since")
+            since = int(since) if since else None
+        except ValueError:
+            raise ValidationError({"since": "A message seq is required."})
+        gzip = request.query_params.get("gzip") in ("1", "true")
+
+        chunks = export.export_chunks(room, output=output, since=since, gzip=gzip)
+        if is_asgi(request):
+            chunks = export.aiterate(chunks)
+
+        filename = f"room-{room.id}.{output}" + (".gz" if gzip else "")
+        response = StreamingHttpResponse(
+            chunks,
+            content_type="application/gzip" if gzip else export.CONTENT_TYPES[output],
+        )
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        return response
+
+
+class RoomImportView(RoomImportMethodsMixin, APIView):
+    """
+    Admin only import of NDJSON room archives (the export format), read from
+    the raw request body line by line; ``Content-Encoding: gzip`` bodies are
+    decompressed on the fly. New rooms are owned by ``?owner=<username>``,
+    the caller by default.
+    """
+    permission_classes = [IsAdminUser]
+
+    def post(self, request):
+        owner = request.user
+        username = request.query_params.get("owner")
+        if username:
+            owner = get_user_model().objects.filter(username=username).first()
+            if owner is None:
+                raise ValidationError({"owner": "User not found."})
+
+        body = request_body(request)
+        if request.headers.get("Content-Encoding") == "gzip":
+            body = gzip.GzipFile(fileobj=body)
+        try:
+            stats = import_rooms(body, owner)
+        except (ArchiveError, OSError, EOFError) as e:
+            raise ValidationError({"detail": str(e)})
+        return Response(stats)
+
+
+class MediaUploadView(MediaUploadMethodsMixin, APIView):
+    """
+    Open a chunked media upload in a room the user takes part in, with the
+    ``size`` and ``content_type`` of the whole file; the bytes follow with
+    PUTs to the upload (MediaUploadChunkView).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, room_id):
+        room = get_readable_room(room_id, request.user)
+        if room.status != Room.ACTIVE:
+            raise PermissionDenied("Room is not active.")
+        try:
+            size = int(request.data.get("size"))
+        except (TypeError, ValueError):
+            raise ValidationError({"size": "A size in bytes is required."})
+        content_type = request.data.get("content_type", "")
+        try:
+            media.validate_upload(size, content_type)
+        except media.UploadError as e:
+            raise ValidationError({"detail": str(e)})
+
+        upload = MediaUpload.objects.create(owner=request.user, room=room, size=size, content_type=content_type)
+        return Response(
+            {"id": upload.id, "size": upload.size, "received": 0, "chunk_size": settings.MEDIA_CHUNK_SIZE},
+            status=status.HTTP_201_CREATED,
+        )
+
+
+class MediaUploadChunkView(MediaUploadChunkMethodsMixin, APIView):
+    """
+    Append a chunk to an upload, read straight from the request body. The
+    ``Content-Range: bytes <first>-<last>/<size>`` header says where it goes;
+    a chunk at another offset than the bytes received so far gets a 409 with
+    ``received``, to resume from. The last chunk posts the image message.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def put(self, request, room_id, upload_id):
+        content_range = re.match(r"^bytes (\d+)-(\d+)/(\d+)$", request.headers.get("Content-Range", ""))
+        if content_range is None:
+            raise ValidationError({"detail": "A Content-Range: bytes <first>-<last>/<size> header is required."})
+        first, last, size = (int(value) for value in content_range.groups())
+
+        with transaction.atomic():
+            upload = get_object_or_404(
+                MediaUpload.objects.select_for_update(), id=upload_id, room_id=room_id, owner=request.user,
+            )
+            if size != upload.size:
+                raise ValidationError({"detail": f"The upload holds {upload.size} bytes."})
+            # the uploader may have left, or the room closed, since the upload began
+            room = get_readable_room(room_id, request.user)
+            if room.status != Room.ACTIVE:
+                raise PermissionDenied("Room is not active.")
+            if upload.received == upload.size:
+                # every byte is in but completing failed (rolled back): finish it now
+                message = media.complete_upload(upload)
+                return Response(MiniMessageSerializer(message).data, status=status.HTTP_201_CREATED)
+            if first != upload.received:
+                return Response(
+                    {"detail": f"Expected offset {upload.received}.", "received": upload.received},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            try:
+                upload.received = media.append_chunk(upload, first, request_body(request), last - first + 1)
+            except media.UploadError as e:
+                raise ValidationError({"detail": str(e)})
+            upload.save(update_fields=["received", "updated_at"])
+
+            if upload.received < upload.size:
+                return Response({"id": upload.id, "size": upload.size, "received": upload.received})
+            message = media.complete_upload(upload)
+        return Response(MiniMessageSerializer(message).data, status=status.HTTP_201_CREATED)
+
+
+class MediaView(MediaMethodsMixin, APIView):
+    """
+    The bytes of a media file, for participants of a room it was posted in.
+    Files never change: the ETag is their digest and they may be cached for
+    good. Single byte ranges are served as 206 responses.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, sha256):
+        stored = self.readable_media(request, sha256)
+        return self.serve(request, f'"{stored.sha256}"', media.relative_path(stored.sha256), stored.content_type, stored.size)
+
+    def readable_media(self, request, sha256):
+        stored = get_object_or_404(Media, sha256=sha256)
+        # a 404 rather than a 403, nothing tells outsiders the file exists
+        if not stored.rooms.filter(id__in=joined_room_ids(request.user.id)).exists():
+            raise NotFound()
+        return stored
+
+    def serve(self, request, etag, relative_path, content_type, size):
+        if etag in request.headers.get("If-None-Match", ""):
+            response = HttpResponse(status=status.HTTP_304_NOT_MODIFIED)
+        elif settings.MEDIA_SENDFILE_HEADER:
+            # the front server reads the file and answers ranges itself
+            response = HttpResponse(content_type=content_type)
+            response[settings.MEDIA_SENDFILE_HEADER] = settings.MEDIA_SENDFILE_PREFIX + relative_path
+        else:
+            response = self.file_response(request, os.path.join(settings.CHAT_MEDIA_ROOT, relative_path), content_type, size)
+        response["ETag"] = etag
+        response["Cache-Control"] = "private, max-age=31536000, immutable"
+        response["Accept-Ranges"] = "bytes"
+        return response
+
+    def file_response(self, request, path, content_type, size):
+        try:
+            byte_range = media.parse_range(request.headers.get("Range"), size)
+        except ValueError:
+            response = HttpResponse(status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+        start, end = (0, size - 1) if byte_range is None else byte_range
+        blocks = media.aread_range(path, start, end) if is_asgi(request) else media.read_range(path, start, end)
+        response = StreamingHttpResponse(blocks, content_type=content_type)
+        response["Content-Length"] = str(end - start + 1)
+        if byte_range is not None:
+            response.status_code = status.HTTP_206_PARTIAL_CONTENT
+            response["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return response
+
+
+class MediaPreviewView(MediaPreviewMethodsMixin, MediaView):
+    """
+    A WebP preview of an image, scaled to fit ``size`` (one of
+    ``MEDIA_PREVIEW_SIZES``), with the access rules and caching of the media.
+    A preview that is not rendered yet is scheduled and answered with a 404
+    and ``Retry-After``; the room gets a ``preview_ready`` event for previews
+    of new uploads.
+    """
+
+    def get(self, request, sha256, size):
+        stored = self.readable_media(request, sha256)
+        if size not in settings.MEDIA_PREVIEW_SIZES or not previews.available():
+            raise NotFound("No such preview.")
+
+        path = previews.preview_path(stored.sha256, size)
+        if not os.path.exists(path):
+            previews.schedule(stored.sha256)
+            if not os.path.exists(path):
+                response = Response({"detail": "Preview not ready."}, status=status.HTTP_404_NOT_FOUND)
+                response["Retry-After"] = "1"
+                return response
+        return self.serve(
+            request, f'"{stored.sha256}-{size}"', previews.relative_path(stored.sha256, size),
+            previews.CONTENT_TYPE, os.path.getsize(path),
+        )
+
+
+class RoomMembershipView(RoomMembershipMethodsMixin, RetrieveUpdateAPIView):
+    """
+    The user's own membership of a room: role, join time, read marker and
+    mute flag, with the unread count. PATCH moves the read marker (forward
+    only) and mutes or unmutes the room.
+    """
+    serializer_class = ParticipantSerializer
+    permission_classes = [IsAuthenticated]
+    http_method_names = ["get", "patch", "head", "options"]
+
+    def get_object(self):
+        return get_object_or_404(
+            Participant.objects.select_related("room").exclude(room__status=Room.DELETING),
+            room_id=self.kwargs["room_id"],
+            user_id=self.request.user.id,
+        )
@@ -0,0 +1,33 @@
+import pytest
+from django.core.cache import cache
+from django.test import override_settings
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    # cached counts and membership sets must not leak between tests, ids get reused
+    cache.clear()
+    yield
+
+
+@pytest.fixture(autouse=True, scope="session")
+def no_background_tasks():
+    # consumers would start a watchdog thread and a sweeper task per event
+    # loop; tests of those enable them explicitly
+    with override_settings(LOOP_WATCHDOG_ENABLED=False, ROOM_SWEEPER_ENABLED=False):
+        yield
+
+
+@pytest.fixture(autouse=True, scope="session")
+def single_process_cache():
+    # tests run in one process, where the LocMem cache is consistent
+    with override_settings(CACHE_SINGLE_PROCESS=True):
+        yield
+
+
+@pytest.fixture(autouse=True, scope="session")
+def immediate_last_message():
+    # tests read the room snapshot right after a message commits; the
+    # coalescing timer is tested explicitly
+    with override_settings(LAST_MESSAGE_FLUSH_INTERVAL=0):
+        yield
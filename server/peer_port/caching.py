@@ -0,0 +1,19 @@
+"""
+Whether the default cache is shared by every worker.
+
+Version counters (``chat.response_cache``), cached membership sets
+(``chat.membership``) and the ETags built on them are only consistent when
+all workers read the same cache. ``LocMemCache`` and ``DummyCache`` live in
+one process, so with them these features are off, unless
+``CACHE_SINGLE_PROCESS`` declares that only one worker runs.
+"""
+from django.conf import settings
+
+PER_PROCESS_BACKENDS = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def is_shared(alias="default"):
+    return settings.CACHE_SINGLE_PROCESS or settings.CACHES[alias]["BACKEND"] not in PER_PROCESS_BACKENDS
@@ -0,0 +1,86 @@
+"""
+Model fields.
+
+``CompressedTextField`` is a TextField whose long values are stored zlib
+compressed. The column stays ``text``, so existing rows need no conversion
+and can be compressed later (``compress_messages``):
+
+- values shorter than ``threshold`` characters (``COMPRESSED_TEXT_THRESHOLD``
+  by default), and values that do not shrink (already compressed data), are
+  stored as they are;
+- the others are stored as ``MARKER + "z"`` followed by the base64 text of
+  the compressed UTF-8 bytes;
+- a raw value that happens to start with ``MARKER`` is stored as
+  ``MARKER + "r" + value``, so reading never guesses.
+
+Reads (instances, ``values()`` / ``values_list()``) always return the
+original text. Lookups compare against the stored text, so equality and
+pattern lookups only match values stored raw.
+"""
+import base64
+import zlib
+from django.conf import settings
+from django.db import models
+
+
+MARKER = "\x1f"
+COMPRESSED = MARKER + "z"
+ESCAPED = MARKER + "r"
+
+
+def compress_text(value, threshold):
+    if len(value) >= threshold:
+        stored = COMPRESSED + base64.b64encode(zlib.compress(value.encode())).decode("ascii")
+        if len(stored) < len(value):
+            return stored
+    if value.startswith(MARKER):
+        return ESCAPED + value
+    return value
+
+
+def decompress_text(value):
+    if not value.startswith(MARKER):
+        return value
+    if value.startswith(COMPRESSED):
+        return zlib.decompress(base64.b64decode(value[len(COMPRESSED):])).decode()
+    return value[len(ESCAPED):]
+
+
+def is_encoded(value):
+    """
+    Whether a stored value starting with ``MARKER`` was written by the field,
+    as opposed to raw text stored before it (which reads would misinterpret).
+    """
+    if value.startswith(ESCAPED + MARKER):
+        return True
+    if value.startswith(COMPRESSED):
+        try:
+            decompress_text(value)
+        except (ValueError, zlib.error):
+            return False
+        return True
+    return False
+
+
+class CompressedTextField(models.TextField):
+    def __init__(self, *args, threshold=None, **kwargs):
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.threshold is not None:
+            kwargs["threshold"] = self.threshold
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def get_db_prep_save(self, value, connection):
+        value = super().get_db_prep_save(value, connection)
+        if not isinstance(value, str):
+            return value
+        threshold = self.threshold if self.threshold is not None else settings.COMPRESSED_TEXT_THRESHOLD
+        return compress_text(value, threshold)
@@ -0,0 +1,136 @@
+"""
+Pluggable JSON codec for DRF responses, request bodies and websocket frames.
+
+``JSON_CODEC`` picks the implementation:
+
+- ``"stdlib"``: ``json`` with DRF's encoder and output options (compact,
+  UTF-8, no NaN, U+2028/U+2029 escaped), i.e. exactly what JSONRenderer
+  writes.
+- ``"orjson"``: orjson, producing the same bytes. Types orjson does not
+  know, and every date / time (so the ``Z`` suffix and the rest of DRF's
+  formatting apply), are handed to DRF's encoder.
+- ``"auto"`` (default): orjson when it is installed, stdlib otherwise.
+
+Anything orjson refuses (integers over 64 bits, very deep nesting, ...)
+is encoded again with the stdlib codec, so switching codecs never turns a
+response into an error. Both codecs refuse NaN and infinities with a
+``ValueError``: orjson writes them as ``null``, so output holding a ``null``
+is checked for non-finite floats.
+
+orjson is not a requirement: ``pip install orjson`` to use it.
+"""
+import decimal
+import json
+import math
+from django.conf import settings
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.json import strict_constant
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class StdlibCodec:
+    name = "stdlib"
+
+    def dumps(self, obj):
+        text = json.dumps(obj, cls=JSONEncoder, ensure_ascii=False, allow_nan=False, separators=(",", ":"))
+        return text.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+
+    def loads(self, data):
+        return json.loads(data, parse_constant=strict_constant)
+
+
+def _has_non_finite(obj):
+    if isinstance(obj, float):
+        return not math.isfinite(obj)
+    if isinstance(obj, decimal.Decimal):
+        return not obj.is_finite()
+    if isinstance(obj, dict):
+        return any(_has_non_finite(value) for value in obj.values())
+    if isinstance(obj, (list, tuple)):
+        return any(_has_non_finite(value) for value in obj)
+    return False
+
+
+class OrjsonCodec:
+    name = "orjson"
+
+    def __init__(self):
+        self._default = JSONEncoder().default
+        self._options = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        self._fallback = StdlibCodec()
+
+    def dumps(self, obj):
+        try:
+            data = orjson.dumps(obj, default=self._default, option=self._options)
+        except (orjson.JSONEncodeError, OverflowError):
+            return self._fallback.dumps(obj)
+        if b"null" in data and _has_non_finite(obj):
+            # what allow_nan=False raises in the stdlib codec
+            raise ValueError("Out of range float values are not JSON compliant")
+        if b"\xe2\x80\xa8" in data or b"\xe2\x80\xa9" in data:
+            data = data.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
+        return data
+
+    def loads(self, data):
+        return orjson.loads(data)
+
+
+_codecs = {}
+
+
+def get_codec(name=None):
+    name = name or settings.JSON_CODEC
+    if name == "auto":
+        name = "orjson" if orjson is not None else "stdlib"
+    if name not in _codecs:
+        if name == "orjson" and orjson is None:
+            raise ImportError("JSON_CODEC is 'orjson' but orjson is not installed")
+        _codecs[name] = OrjsonCodec() if name == "orjson" else StdlibCodec()
+    return _codecs[name]
+
+
+def dumps(obj):
+    """Compact UTF-8 JSON bytes"""
+    return get_codec().dumps(obj)
+
+
+def dumps_text(obj):
+    """Same as ``dumps``, as ``str`` for websocket text frames"""
+    return get_codec().dumps(obj).decode()
+
+
+def loads(data):
+    return get_codec().loads(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer through the configured codec; indented (browsable) output stays with DRF."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        indent = self.get_indent(accepted_media_type, renderer_context or {})
+        if indent is not None or not self.compact or self.ensure_ascii or not self.strict:
+            return super().render(data, accepted_media_type, renderer_context)
+        return dumps(data)
+
+
+class FastJSONParser(JSONParser):
+    renderer_class = FastJSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if not self.strict or encoding.lower().replace("-", "") != "utf8":
+            return super().parse(stream, media_type, parser_context)
+        try:
+            return loads(stream.read())
+        except ValueError as exc:
+            raise ParseError("JSON parse error - %s" % str(exc))
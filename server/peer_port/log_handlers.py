@@ -0,0 +1,93 @@
+import atexit
+import logging
+import queue
+import random
+import threading
+from logging.handlers import QueueHandler, QueueListener
+
+
+def _find_handler(name):
+    get = getattr(logging, "getHandlerByName", None)  # Python 3.12+
+    return get(name) if get is not None else logging._handlers.get(name)
+
+
+def _handler_by_name(name):
+    handler = _find_handler(name)
+    if handler is None:
+        raise ValueError(f"Unknown logging handler {name!r}")
+    return handler
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Push records onto an in-memory queue and let a background thread write
+    them through the real (blocking) handlers, so file and console I/O never
+    runs on the event loop.
+
+    Configure it in LOGGING with the ``'()'`` factory key (``'class'`` makes
+    dictConfig on Python 3.12+ build QueueHandlers its own way) and the
+    target handlers by name. Handlers dictConfig has already built (it goes
+    by sorted name) are looked up right away: the logging registry only
+    holds weak references, and nothing else keeps handlers that are attached
+    to no logger. Other names are resolved when the first record arrives.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        self.dropped = 0
+        self.handler_refs = [(_find_handler(ref) or ref) if isinstance(ref, str) else ref for ref in handlers]
+        self.respect_handler_level = respect_handler_level
+        self._listener = None
+        self._stopped = False
+        self._lock = threading.Lock()
+        atexit.register(self.stop)
+
+    def start(self):
+        with self._lock:
+            if self._listener is not None or self._stopped:
+                return
+            handlers = [_handler_by_name(ref) if isinstance(ref, str) else ref for ref in self.handler_refs]
+            self._listener = QueueListener(self.queue, *handlers, respect_handler_level=self.respect_handler_level)
+            self._listener.start()
+
+    def enqueue(self, record):
+        if self._listener is None:
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Never block the caller on a slow disk, drop the record instead.
+            self.dropped += 1
+
+    def stop(self):
+        with self._lock:
+            self._stopped = True
+            listener, self._listener = self._listener, None
+        if listener is not None:
+            listener.stop()
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep only a fraction of the low-severity records of noisy loggers.
+    Records at or above ``always_level`` are never sampled out.
+
+    ``loggers`` limits sampling to records of those loggers and their
+    children, so the filter can sit on a shared handler: logger-level
+    filters never see records propagated up from child loggers.
+    """
+
+    def __init__(self, rate=1.0, always_level="WARNING", loggers=None):
+        super().__init__()
+        self.rate = float(rate)
+        self.always_level = logging.getLevelName(always_level) if isinstance(always_level, str) else always_level
+        self.loggers = tuple(loggers or ())
+
+    def filter(self, record):
+        if record.levelno >= self.always_level or self.rate >= 1.0:
+            return True
+        if self.loggers and not any(
+            record.name == name or record.name.startswith(name + ".") for name in self.loggers
+        ):
+            return True
+        return random.random() < self.rate
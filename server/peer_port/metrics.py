@@ -0,0 +1,122 @@
+"""
+Tiny in-process metrics registry.
+
+Counters, gauges and histograms live in process memory and are exposed as
+JSON through ``peer_port.views.MetricsView``. Everything is guarded by a lock
+because values are recorded both from the event loop and from the
+``sync_to_async`` worker threads.
+"""
+import bisect
+import threading
+
+
+# latency buckets in milliseconds
+DEFAULT_BUCKETS = (1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Counter:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+
+class Gauge:
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        return self.value
+
+
+class Histogram:
+    def __init__(self, name, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th observation."""
+        with self._lock:
+            if not self.count:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, bucket_count in enumerate(self.counts):
+                seen += bucket_count
+                if seen >= rank:
+                    return self.buckets[index] if index < len(self.buckets) else self.max
+        return self.max
+
+    def snapshot(self):
+        with self._lock:
+            buckets = {str(le): count for le, count in zip(self.buckets, self.counts)}
+            buckets["+Inf"] = self.counts[-1]
+            data = {
+                "count": self.count,
+                "sum": round(self.sum, 3),
+                "max": round(self.max, 3),
+                "buckets": buckets,
+            }
+        data["p50"] = self.quantile(0.5)
+        data["p99"] = self.quantile(0.99)
+        return data
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, kind, name, **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.setdefault(name, kind(name, **kwargs))
+        return metric
+
+    def counter(self, name):
+        return self._get_or_create(Counter, name)
+
+    def gauge(self, name):
+        return self._get_or_create(Gauge, name)
+
+    def histogram(self, name, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, buckets=buckets)
+
+    def snapshot(self):
+        return {name: metric.snapshot() for name, metric in sorted(self._metrics.items())}
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+registry = Registry()
+counter = registry.counter
+gauge = registry.gauge
+histogram = registry.histogram
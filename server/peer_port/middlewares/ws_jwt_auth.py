@@ -5,6 +5,7 @@ from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from channels.middleware import BaseMiddleware
 from channels.db import database_sync_to_async
+from ..watchdog import ensure_watchdog
 
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,7 @@ def get_user(user_id):
 
 class JWTAuthMiddleware(BaseMiddleware):
     async def __call__(self, scope, receive, send):
+        ensure_watchdog()
         query_string = scope.get('query_string', b'').decode()
         query_params = dict(x.split('=') for x in query_string.split('&') if x)
         token = query_params.get('token')
@@ -33,11 +35,11 @@ class JWTAuthMiddleware(BaseMiddleware):
 
             except InvalidToken as e:
                 scope['user'] = AnonymousUser()
-                logger.error(f"Invalid Token: {e}")
+                logger.error("Invalid Token: %s", e)
                 
             except TokenError as e:
                 scope['user'] = AnonymousUser()
-                logger.error(f"Token error: {e}")
+                logger.error("Token error: %s", e)
                 
         else:
             scope['user'] = AnonymousUser()
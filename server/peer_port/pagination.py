@@ -1,6 +1,109 @@
+import hashlib
+import json
+from django.core.cache import cache
+from django.db import connections
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
 
 class CommonPagination(PageNumberPagination):
     page_size = 9
     page_size_query_param = 'page_size'
-    max_page_size = 100
\ No newline at end of file
+    max_page_size = 100
+
+
+class CountFreePagination(CommonPagination):
+    """
+    Page number pagination without the COUNT(*) query.
+
+    Fetches ``page_size + 1`` rows to know whether a next page exists and keeps
+    the ``count / next / previous / results`` envelope of CommonPagination, so
+    clients following ``next`` links do not notice the difference. ``count`` is:
+
+    - exact for free on the last page (offset + rows on it);
+    - otherwise depends on ``count_mode``: ``None`` returns null, ``"cached"``
+      runs the COUNT at most once per ``count_cache_timeout`` per query, and
+      ``"estimated"`` asks the PostgreSQL planner (null on other databases).
+    """
+    count_mode = None
+    count_cache_timeout = 60
+    template = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        try:
+            self.page_number = int(request.query_params.get(self.page_query_param) or 1)
+            if self.page_number < 1:
+                raise ValueError
+        except ValueError:
+            raise NotFound(self.invalid_page_message)
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        if not rows and self.page_number > 1:
+            raise NotFound(self.invalid_page_message)
+
+        self.has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        if self.has_next:
+            self.count = self.get_count(queryset)
+        else:
+            self.count = offset + len(rows)
+        return rows
+
+    def get_count(self, queryset):
+        if self.count_mode == "cached":
+            key = "pagination:count:" + hashlib.md5(str(queryset.query).encode()).hexdigest()
+            return cache.get_or_set(key, queryset.count, self.count_cache_timeout)
+        if self.count_mode == "estimated":
+            return self.estimate_count(queryset)
+        return None
+
+    def estimate_count(self, queryset):
+        if connections[queryset.db].vendor != "postgresql":
+            return None
+        plan = queryset.explain(format="json")
+        # EXPLAIN (FORMAT JSON) returns a one-element list holding the plan tree
+        return int(json.loads(plan)[0]["Plan"]["Plan Rows"])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'count': self.count,
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties']['count']['nullable'] = True
+        response_schema['required'] = ['results']
+        return response_schema
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number <= 1:
+            return None
+        url = self.request.build_absolute_uri()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class CachedCountPagination(CountFreePagination):
+    count_mode = "cached"
+
+
+class EstimatedCountPagination(CountFreePagination):
+    count_mode = "estimated"
@@ -139,6 +139,15 @@ REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
+    'DEFAULT_RENDERER_CLASSES': (
+        'peer_port.json_codec.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    'DEFAULT_PARSER_CLASSES': (
+        'peer_port.json_codec.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ),
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
 }
 
@@ -160,9 +169,13 @@ CORS_ALLOWED_ORIGINS = os.getenv("CORS_ALLOWED_ORIGINS", "http://localhost:5173"
 
 
 # Logging setup
+# Every logger writes through the "queue" handler, a background thread then
+# does the blocking console/file I/O so it never stalls the event loop.
 LOG_DIR = os.path.join(BASE_DIR, 'logs')
 os.makedirs(LOG_DIR, exist_ok=True)
-LOG_LEVEL = os.getenv("DJANGO_LOG_LEVEL", "DEBUG")
+LOG_LEVEL = os.getenv("DJANGO_LOG_LEVEL", "INFO")
+# fraction of DEBUG/INFO records kept from the per-frame websocket loggers
+LOG_HOT_PATH_SAMPLE_RATE = float(os.getenv("LOG_HOT_PATH_SAMPLE_RATE", 0.1))
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -178,6 +191,15 @@ LOGGING = {
         },
     },
 
+    'filters': {
+        # on the queue handler: logger filters do not see records of child loggers
+        'hot_path_sampling': {
+            '()': 'peer_port.log_handlers.SamplingFilter',
+            'rate': LOG_HOT_PATH_SAMPLE_RATE,
+            'loggers': ['chat.consumers'],
+        },
+    },
+
     'handlers': {
         'console': {
             'level': LOG_LEVEL,
@@ -190,25 +212,36 @@ LOGGING = {
             'filename': os.path.join(BASE_DIR, 'logs/django.log'),
             'formatter': 'verbose',
         },
+        'queue': {
+            '()': 'peer_port.log_handlers.QueueListenerHandler',
+            'handlers': ['console', 'file'],
+            'filters': ['hot_path_sampling'],
+        },
     },
 
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': 'INFO',
-            'propagate': True,
+            'propagate': False,
         },
         'django.db.backends': {
-            'handlers': ['console'],
+            'handlers': ['queue'],
             'level': 'WARNING',
+            'propagate': False,
         },
         'users': {
-            'handlers': ['console', 'file'],
+            'handlers': ['queue'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
-        'books': {
-            'handlers': ['console', 'file'],
+        'chat': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'peer_port': {
+            'handlers': ['queue'],
             'level': LOG_LEVEL,
             'propagate': False,
         },
@@ -245,3 +278,106 @@ SPECTACULAR_SETTINGS = {
         {'name': 'chats', 'description': 'Chat related operations'},
     ],
 }
+
+
+# Message tracing - attach per-stage server timestamps to outbound chat frames.
+CHAT_TRACE_PAYLOAD = os.getenv("CHAT_TRACE_PAYLOAD", "False") == "True"
+
+
+# Event loop watchdog - loop lag, executor wait and blocked loop stack samples (seconds).
+# The executor probe (0 = off) runs a no-op on the single database thread each interval.
+LOOP_WATCHDOG_ENABLED = os.getenv("LOOP_WATCHDOG_ENABLED", "True") == "True"
+LOOP_WATCHDOG_INTERVAL = float(os.getenv("LOOP_WATCHDOG_INTERVAL", 0.1))
+LOOP_WATCHDOG_BLOCK_THRESHOLD = float(os.getenv("LOOP_WATCHDOG_BLOCK_THRESHOLD", 0.5))
+LOOP_WATCHDOG_EXECUTOR_INTERVAL = float(os.getenv("LOOP_WATCHDOG_EXECUTOR_INTERVAL", 0))
+
+# Seconds the room outbox waits for a missing seq before broadcasting past it.
+CHAT_OUTBOX_GAP_TIMEOUT = float(os.getenv("CHAT_OUTBOX_GAP_TIMEOUT", 0.5))
+
+# Per-room actor - one task per active room sequences, batches and fans out its messages.
+CHAT_ROOM_ACTORS = os.getenv("CHAT_ROOM_ACTORS", "False") == "True"
+CHAT_ROOM_ACTOR_BATCH_SIZE = int(os.getenv("CHAT_ROOM_ACTOR_BATCH_SIZE", 50))
+CHAT_ROOM_ACTOR_IDLE_TIMEOUT = float(os.getenv("CHAT_ROOM_ACTOR_IDLE_TIMEOUT", 30))
+
+# Room last message snapshot - the newest message per room is written once per
+# interval (seconds), 0 writes it right after each commit.
+LAST_MESSAGE_FLUSH_INTERVAL = float(os.getenv("LAST_MESSAGE_FLUSH_INTERVAL", 1))
+LAST_MESSAGE_PREVIEW_LENGTH = 255
+
+# Cache - per process unless CACHE_BACKEND names a shared one (e.g. django.core.cache.backends.redis.RedisCache
+# with CACHE_LOCATION=redis://...). Response cache versions, membership sets and ETags need a shared cache, or
+# CACHE_SINGLE_PROCESS=True for a single worker; otherwise they are off (peer_port.caching).
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", "peer-port"),
+    }
+}
+CACHE_SINGLE_PROCESS = os.getenv("CACHE_SINGLE_PROCESS", "False") == "True"
+
+# Room name search - "auto" uses pg_trgm on PostgreSQL and icontains elsewhere; "memory" is an
+# in-process index for single process deployments, rebuilt every ROOM_SEARCH_INDEX_MAX_AGE seconds.
+ROOM_SEARCH_BACKEND = os.getenv("ROOM_SEARCH_BACKEND", "auto")
+ROOM_SEARCH_MAX_RESULTS = int(os.getenv("ROOM_SEARCH_MAX_RESULTS", 200))
+ROOM_SEARCH_INDEX_MAX_AGE = int(os.getenv("ROOM_SEARCH_INDEX_MAX_AGE", 60))
+
+# Room message search - hits per page, default and maximum context messages around a hit.
+MESSAGE_SEARCH_PAGE_SIZE = int(os.getenv("MESSAGE_SEARCH_PAGE_SIZE", 20))
+MESSAGE_SEARCH_CONTEXT = int(os.getenv("MESSAGE_SEARCH_CONTEXT", 3))
+MESSAGE_SEARCH_MAX_CONTEXT = 10
+
+# Seconds a user's joined room ids stay cached for the is_participant flag of room listings.
+MEMBERSHIP_CACHE_TIMEOUT = int(os.getenv("MEMBERSHIP_CACHE_TIMEOUT", 300))
+
+# Per-process LRU of public room listing and detail responses (entries, seconds).
+ROOM_RESPONSE_CACHE_SIZE = int(os.getenv("ROOM_RESPONSE_CACHE_SIZE", 1000))
+ROOM_RESPONSE_CACHE_TIMEOUT = int(os.getenv("ROOM_RESPONSE_CACHE_TIMEOUT", 60))
+
+# JSON codec of DRF responses and websocket frames - "auto" uses orjson when installed, else "stdlib".
+JSON_CODEC = os.getenv("JSON_CODEC", "auto")
+
+# Rows fetched per round trip by the streaming room export.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", 2000))
+
+# Messages inserted per INSERT / transaction by the room archive import.
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", 5000))
+
+# Room expiry - rooms without a lifetime expire ROOM_IDLE_TIMEOUT seconds after their last
+# message (0 = never). Expired rooms are deleted by the in-process sweeper every
+# ROOM_SWEEP_INTERVAL seconds (or the expire_rooms command), ROOM_SWEEP_BATCH_SIZE rooms
+# and ROOM_PURGE_BATCH_SIZE messages per transaction. A room claimed for deletion is
+# claimed again when its purge has not finished ROOM_PURGE_LEASE seconds later.
+ROOM_IDLE_TIMEOUT = int(os.getenv("ROOM_IDLE_TIMEOUT", 0))
+ROOM_MAX_LIFETIME = 30 * 24 * 3600
+ROOM_SWEEPER_ENABLED = os.getenv("ROOM_SWEEPER_ENABLED", "True") == "True"
+ROOM_SWEEP_INTERVAL = float(os.getenv("ROOM_SWEEP_INTERVAL", 60))
+ROOM_SWEEP_BATCH_SIZE = int(os.getenv("ROOM_SWEEP_BATCH_SIZE", 100))
+ROOM_PURGE_BATCH_SIZE = int(os.getenv("ROOM_PURGE_BATCH_SIZE", 2000))
+ROOM_PURGE_LEASE = int(os.getenv("ROOM_PURGE_LEASE", 600))
+
+# Message retention - days before messages move to the compressed archive (0 = keep them
+# hot), unless the room sets its own, and messages per archive block.
+MESSAGE_RETENTION_DAYS = int(os.getenv("MESSAGE_RETENTION_DAYS", 0))
+MESSAGE_MAX_RETENTION_DAYS = 3650
+ARCHIVE_BLOCK_SIZE = int(os.getenv("ARCHIVE_BLOCK_SIZE", 500))
+
+# Message content of at least this many characters is stored zlib compressed (when it shrinks).
+COMPRESSED_TEXT_THRESHOLD = int(os.getenv("COMPRESSED_TEXT_THRESHOLD", 1024))
+
+# Image message media - storage root, size limits (bytes) and accepted types. With
+# MEDIA_SENDFILE_HEADER set ("X-Accel-Redirect" for nginx, "X-Sendfile" for Apache) the
+# front server sends the files, found under MEDIA_SENDFILE_PREFIX; recommended in production, Django streams them otherwise.
+CHAT_MEDIA_ROOT = os.getenv("CHAT_MEDIA_ROOT", str(BASE_DIR / "media"))
+MEDIA_MAX_SIZE = int(os.getenv("MEDIA_MAX_SIZE", 20 * 1024 * 1024))
+MEDIA_CHUNK_SIZE = int(os.getenv("MEDIA_CHUNK_SIZE", 1024 * 1024))
+MEDIA_ALLOWED_TYPES = ("image/jpeg", "image/png", "image/gif", "image/webp")
+MEDIA_SENDFILE_HEADER = os.getenv("MEDIA_SENDFILE_HEADER", "")
+MEDIA_SENDFILE_PREFIX = os.getenv("MEDIA_SENDFILE_PREFIX", "/protected-media/")
+
+# Image previews - longest side in pixels of each preview, rendering processes (0 = render
+# in the request / upload thread), images waiting for them at most, and the largest image
+# (pixels) decoded at all.
+MEDIA_PREVIEW_SIZES = tuple(int(size) for size in os.getenv("MEDIA_PREVIEW_SIZES", "160,640").split(",") if size)
+MEDIA_PREVIEW_WORKERS = int(os.getenv("MEDIA_PREVIEW_WORKERS", 2))
+MEDIA_PREVIEW_MAX_PENDING = int(os.getenv("MEDIA_PREVIEW_MAX_PENDING", 32))
+MEDIA_PREVIEW_MAX_PIXELS = int(os.getenv("MEDIA_PREVIEW_MAX_PIXELS", 50_000_000))
@@ -0,0 +1,31 @@
+import base64
+import os
+from django.test import SimpleTestCase
+from peer_port.fields import MARKER, compress_text, decompress_text
+
+
+class CompressTextTest(SimpleTestCase):
+    def test_short_values_stay_raw(self):
+        """Test values under the threshold are stored as they are"""
+        self.assertEqual(compress_text("hello", 1024), "hello")
+
+    def test_long_values_are_compressed(self):
+        """Test long compressible values shrink and read back"""
+        value = "def handler(request):\n    return response\n" * 100
+        stored = compress_text(value, 1024)
+        self.assertTrue(stored.startswith(MARKER + "z"))
+        self.assertLess(len(stored), len(value) / 5)
+        self.assertEqual(decompress_text(stored), value)
+
+    def test_incompressible_values_stay_raw(self):
+        """Test values that would not shrink (base64 of random bytes) are stored raw"""
+        value = base64.b64encode(os.urandom(4096)).decode()
+        self.assertEqual(compress_text(value, 1024), value)
+
+    def test_marker_is_escaped(self):
+        """Test raw values starting with the marker read back unchanged"""
+        value = MARKER + "z not compressed"
+        stored = compress_text(value, 1024)
+        self.assertNotEqual(stored, value)
+        self.assertEqual(decompress_text(stored), value)
+        self.assertEqual(decompress_text("plain é \U0001f600"), "plain é \U0001f600")
@@ -0,0 +1,107 @@
+import datetime
+import decimal
+import io
+import unittest
+import uuid
+from zoneinfo import ZoneInfo
+from django.test import SimpleTestCase, override_settings
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict
+from peer_port import json_codec
+from peer_port.json_codec import StdlibCodec, FastJSONRenderer, FastJSONParser, get_codec
+
+
+PAYLOAD = {
+    "utc": datetime.datetime(2026, 1, 2, 3, 4, 5, 678901, tzinfo=datetime.timezone.utc),
+    "kolkata": datetime.datetime(2026, 1, 2, 3, 4, 5, tzinfo=ZoneInfo("Asia/Kolkata")),
+    "naive": datetime.datetime(2026, 1, 2, 3, 4, 5),
+    "date": datetime.date(2026, 1, 2),
+    "time": datetime.time(3, 4, 5, 600),
+    "delta": datetime.timedelta(minutes=1, microseconds=5),
+    "decimal": decimal.Decimal("12.50"),
+    "uuid": uuid.UUID("12345678-1234-5678-1234-567812345678"),
+    "text": "héllo \"quoted\" \u2028 \u2029 \U0001f600",
+    "nested": ReturnDict({"seq": 2 ** 40, "float": 0.1, "none": None, "list": [1, True]}, serializer=None),
+}
+
+
+class StdlibCodecTest(SimpleTestCase):
+    def test_matches_drf_json_renderer(self):
+        """Test the stdlib codec writes exactly what DRF's JSONRenderer writes"""
+        self.assertEqual(StdlibCodec().dumps(PAYLOAD), JSONRenderer().render(PAYLOAD))
+
+    def test_rejects_nan(self):
+        """Test NaN is refused both ways, as DRF's strict JSON does"""
+        with self.assertRaises(ValueError):
+            StdlibCodec().dumps({"x": float("nan")})
+        with self.assertRaises(ValueError):
+            StdlibCodec().loads('{"x": NaN}')
+
+
+@unittest.skipIf(json_codec.orjson is None, "orjson is not installed")
+class OrjsonCodecTest(SimpleTestCase):
+    def setUp(self):
+        self.codec = get_codec("orjson")
+
+    def test_matches_drf_json_renderer(self):
+        """Test datetimes, decimals, uuids and escapes encode byte for byte like DRF"""
+        self.assertEqual(self.codec.dumps(PAYLOAD), JSONRenderer().render(PAYLOAD))
+
+    def test_falls_back_to_stdlib(self):
+        """Test values orjson refuses are still encoded"""
+        payload = {"big": 2 ** 70}
+        self.assertEqual(self.codec.dumps(payload), JSONRenderer().render(payload))
+
+    def test_round_trip(self):
+        """Test loads reads what dumps writes"""
+        payload = {"type": "send_chat", "payload": {"message": "hi \U0001f600"}}
+        self.assertEqual(self.codec.loads(self.codec.dumps(payload)), payload)
+
+
+@unittest.skipIf(json_codec.orjson is None, "orjson is not installed")
+class CodecParityTest(SimpleTestCase):
+    def test_non_finite_floats(self):
+        """Test NaN and infinities are refused by both codecs, nulls are written by both"""
+        codecs = [StdlibCodec(), get_codec("orjson")]
+        for value in [float("nan"), float("inf"), -float("inf"), decimal.Decimal("NaN")]:
+            for codec in codecs:
+                with self.subTest(codec=codec.name, value=value), self.assertRaises(ValueError):
+                    codec.dumps({"room": {"none": None, "scores": [1.5, value]}})
+        payload = {"none": None, "scores": [1.5, None]}
+        self.assertEqual(codecs[0].dumps(payload), codecs[1].dumps(payload))
+        for codec in codecs:
+            with self.subTest(codec=codec.name), self.assertRaises(ValueError):
+                codec.loads('{"x": NaN}')
+
+
+class CodecSelectionTest(SimpleTestCase):
+    @override_settings(JSON_CODEC="stdlib")
+    def test_configured_codec(self):
+        """Test JSON_CODEC picks the codec"""
+        self.assertEqual(get_codec().name, "stdlib")
+        self.assertEqual(json_codec.dumps_text({"a": "é"}), '{"a":"é"}')
+
+    @override_settings(JSON_CODEC="auto")
+    def test_auto_prefers_orjson(self):
+        """Test auto uses orjson when installed and stdlib otherwise"""
+        expected = "stdlib" if json_codec.orjson is None else "orjson"
+        self.assertEqual(get_codec().name, expected)
+
+
+class FastJSONRendererParserTest(SimpleTestCase):
+    def test_renderer_output(self):
+        """Test compact responses go through the codec, indented ones stay with DRF"""
+        self.assertEqual(FastJSONRenderer().render(PAYLOAD), JSONRenderer().render(PAYLOAD))
+        indented = FastJSONRenderer().render({"a": 1}, "application/json; indent=2")
+        self.assertEqual(indented, b'{\n  "a": 1\n}')
+        self.assertEqual(FastJSONRenderer().render(None), b"")
+
+    def test_parser(self):
+        """Test bodies are parsed and malformed ones raise ParseError"""
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(io.BytesIO('{"name": "Rüm"}'.encode())), {"name": "Rüm"})
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"name": '))
+        with self.assertRaises(ParseError):
+            parser.parse(io.BytesIO(b'{"x": NaN}'))
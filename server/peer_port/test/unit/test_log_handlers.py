@@ -0,0 +1,113 @@
+import copy
+import gc
+import logging
+import logging.config
+import random
+from django.conf import settings
+from django.test import SimpleTestCase
+from peer_port.log_handlers import QueueListenerHandler, SamplingFilter, _handler_by_name
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.messages = []
+
+    def emit(self, record):
+        self.messages.append(record.getMessage())
+
+
+class QueueListenerHandlerTest(SimpleTestCase):
+    def setUp(self):
+        self.target = ListHandler()
+        self.handler = QueueListenerHandler([self.target])
+        self.logger = logging.getLogger("peer_port.test.queue")
+        self.logger.addHandler(self.handler)
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.propagate = False
+
+    def tearDown(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.stop()
+
+    def test_records_are_written_by_background_thread(self):
+        """Test records reach the target handler once the listener drains"""
+        self.logger.info("hello %s", "world")
+        self.handler.stop()  # flushes the queue
+        self.assertEqual(self.target.messages, ["hello world"])
+
+    def test_full_queue_drops_instead_of_blocking(self):
+        """Test a full queue drops records instead of blocking the caller"""
+        handler = QueueListenerHandler([self.target], maxsize=1)
+        handler.stop()  # no consumer, the queue fills up
+        record = logging.LogRecord("x", logging.INFO, __file__, 1, "msg", None, None)
+        handler.enqueue(record)
+        handler.enqueue(record)
+        self.assertEqual(handler.dropped, 1)
+
+
+class SamplingFilterTest(SimpleTestCase):
+    def make_record(self, level):
+        return logging.LogRecord("chat.consumers", level, __file__, 1, "msg", None, None)
+
+    def test_zero_rate_drops_info(self):
+        """Test low severity records are sampled out"""
+        self.assertFalse(SamplingFilter(rate=0).filter(self.make_record(logging.INFO)))
+
+    def test_warnings_are_never_sampled(self):
+        """Test records at or above the always level pass"""
+        self.assertTrue(SamplingFilter(rate=0).filter(self.make_record(logging.ERROR)))
+
+    def test_full_rate_keeps_everything(self):
+        """Test a rate of 1 keeps every record"""
+        self.assertTrue(SamplingFilter(rate=1).filter(self.make_record(logging.DEBUG)))
+
+    def test_only_listed_loggers_are_sampled(self):
+        """Test records of other loggers pass a filter limited to some loggers"""
+        sampling = SamplingFilter(rate=0, loggers=["chat.consumers"])
+        child = logging.LogRecord("chat.consumers.chat_consumer", logging.INFO, __file__, 1, "msg", None, None)
+        other = logging.LogRecord("chat.consumersx", logging.INFO, __file__, 1, "msg", None, None)
+        self.assertFalse(sampling.filter(child))
+        self.assertTrue(sampling.filter(other))
+
+
+class LoggingConfigTest(SimpleTestCase):
+    """Run records through the LOGGING of the settings, with the console and file handlers captured."""
+
+    def setUp(self):
+        config = copy.deepcopy(settings.LOGGING)
+        for name in ("console", "file"):
+            config["handlers"][name] = {"class": f"{__name__}.ListHandler", "level": "DEBUG"}
+        config["filters"]["hot_path_sampling"]["rate"] = 0.1
+        logging.config.dictConfig(config)
+        self.addCleanup(logging.config.dictConfig, settings.LOGGING)
+        self.queue = _handler_by_name("queue")
+        self.addCleanup(self.queue.stop)
+        random.seed(1)
+
+    def test_consumer_records_are_sampled(self):
+        """Test the consumer module's INFO records are sampled and other loggers are kept"""
+        consumer = logging.getLogger("chat.consumers.chat_consumer")
+        services = logging.getLogger("chat.services")
+        for n in range(1000):
+            consumer.info("frame %s", n)
+        for n in range(100):
+            services.info("service %s", n)
+        consumer.warning("slow")
+        self.queue.stop()  # flushes the queue
+
+        messages = _handler_by_name("console").messages
+        frames = [message for message in messages if message.startswith("frame")]
+        self.assertLess(len(frames), 200)
+        self.assertGreater(len(frames), 20)
+        self.assertEqual(len([message for message in messages if message.startswith("service")]), 100)
+        self.assertIn("slow", messages)
+
+    def test_targets_survive_garbage_collection(self):
+        """Test handlers attached to no logger are held by the queue handler, not only by the weak registry"""
+        gc.collect()
+        logging.getLogger("chat.services").warning("kept")
+        self.queue.stop()
+        console = self.queue.handler_refs[0]
+        self.assertIsInstance(console, ListHandler)
+        self.assertIn("kept", console.messages)
@@ -0,0 +1,60 @@
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from peer_port import metrics
+from peer_port.metrics import Histogram, Registry
+
+User = get_user_model()
+
+
+class HistogramTest(TestCase):
+    def test_observe_counts_into_buckets(self):
+        """Test observations land in the right bucket"""
+        histogram = Histogram("latency", buckets=(1, 10, 100))
+        for value in (0.5, 5, 5, 50, 500):
+            histogram.observe(value)
+        data = histogram.snapshot()
+        self.assertEqual(data["count"], 5)
+        self.assertEqual(data["buckets"], {"1": 1, "10": 2, "100": 1, "+Inf": 1})
+        self.assertEqual(data["max"], 500)
+
+    def test_quantiles(self):
+        """Test quantiles report the bucket upper bound"""
+        histogram = Histogram("latency", buckets=(1, 10, 100))
+        for _ in range(99):
+            histogram.observe(2)
+        histogram.observe(70)
+        self.assertEqual(histogram.quantile(0.5), 10)
+        self.assertEqual(histogram.quantile(1.0), 100)
+
+    def test_empty_histogram_quantile(self):
+        """Test quantile of an empty histogram is None"""
+        self.assertIsNone(Histogram("latency").quantile(0.5))
+
+    def test_registry_returns_same_metric(self):
+        """Test the registry hands back the same instance per name"""
+        registry = Registry()
+        self.assertIs(registry.counter("hits"), registry.counter("hits"))
+        registry.counter("hits").inc(3)
+        self.assertEqual(registry.snapshot(), {"hits": 3})
+
+
+class MetricsViewTest(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username="user", email="user@example.com", password="TestPass123!")
+        self.admin = User.objects.create_superuser(username="admin", email="admin@example.com", password="TestPass123!")
+
+    def test_metrics_requires_staff(self):
+        """Test non staff users cannot read metrics"""
+        self.client.force_authenticate(user=self.user)
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_snapshot(self):
+        """Test staff users get the registry snapshot"""
+        metrics.counter("test.metrics.view").inc()
+        self.client.force_authenticate(user=self.admin)
+        response = self.client.get("/metrics/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["test.metrics.view"], 1)
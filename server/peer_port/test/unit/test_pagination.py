@@ -0,0 +1,74 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+from peer_port.pagination import CountFreePagination, CachedCountPagination
+
+User = get_user_model()
+
+
+class CountFreePaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.bulk_create([
+            User(username=f"user{i:02}", email=f"user{i}@example.com") for i in range(25)
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.queryset = User.objects.order_by("username")
+
+    def paginate(self, paginator, **params):
+        request = Request(APIRequestFactory().get("/users/", params))
+        with CaptureQueriesContext(connection) as queries:
+            rows = paginator.paginate_queryset(self.queryset, request)
+        response = paginator.get_paginated_response([user.username for user in rows])
+        return response.data, [query["sql"] for query in queries.captured_queries]
+
+    def test_first_page_without_count_query(self):
+        """Test a middle page is fetched with a single LIMIT page_size + 1 query"""
+        data, queries = self.paginate(CountFreePagination(), page_size=10)
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn("COUNT", queries[0])
+        self.assertIsNone(data["count"])
+        self.assertEqual(len(data["results"]), 10)
+        self.assertIn("page=2", data["next"])
+        self.assertIsNone(data["previous"])
+
+    def test_last_page_has_exact_count(self):
+        """Test the last page knows the total for free"""
+        data, queries = self.paginate(CountFreePagination(), page=3, page_size=10)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(data["count"], 25)
+        self.assertIsNone(data["next"])
+        self.assertEqual(data["results"], [f"user{i:02}" for i in range(20, 25)])
+        self.assertIn("page=2", data["previous"])
+
+    def test_second_page_previous_link_drops_page(self):
+        """Test page 2 links back to the bare url like PageNumberPagination"""
+        data, _ = self.paginate(CountFreePagination(), page=2, page_size=10)
+        self.assertNotIn("page=", data["previous"])
+
+    def test_page_past_the_end(self):
+        """Test an empty page past the end is a 404"""
+        with self.assertRaises(NotFound):
+            self.paginate(CountFreePagination(), page=9, page_size=10)
+
+    def test_invalid_page(self):
+        """Test a non numeric page is a 404"""
+        with self.assertRaises(NotFound):
+            self.paginate(CountFreePagination(), page="abc")
+
+    def test_cached_count(self):
+        """Test the cached mode counts once and reuses the total"""
+        data, queries = self.paginate(CachedCountPagination(), page_size=10)
+        self.assertEqual(data["count"], 25)
+        self.assertEqual(len(queries), 2)
+
+        data, queries = self.paginate(CachedCountPagination(), page_size=10)
+        self.assertEqual(data["count"], 25)
+        self.assertEqual(len(queries), 1)
@@ -0,0 +1,72 @@
+import asyncio
+import time
+from django.test import SimpleTestCase, override_settings
+from peer_port import metrics
+from peer_port.watchdog import LoopWatchdog, ensure_watchdog
+
+
+def block_loop(seconds):
+    time.sleep(seconds)
+
+
+class LoopWatchdogTest(SimpleTestCase):
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_records_loop_lag_and_executor_wait(self):
+        """Test the probes record lag and executor wait histograms"""
+        async def run():
+            watchdog = LoopWatchdog(asyncio.get_running_loop(), interval=0.01, block_threshold=1, executor_interval=0.01)
+            watchdog.start()
+            await asyncio.sleep(0.1)
+            watchdog.stop()
+
+        asyncio.run(run())
+        self.assertGreater(metrics.histogram("loop.lag_ms").count, 0)
+        self.assertGreater(metrics.histogram("executor.wait_ms").count, 0)
+
+    def test_blocked_loop_logs_stack(self):
+        """Test a blocking call on the loop is reported with its stack"""
+        async def run():
+            watchdog = LoopWatchdog(asyncio.get_running_loop(), interval=0.01, block_threshold=0.05)
+            watchdog.start()
+            await asyncio.sleep(0.02)
+            block_loop(0.3)
+            await asyncio.sleep(0.02)
+            watchdog.stop()
+
+        with self.assertLogs("peer_port.watchdog", level="WARNING") as logs:
+            asyncio.run(run())
+        self.assertEqual(metrics.counter("loop.blocked").value, 1)
+        self.assertIn("block_loop", logs.output[0])
+
+    @override_settings(LOOP_WATCHDOG_ENABLED=True)
+    def test_ensure_watchdog_is_idempotent_per_loop(self):
+        """Test one watchdog is started per running loop"""
+        async def run():
+            first = ensure_watchdog()
+            second = ensure_watchdog()
+            first.stop()
+            return first, second
+
+        first, second = asyncio.run(run())
+        self.assertIs(first, second)
+
+    @override_settings(LOOP_WATCHDOG_ENABLED=False)
+    def test_disabled_watchdog(self):
+        """Test nothing starts when the watchdog is disabled"""
+        async def run():
+            return ensure_watchdog()
+
+        self.assertIsNone(asyncio.run(run()))
+
+    def test_executor_probe_is_off_by_default(self):
+        """Test no work is queued on the database thread unless the executor probe has an interval"""
+        async def run():
+            watchdog = LoopWatchdog(asyncio.get_running_loop(), interval=0.01, block_threshold=1)
+            watchdog.start()
+            tasks = len(watchdog._tasks)
+            watchdog.stop()
+            return tasks
+
+        self.assertEqual(asyncio.run(run()), 1)
@@ -0,0 +1,14 @@
+from drf_spectacular.utils import extend_schema
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from . import metrics
+
+
+@extend_schema(exclude=True)
+class MetricsView(APIView):
+    """In-process counters, gauges and latency histograms, staff only."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(metrics.registry.snapshot())
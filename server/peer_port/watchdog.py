@@ -0,0 +1,127 @@
+"""
+Event loop lag and ``sync_to_async`` executor saturation monitor.
+
+One watchdog runs per event loop:
+
+- a probe task sleeps ``interval`` seconds and records how late it woke up
+  (``loop.lag_ms``), refreshing a heartbeat each time;
+- every ``executor_interval`` seconds (``LOOP_WATCHDOG_EXECUTOR_INTERVAL``,
+  0 = never) a second probe times a no-op through the thread-sensitive
+  executor used by ``database_sync_to_async`` (``executor.wait_ms``). That
+  executor is a single shared thread, so the probe is off unless asked for;
+- a daemon thread watches the heartbeat and, when the loop has not come
+  back for longer than ``block_threshold``, logs the stack of the loop
+  thread so the blocking call can be found (``loop.blocked``).
+"""
+import asyncio
+import logging
+import sys
+import threading
+import time
+import traceback
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+_watchdogs = {}
+
+
+def _noop():
+    return None
+
+
+class LoopWatchdog:
+    def __init__(self, loop, interval=0.1, block_threshold=0.5, executor_interval=0):
+        self.loop = loop
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.executor_interval = executor_interval
+        self.heartbeat = time.monotonic()
+        self._loop_thread_id = threading.get_ident()
+        self._tasks = []
+        self._thread = None
+
+    def start(self):
+        self._tasks = [self.loop.create_task(self._probe_loop())]
+        if self.executor_interval:
+            self._tasks.append(self.loop.create_task(self._probe_executor()))
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        self._tasks = []
+
+    @property
+    def running(self):
+        return not self.loop.is_closed() and any(not task.done() for task in self._tasks)
+
+    async def _probe_loop(self):
+        lag_histogram = metrics.histogram("loop.lag_ms")
+        lag_gauge = metrics.gauge("loop.lag_ms.last")
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.heartbeat = time.monotonic()
+            lag_ms = max(self.heartbeat - started - self.interval, 0.0) * 1000
+            lag_histogram.observe(lag_ms)
+            lag_gauge.set(round(lag_ms, 3))
+
+    async def _probe_executor(self):
+        wait_histogram = metrics.histogram("executor.wait_ms")
+        wait_gauge = metrics.gauge("executor.wait_ms.last")
+        probe = sync_to_async(_noop, thread_sensitive=True)
+        while True:
+            started = time.monotonic()
+            await probe()
+            wait_ms = (time.monotonic() - started) * 1000
+            wait_histogram.observe(wait_ms)
+            wait_gauge.set(round(wait_ms, 3))
+            await asyncio.sleep(self.executor_interval)
+
+    def _watch(self):
+        blocked_counter = metrics.counter("loop.blocked")
+        reported_heartbeat = None
+        while self.running:
+            time.sleep(self.block_threshold / 2)
+            heartbeat = self.heartbeat
+            stalled = time.monotonic() - heartbeat - self.interval
+            if stalled < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            if not self.loop.is_running():
+                continue
+
+            # report each stall once, with whatever the loop thread is doing now
+            reported_heartbeat = heartbeat
+            blocked_counter.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning("Event loop blocked for %.0f ms, loop thread stack:\n%s", stalled * 1000, stack)
+
+
+def ensure_watchdog():
+    """
+    Start the watchdog for the running loop if it is enabled and not started yet.
+    Cheap enough to call from every connection.
+    """
+    if not settings.LOOP_WATCHDOG_ENABLED:
+        return None
+    loop = asyncio.get_running_loop()
+    for closed_loop in [known for known in _watchdogs if known.is_closed()]:
+        del _watchdogs[closed_loop]
+
+    watchdog = _watchdogs.get(loop)
+    if watchdog is None:
+        watchdog = LoopWatchdog(
+            loop,
+            interval=settings.LOOP_WATCHDOG_INTERVAL,
+            block_threshold=settings.LOOP_WATCHDOG_BLOCK_THRESHOLD,
+            executor_interval=settings.LOOP_WATCHDOG_EXECUTOR_INTERVAL,
+        )
+        _watchdogs[loop] = watchdog
+        watchdog.start()
+    return watchdog
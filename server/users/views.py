@@ -23,7 +23,7 @@ class RegisterView(APIView):
 
     @doc_register_schema()
     def post(self, request):
-        logger.debug(f'inside post RegisterView {request.data}')
+        logger.debug('inside post RegisterView for %s', request.data.get('username'))
         serializer = UserSerializer(data=request.data)
         if serializer.is_valid():
             serializer.save()